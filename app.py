@@ -1,214 +1,24 @@
 import streamlit as st
-import sqlalchemy as sa
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, JSON, Enum, Float, UniqueConstraint, Boolean
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from concurrent.futures import TimeoutError as PasswordTimeout
 from datetime import datetime, date
-import enum
-import json
-import os
-from werkzeug.security import generate_password_hash, check_password_hash
-from dotenv import load_dotenv
-
-# Configuración de la base de datos
-load_dotenv()
-
-DATABASE_URL = os.environ.get("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-# Enums
-class UserRole(enum.Enum):
-    ADMIN = "admin"
-    SUPERVISOR = "supervisor"
-    OPERATOR = "operator"
-
-class QuestionType(enum.Enum):
-    CATEGORICAL = "categorical"
-    NUMERICAL = "numerical"
-
-class FormSection(enum.Enum):
-    QUALITY = "quality"
-    PRODUCTION = "production"
-
-# Modelos
-class User(Base):
-    __tablename__ = "users"
-    
-    id = Column(Integer, primary_key=True)
-    username = Column(String(50), unique=True, nullable=False)
-    password_hash = Column(String(128), nullable=False)
-    role = Column(Enum(UserRole), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-    @staticmethod
-    def create_password_hash(password):
-        return generate_password_hash(password, method='pbkdf2:sha256')
-
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-class ProductionOrder(Base):
-    __tablename__ = "production_orders"
-    
-    id = Column(Integer, primary_key=True)
-    order_number = Column(String(50), unique=True, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    in_production = Column(Boolean, default=False)
-    in_quality = Column(Boolean, default=False)
-    quality_forms = relationship("QualityForm", back_populates="production_order")
-    production_forms = relationship("ProductionForm", back_populates="production_order")
-
-    @classmethod
-    def get_by_order_number(cls, db, order_number):
-        return db.query(cls).filter(cls.order_number == order_number).first()
-
-class QualityForm(Base):
-    __tablename__ = "quality_forms"
-    
-    id = Column(Integer, primary_key=True)
-    production_order_id = Column(Integer, ForeignKey("production_orders.id"))
-    user_id = Column(Integer, ForeignKey("users.id"))
-    apariencia = Column(String(50), nullable=False)  # A, B, C
-    color = Column(String(50), nullable=False)  # A, B, C
-    olor = Column(String(50), nullable=False)  # A, B, C
-    humedad = Column(Float, nullable=False)  # 10-14%
-    proteina = Column(Float, nullable=False)  # 18-22%
-    grasa = Column(Float, nullable=False)  # 2-4%
-    fibra = Column(Float, nullable=False)  # 3-5%
-    cenizas = Column(Float, nullable=False)  # 5-7%
-    created_at = Column(DateTime, default=datetime.utcnow)
-    
-    production_order = relationship("ProductionOrder", back_populates="quality_forms")
-    user = relationship("User")
-
-class ProductionForm(Base):
-    __tablename__ = "production_forms"
-    
-    id = Column(Integer, primary_key=True)
-    production_order_id = Column(Integer, ForeignKey("production_orders.id"))
-    user_id = Column(Integer, ForeignKey("users.id"))
-    dieta = Column(String(50), nullable=False)
-    molienda = Column(Float, nullable=False)
-    durabilidad = Column(Float, nullable=False)
-    dureza = Column(Integer, nullable=False)
-    temperatura = Column(Integer, nullable=False)
-    peletizadora = Column(String(50), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    
-    production_order = relationship("ProductionOrder", back_populates="production_forms")
-    user = relationship("User")
-
-class DailyPlan(Base):
-    __tablename__ = 'daily_plans'
-    
-    id = Column(Integer, primary_key=True)
-    date = Column(DateTime, unique=True, nullable=False)
-    created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
-    
-    estimated_orders = Column(Integer)
-    die_size = Column(Float)
-    soy_tons = Column(Float)
-    corn_cake_tons = Column(Float)
-    
-    @classmethod
-    def get_by_date(cls, db, date):
-        return db.query(cls).filter(cls.date == date).first()
-
-# Configuración de preguntas
-QUESTIONS_CONFIG = {
-    "admin": {
-        FormSection.QUALITY: [
-            {
-                "id": "q1",
-                "text": "¿Cuál es el estado general del producto?",
-                "type": QuestionType.CATEGORICAL,
-                "options": ["A - Excelente", "B - Bueno", "C - Regular"],
-                "required": True
-            },
-            {
-                "id": "q2",
-                "text": "¿Cuál es el nivel de calidad del acabado?",
-                "type": QuestionType.NUMERICAL,
-                "min_value": 1,
-                "max_value": 10,
-                "required": True
-            }
-        ],
-        FormSection.PRODUCTION: [
-            {
-                "id": "p1",
-                "text": "¿Cuál es el estado de la línea de producción?",
-                "type": QuestionType.CATEGORICAL,
-                "options": ["A - Óptimo", "B - Normal", "C - Requiere atención"],
-                "required": True
-            },
-            {
-                "id": "p2",
-                "text": "¿Cuál es la eficiencia de producción?",
-                "type": QuestionType.NUMERICAL,
-                "min_value": 0,
-                "max_value": 100,
-                "required": True
-            }
-        ]
-    },
-    "supervisor": {
-        FormSection.QUALITY: [
-            {
-                "id": "q1",
-                "text": "¿Cuál es el estado general del producto?",
-                "type": QuestionType.CATEGORICAL,
-                "options": ["A - Excelente", "B - Bueno", "C - Regular"],
-                "required": True
-            }
-        ],
-        FormSection.PRODUCTION: [
-            {
-                "id": "p1",
-                "text": "¿Cuál es el estado de la línea de producción?",
-                "type": QuestionType.CATEGORICAL,
-                "options": ["A - Óptimo", "B - Normal", "C - Requiere atención"],
-                "required": True
-            }
-        ]
-    },
-    "operator": {
-        FormSection.QUALITY: [
-            {
-                "id": "q1",
-                "text": "¿El producto cumple con los estándares básicos?",
-                "type": QuestionType.CATEGORICAL,
-                "options": ["A - Sí", "B - Parcialmente", "C - No"],
-                "required": True
-            }
-        ],
-        FormSection.PRODUCTION: [
-            {
-                "id": "p1",
-                "text": "¿La línea está funcionando correctamente?",
-                "type": QuestionType.CATEGORICAL,
-                "options": ["A - Sí", "B - Parcialmente", "C - No"],
-                "required": True
-            }
-        ]
-    }
-}
+from timing import RerunTimer
+import sql_trace
+
+# Streamlit vuelve a ejecutar este script en cada interacción; lo que sigue
+# se mide para el reporte de tiempos por rerun (y las consultas SQL, con
+# HERMES_SQL_TRACE=1)
+rerun_timer = RerunTimer("app.py")
+sql_trace.begin_rerun("app.py")
+
+# Engine, modelos y configuración viven en módulos importados: Python los
+# ejecuta una sola vez por proceso y los reutiliza en cada rerun y sesión
+from database import session_scope, init_db
+from models import User, DailyPlan
+from config import QUALITY_FIELDS, PRODUCTION_FIELDS, DAILY_PLAN_FIELDS
+from form_service import submit_form, NEW, APPEND, UPDATE, EXISTS
+from auth import run_password_check, remember_session, renew_session, forget_session, resume_session, revoke_sessions
 
 # Funciones de utilidad
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def init_db():
-    Base.metadata.create_all(bind=engine)
-
 def init_session_state():
     if "authenticated" not in st.session_state:
         st.session_state.authenticated = False
@@ -217,14 +27,67 @@ def init_session_state():
 
 def authenticate_user(db, username, password):
     user = db.query(User).filter(User.username == username).first()
-    if user and user.check_password(password):
+    if user and run_password_check(user.check_password, password):
         return user
     return None
 
+def field_input(prefix, name, fields):
+    # Campo del formulario con los límites de especificación de config.py
+    spec = fields[name]
+    key = f"{prefix}_{name}"
+    if "options" in spec:
+        return st.selectbox(spec["label"], spec["options"], key=key, index=0)
+    return st.number_input(
+        spec["label"], min_value=spec["min_value"], max_value=spec["max_value"],
+        step=spec["step"], key=key, value=spec["min_value"]
+    )
+
+def plan_input(icon, name, key):
+    # Campo del plan diario con los límites de config.py
+    spec = DAILY_PLAN_FIELDS[name]
+    return st.number_input(
+        f"{icon} {spec['label']}", min_value=spec["min_value"], max_value=spec["max_value"],
+        step=spec["step"], value=st.session_state.get(key, spec["min_value"]), key=key
+    )
+
+def save_form(db, form_type, order_number, values, mode=NEW, form_id=None):
+    # Un envío = una transacción (ver form_service.py)
+    try:
+        result, form_id = submit_form(
+            db, form_type, order_number, st.session_state.user.id, values, mode, form_id
+        )
+    except Exception as e:
+        st.error(f"❌ Error al guardar: {str(e)}")
+        return
+    if result == EXISTS:
+        # Ya hay un formulario para la orden: el envío queda pendiente hasta
+        # que el usuario elija actualizar el último o agregar uno nuevo
+        st.session_state[f"{form_type}_pending"] = {
+            "order_number": order_number, "values": values, "form_id": form_id
+        }
+        return
+    st.session_state[f"{form_type}_pending"] = None
+    st.toast("✅ Datos almacenados con éxito", icon="✅")
+
+def pending_submission(db, form_type, message):
+    pending = st.session_state.get(f"{form_type}_pending")
+    if not pending:
+        return
+    st.warning(message)
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔄 Actualizar último formulario"):
+            save_form(db, form_type, pending["order_number"], pending["values"], UPDATE, pending["form_id"])
+            st.rerun()
+    with col2:
+        if st.button("➕ Agregar nuevo formulario"):
+            save_form(db, form_type, pending["order_number"], pending["values"], APPEND)
+            st.rerun()
+
 def login_required(func):
     def wrapper(*args, **kwargs):
         if not st.session_state.authenticated:
-            login_page()
+            login_page(*args, **kwargs)
             return
         return func(*args, **kwargs)
     return wrapper
@@ -236,8 +99,9 @@ st.set_page_config(
     layout="wide"
 )
 
-# Estilos personalizados
-st.markdown("""
+# Estilos personalizados. Streamlit reconstruye la página en cada rerun, así
+# que el bloque se vuelve a enviar; es una constante y no se recalcula.
+STYLES = """
     <style>
     .stButton>button {
         background-color: #1A494C;
@@ -287,15 +151,17 @@ st.markdown("""
         justify-content: center;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+st.markdown(STYLES, unsafe_allow_html=True)
 
 # Initialize session state
 init_session_state()
 
-# Initialize database
+# Initialize database (create_all y migraciones solo la primera vez en el proceso)
 init_db()
+rerun_timer.mark("arranque")
 
-def login_page():
+def login_page(db):
     st.title("")
     with st.container():
         col1, col2, col3 = st.columns([1,2,1])
@@ -304,242 +170,77 @@ def login_page():
             username = st.text_input("Usuario")
             password = st.text_input("Contraseña", type="password")
             if st.button("Iniciar Sesión", use_container_width=True):
-                db = next(get_db())
-                user = authenticate_user(db, username, password)
+                try:
+                    user = authenticate_user(db, username, password)
+                except PasswordTimeout:
+                    # El pool de contraseñas está saturado (muchos inicios a la vez)
+                    st.error("El servidor está ocupado verificando otros inicios de sesión. Intenta de nuevo en unos segundos.")
+                    return
                 if user:
                     st.session_state.user = user
                     st.session_state.authenticated = True
+                    remember_session(user)
                     st.success("¡Inicio de sesión exitoso!")
                     st.rerun()
                 else:
                     st.error("Usuario o contraseña incorrectos")
 
 @login_required
-def quality_form():
+def quality_form(db):
     st.title("📋 Formulario de Calidad")
-    db = next(get_db())
-
-    if "quality_action" not in st.session_state:
-        st.session_state.quality_action = None
-    if "quality_last_form_id" not in st.session_state:
-        st.session_state.quality_last_form_id = None
 
     with st.form(key="quality_form", clear_on_submit=True):
         order_number = st.text_input("Número de Orden de Producción", key="quality_order_number", value="")
-        apariencia = st.selectbox("Apariencia", ["A - Excelente", "B - Bueno", "C - Regular"], key="quality_apariencia", index=0)
-        color = st.selectbox("Color", ["A - Excelente", "B - Bueno", "C - Regular"], key="quality_color", index=0)
-        olor = st.selectbox("Olor", ["A - Excelente", "B - Bueno", "C - Regular"], key="quality_olor", index=0)
-        humedad = st.number_input("Humedad (%)", min_value=10.0, max_value=14.0, step=0.1, key="quality_humedad", value=10.0)
-        proteina = st.number_input("Proteína (%)", min_value=18.0, max_value=22.0, step=0.1, key="quality_proteina", value=18.0)
-        grasa = st.number_input("Grasa (%)", min_value=2.0, max_value=4.0, step=0.1, key="quality_grasa", value=2.0)
-        fibra = st.number_input("Fibra (%)", min_value=3.0, max_value=5.0, step=0.1, key="quality_fibra", value=3.0)
-        cenizas = st.number_input("Cenizas (%)", min_value=5.0, max_value=7.0, step=0.1, key="quality_cenizas", value=5.0)
+        apariencia = field_input("quality", "apariencia", QUALITY_FIELDS)
+        color = field_input("quality", "color", QUALITY_FIELDS)
+        olor = field_input("quality", "olor", QUALITY_FIELDS)
+        humedad = field_input("quality", "humedad", QUALITY_FIELDS)
+        proteina = field_input("quality", "proteina", QUALITY_FIELDS)
+        grasa = field_input("quality", "grasa", QUALITY_FIELDS)
+        fibra = field_input("quality", "fibra", QUALITY_FIELDS)
+        cenizas = field_input("quality", "cenizas", QUALITY_FIELDS)
         submit_button = st.form_submit_button("💾 Enviar")
 
     if submit_button:
         if not order_number:
             st.error("Debes ingresar el número de orden de producción.")
             return
-        production_order = ProductionOrder.get_by_order_number(db, order_number)
-        if not production_order:
-            production_order = ProductionOrder(order_number=order_number)
-            db.add(production_order)
-            db.commit()
-            existing_quality_form = None
-        else:
-            existing_quality_form = db.query(QualityForm).filter(
-                QualityForm.production_order_id == production_order.id
-            ).order_by(QualityForm.created_at.desc()).first()
-
-        if existing_quality_form:
-            st.warning("Ya existe un formulario de calidad para esta orden. ¿Qué deseas hacer?")
-            st.session_state.quality_last_form_id = existing_quality_form.id
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("🔄 Actualizar último formulario"):
-                    st.session_state.quality_action = "update"
-                    st.experimental_rerun()
-            with col2:
-                if st.button("➕ Agregar nuevo formulario"):
-                    st.session_state.quality_action = "append"
-                    st.experimental_rerun()
-        else:
-            # No existe formulario de calidad para esta orden, guardar normalmente
-            try:
-                new_form = QualityForm(
-                    production_order_id=production_order.id,
-                    user_id=st.session_state.user.id,
-                    apariencia=apariencia,
-                    color=color,
-                    olor=olor,
-                    humedad=humedad,
-                    proteina=proteina,
-                    grasa=grasa,
-                    fibra=fibra,
-                    cenizas=cenizas
-                )
-                db.add(new_form)
-                production_order.in_quality = True
-                db.commit()
-                st.toast("✅ Datos almacenados con éxito", icon="✅")
-                st.session_state.quality_action = None
-                st.session_state.quality_last_form_id = None
-                st.experimental_rerun()
-            except Exception as e:
-                st.error(f"❌ Error al guardar: {str(e)}")
+        values = dict(
+            apariencia=apariencia, color=color, olor=olor, humedad=humedad,
+            proteina=proteina, grasa=grasa, fibra=fibra, cenizas=cenizas
+        )
+        save_form(db, "quality", order_number, values)
 
-    if st.session_state.quality_action == "update" and st.session_state.quality_last_form_id:
-        try:
-            last_form = db.query(QualityForm).get(st.session_state.quality_last_form_id)
-            last_form.apariencia = st.session_state.quality_apariencia
-            last_form.color = st.session_state.quality_color
-            last_form.olor = st.session_state.quality_olor
-            last_form.humedad = st.session_state.quality_humedad
-            last_form.proteina = st.session_state.quality_proteina
-            last_form.grasa = st.session_state.quality_grasa
-            last_form.fibra = st.session_state.quality_fibra
-            last_form.cenizas = st.session_state.quality_cenizas
-            db.commit()
-            st.toast("✅ Datos almacenados con éxito", icon="✅")
-        except Exception as e:
-            st.error(f"❌ Error al actualizar: {str(e)}")
-        st.session_state.quality_action = None
-        st.session_state.quality_last_form_id = None
-        st.experimental_rerun()
-    elif st.session_state.quality_action == "append" and st.session_state.quality_last_form_id:
-        try:
-            production_order = ProductionOrder.get_by_order_number(db, st.session_state.quality_order_number)
-            new_form = QualityForm(
-                production_order_id=production_order.id,
-                user_id=st.session_state.user.id,
-                apariencia=st.session_state.quality_apariencia,
-                color=st.session_state.quality_color,
-                olor=st.session_state.quality_olor,
-                humedad=st.session_state.quality_humedad,
-                proteina=st.session_state.quality_proteina,
-                grasa=st.session_state.quality_grasa,
-                fibra=st.session_state.quality_fibra,
-                cenizas=st.session_state.quality_cenizas
-            )
-            db.add(new_form)
-            db.commit()
-            st.toast("✅ Datos almacenados con éxito", icon="✅")
-        except Exception as e:
-            st.error(f"❌ Error al agregar: {str(e)}")
-        st.session_state.quality_action = None
-        st.session_state.quality_last_form_id = None
-        st.experimental_rerun()
+    pending_submission(db, "quality", "Ya existe un formulario de calidad para esta orden. ¿Qué deseas hacer?")
 
 @login_required
-def production_form():
+def production_form(db):
     st.title("🏭 Formulario de Producción")
-    db = next(get_db())
-
-    if "production_action" not in st.session_state:
-        st.session_state.production_action = None
-    if "production_last_form_id" not in st.session_state:
-        st.session_state.production_last_form_id = None
 
     with st.form(key="production_form", clear_on_submit=True):
         order_number = st.text_input("Número de Orden de Producción", key="production_order_number", value="")
-        dieta = st.selectbox("Dieta", ["Dieta 1", "Dieta 2", "Dieta 3"], key="production_dieta", index=0)
-        molienda = st.number_input("Molienda (mm)", min_value=0.1, max_value=5.0, step=0.1, key="production_molienda", value=0.1)
-        durabilidad = st.number_input("Durabilidad (%)", min_value=0.0, max_value=100.0, step=0.1, key="production_durabilidad", value=0.0)
-        dureza = st.number_input("Dureza (kg)", min_value=1, max_value=100, step=1, key="production_dureza", value=1)
-        temperatura = st.number_input("Temperatura (°C)", min_value=20, max_value=100, step=1, key="production_temperatura", value=20)
-        peletizadora = st.selectbox("Peletizadora", ["Peletizadora 1", "Peletizadora 2", "Peletizadora 3"], key="production_peletizadora", index=0)
+        dieta = field_input("production", "dieta", PRODUCTION_FIELDS)
+        molienda = field_input("production", "molienda", PRODUCTION_FIELDS)
+        durabilidad = field_input("production", "durabilidad", PRODUCTION_FIELDS)
+        dureza = field_input("production", "dureza", PRODUCTION_FIELDS)
+        temperatura = field_input("production", "temperatura", PRODUCTION_FIELDS)
+        peletizadora = field_input("production", "peletizadora", PRODUCTION_FIELDS)
         submit_button = st.form_submit_button("💾 Enviar")
 
     if submit_button:
         if not order_number:
             st.error("Debes ingresar el número de orden de producción.")
             return
-        production_order = ProductionOrder.get_by_order_number(db, order_number)
-        if not production_order:
-            production_order = ProductionOrder(order_number=order_number)
-            db.add(production_order)
-            db.commit()
-            existing_production_form = None
-        else:
-            existing_production_form = db.query(ProductionForm).filter(
-                ProductionForm.production_order_id == production_order.id
-            ).order_by(ProductionForm.created_at.desc()).first()
-
-        if existing_production_form:
-            st.warning("Ya existe un formulario de producción para esta orden. ¿Qué deseas hacer?")
-            st.session_state.production_last_form_id = existing_production_form.id
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("🔄 Actualizar último formulario"):
-                    st.session_state.production_action = "update"
-                    st.experimental_rerun()
-            with col2:
-                if st.button("➕ Agregar nuevo formulario"):
-                    st.session_state.production_action = "append"
-                    st.experimental_rerun()
-        else:
-            # No existe formulario de producción para esta orden, guardar normalmente
-            try:
-                new_form = ProductionForm(
-                    production_order_id=production_order.id,
-                    user_id=st.session_state.user.id,
-                    dieta=dieta,
-                    molienda=molienda,
-                    durabilidad=durabilidad,
-                    dureza=dureza,
-                    temperatura=temperatura,
-                    peletizadora=peletizadora
-                )
-                db.add(new_form)
-                production_order.in_production = True
-                db.commit()
-                st.toast("✅ Datos almacenados con éxito", icon="✅")
-                st.session_state.production_action = None
-                st.session_state.production_last_form_id = None
-                st.experimental_rerun()
-            except Exception as e:
-                st.error(f"❌ Error al guardar: {str(e)}")
+        values = dict(
+            dieta=dieta, molienda=molienda, durabilidad=durabilidad, dureza=dureza,
+            temperatura=temperatura, peletizadora=peletizadora
+        )
+        save_form(db, "production", order_number, values)
 
-    if st.session_state.production_action == "update" and st.session_state.production_last_form_id:
-        try:
-            last_form = db.query(ProductionForm).get(st.session_state.production_last_form_id)
-            last_form.dieta = st.session_state.production_dieta
-            last_form.molienda = st.session_state.production_molienda
-            last_form.durabilidad = st.session_state.production_durabilidad
-            last_form.dureza = st.session_state.production_dureza
-            last_form.temperatura = st.session_state.production_temperatura
-            last_form.peletizadora = st.session_state.production_peletizadora
-            db.commit()
-            st.toast("✅ Datos almacenados con éxito", icon="✅")
-        except Exception as e:
-            st.error(f"❌ Error al actualizar: {str(e)}")
-        st.session_state.production_action = None
-        st.session_state.production_last_form_id = None
-        st.experimental_rerun()
-    elif st.session_state.production_action == "append" and st.session_state.production_last_form_id:
-        try:
-            production_order = ProductionOrder.get_by_order_number(db, st.session_state.production_order_number)
-            new_form = ProductionForm(
-                production_order_id=production_order.id,
-                user_id=st.session_state.user.id,
-                dieta=st.session_state.production_dieta,
-                molienda=st.session_state.production_molienda,
-                durabilidad=st.session_state.production_durabilidad,
-                dureza=st.session_state.production_dureza,
-                temperatura=st.session_state.production_temperatura,
-                peletizadora=st.session_state.production_peletizadora
-            )
-            db.add(new_form)
-            db.commit()
-            st.toast("✅ Datos almacenados con éxito", icon="✅")
-        except Exception as e:
-            st.error(f"❌ Error al agregar: {str(e)}")
-        st.session_state.production_action = None
-        st.session_state.production_last_form_id = None
-        st.experimental_rerun()
+    pending_submission(db, "production", "Ya existe un formulario de producción para esta orden. ¿Qué deseas hacer?")
 
 @login_required
-def daily_plan_form():
+def daily_plan_form(db):
     st.title("📅 Plan Diario")
     
     if "formulario_enviado" not in st.session_state:
@@ -553,7 +254,6 @@ def daily_plan_form():
         st.session_state["formulario_enviado"] = False
 
     try:
-        db = next(get_db())
         today = date.today()
         
         existing_plan = DailyPlan.get_by_date(db, today)
@@ -578,41 +278,13 @@ def daily_plan_form():
     with st.form(key="plan_diario_formulario"):
         st.subheader("Planificación del Día")
         
-        ordenes_estimadas = st.number_input(
-            "📊 Órdenes de Producción Estimadas",
-            min_value=1,
-            max_value=100,
-            step=1,
-            value=st.session_state.get("ordenes_estimadas", 1),
-            key="ordenes_estimadas"
-        )
+        ordenes_estimadas = plan_input("📊", "estimated_orders", "ordenes_estimadas")
         
-        medida_dado = st.number_input(
-            "⚙️ Medida de Dado (mm)",
-            min_value=1.0,
-            max_value=10.0,
-            step=0.1,
-            value=st.session_state.get("medida_dado", 1.0),
-            key="medida_dado"
-        )
+        medida_dado = plan_input("⚙️", "die_size", "medida_dado")
         
-        toneladas_soya = st.number_input(
-            "🫘 Toneladas de Soya",
-            min_value=0.0,
-            max_value=1000.0,
-            step=0.5,
-            value=st.session_state.get("toneladas_soya", 0.0),
-            key="toneladas_soya"
-        )
+        toneladas_soya = plan_input("🫘", "soy_tons", "toneladas_soya")
         
-        toneladas_torta_maiz = st.number_input(
-            "🌽 Toneladas de Torta de Maíz",
-            min_value=0.0,
-            max_value=1000.0,
-            step=0.5,
-            value=st.session_state.get("toneladas_torta_maiz", 0.0),
-            key="toneladas_torta_maiz"
-        )
+        toneladas_torta_maiz = plan_input("🌽", "corn_cake_tons", "toneladas_torta_maiz")
         
         confirmar = st.checkbox("✅ Confirmo que deseo guardar los datos")
         submit_button = st.form_submit_button("💾 Guardar Plan Diario")
@@ -635,7 +307,6 @@ def daily_plan_form():
                 st.error(f"⚠️ {error}")
         else:
             try:
-                db = next(get_db())
                 today = date.today()
                 
                 existing_plan = DailyPlan.get_by_date(db, today)
@@ -671,9 +342,26 @@ def daily_plan_form():
                 db.rollback()
 
 def main():
+    # Una sesión de base de datos por rerun, cerrada siempre al terminar
+    with session_scope() as db:
+        try:
+            render(db)
+        finally:
+            rerun_timer.mark("página")
+            rerun_timer.report(st.sidebar)
+            sql_trace.end_rerun()
+
+def render(db):
+    if not st.session_state.authenticated:
+        # Al reconectar, la sesión se retoma con el token firmado de la URL
+        user = resume_session(db, User)
+        if user:
+            st.session_state.user = user
+            st.session_state.authenticated = True
     if not st.session_state.authenticated:
-        login_page()
+        login_page(db)
     else:
+        renew_session(st.session_state.user)
         # Mostrar el logo de forma compatible
         st.sidebar.image("logo.png", width=120)
         st.sidebar.write(f"👤 Usuario: {st.session_state.user.username}")
@@ -691,16 +379,18 @@ def main():
         
         # Botón de cerrar sesión al final
         if st.sidebar.button("🚪 Cerrar Sesión"):
+            revoke_sessions(db, st.session_state.user)
             st.session_state.authenticated = False
             st.session_state.user = None
+            forget_session()
             st.rerun()
         
         if page == "📋 Formulario de Calidad":
-            quality_form()
+            quality_form(db)
         elif page == "🏭 Formulario de Producción":
-            production_form()
+            production_form(db)
         elif page == "📅 Plan Diario":
-            daily_plan_form()
+            daily_plan_form(db)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
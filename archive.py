@@ -0,0 +1,382 @@
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import Column, MetaData, Table, and_, delete, event, exists, func, insert, select, union, union_all
+from sqlalchemy.sql.elements import ClauseElement
+from sqlalchemy.sql.util import ClauseAdapter
+from sqlalchemy.sql.visitors import iterate, replacement_traverse
+
+from database import engine
+from models import Base, ProductionOrder, QualityForm, ProductionForm, OrderSummary, ArchiveRun
+import order_summary
+
+logger = logging.getLogger("hermes.archive")
+
+# Archivo por meses (solo SQLite): los formularios más antiguos que
+# HERMES_ARCHIVE_AFTER_DAYS pasan de la base viva a un archivo por mes
+# (forms_AAAA_MM.db en HERMES_ARCHIVE_DIR) junto con una copia de sus
+# órdenes. Las órdenes y los usuarios se quedan en la base viva: los
+# formularios nuevos de una orden antigua siguen usando el mismo número.
+# Las consultas leen solo la base viva salvo que el rango de fechas alcance
+# meses archivados; entonces esos meses se adjuntan a la conexión (ATTACH) y
+# cada tabla de formularios se reemplaza por su unión con los archivos.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("HERMES_ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVED_MODELS = [QualityForm, ProductionForm]
+# SQLite adjunta a lo sumo 10 bases por conexión (SQLITE_MAX_ATTACHED)
+MAX_ATTACHED = 10
+_PARTITION_FILE = re.compile(r"^forms_(\d{4})_(\d{2})\.db$")
+
+def _default_dir(url):
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(url.database)), "archive")
+
+ARCHIVE_DIR = os.environ.get("HERMES_ARCHIVE_DIR") or _default_dir(engine.url)
+
+def archive_dir(target):
+    # Directorio de los archivos de otra base (herramientas con --url)
+    if target.url == engine.url:
+        return ARCHIVE_DIR
+    return os.environ.get("HERMES_ARCHIVE_DIR") or _default_dir(target.url)
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+def next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def partition_path(month, directory=None):
+    return os.path.join(directory or ARCHIVE_DIR, f"forms_{month:%Y_%m}.db")
+
+def partition_schema(month):
+    return f"archive_{month:%Y_%m}"
+
+def partitions(directory=None):
+    # Meses archivados, del más antiguo al más reciente
+    directory = directory or ARCHIVE_DIR
+    if not directory or not os.path.isdir(directory):
+        return []
+    months = []
+    for name in os.listdir(directory):
+        match = _PARTITION_FILE.match(name)
+        if match:
+            months.append(datetime(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+def partitions_for(start_date, end_date=None, directory=None):
+    # Meses archivados que se cruzan con [start_date, end_date)
+    return [
+        month for month in partitions(directory)
+        if next_month(month) > start_date and (end_date is None or month < end_date)
+    ]
+
+def archive_bounds(directory=None):
+    # Primer y último instante cubiertos por los archivos (None si no hay)
+    months = partitions(directory)
+    if not months:
+        return None, None
+    return months[0], next_month(months[-1])
+
+@lru_cache(maxsize=None)
+def partition_table(table, schema):
+    # La misma tabla dentro de un archivo adjunto
+    return table.to_metadata(MetaData(), schema=schema)
+
+def union_table(model, schemas):
+    # La tabla viva unida a sus copias archivadas, con el nombre de la tabla
+    # original para que el resto de la consulta no cambie
+    table = model.__table__
+    names = [column.name for column in table.c]
+    parts = [select(table)]
+    for schema in schemas:
+        archived = partition_table(table, schema)
+        parts.append(select(*[archived.c[name] for name in names]))
+    return union_all(*parts).subquery(table.name)
+
+def _month_range(column, start_date, end_date):
+    conditions = [column >= start_date]
+    if end_date is not None:
+        conditions.append(column < end_date)
+    return conditions
+
+def _summary_table(schemas, start_date, end_date, names):
+    # order_summary solo cubre la base viva: con meses adjuntos se recalcula
+    # para las órdenes con formularios en el rango, y solo en las columnas
+    # que usa la consulta (el modo "latest" solo lee los últimos formularios).
+    # Cada valor es una subconsulta por orden sobre la tabla viva y la de cada
+    # mes, que usa el índice (orden, fecha) de cada una. Se materializa una
+    # sola vez: SQLite reparte los joins con las uniones de formularios en
+    # una rama por tabla y, como subconsulta, lo recalcularía en cada rama.
+    def tables(model):
+        return [model.__table__] + [partition_table(model.__table__, schema) for schema in schemas]
+    orders = union(*[
+        select(table.c.production_order_id.label("order_id"))
+        .where(table.c.production_order_id.isnot(None), *_month_range(table.c.created_at, start_date, end_date))
+        for model in ARCHIVED_MODELS for table in tables(model)
+    ]).subquery()
+    columns = [orders.c.order_id.label("production_order_id")]
+    for model, prefix in order_summary.SUMMARY_SIDES.items():
+        side_tables = tables(model)
+        same_order = [table.c.production_order_id == orders.c.order_id for table in side_tables]
+        def first(selected, descending):
+            # Primer valor de `selected` ordenando los formularios de la orden
+            # por fecha (y a igual fecha, por id)
+            rows = union_all(*[
+                select(table.c.created_at, table.c.id).where(condition).correlate(orders)
+                for table, condition in zip(side_tables, same_order)
+            ])
+            order = [rows.selected_columns.created_at, rows.selected_columns.id]
+            order = [column.desc() if descending else column for column in order]
+            row = rows.order_by(*order).limit(1).subquery()
+            return select(row.c[selected]).scalar_subquery()
+        values = {
+            "count": lambda: sum(select(func.count()).where(condition).scalar_subquery()
+                                 for condition in same_order),
+            "first_at": lambda: first("created_at", False),
+            "last_at": lambda: first("created_at", True),
+            "latest_id": lambda: first("id", True),
+        }
+        columns += [
+            value().label(f"{prefix}_{name}") for name, value in values.items()
+            if f"{prefix}_{name}" in names
+        ]
+    return select(*columns).cte(OrderSummary.__tablename__).prefix_with("MATERIALIZED")
+
+def _summary_replacement(summary):
+    # order_summary (y sus columnas) por el resumen recalculado
+    def replace(element):
+        if isinstance(element, Table) and element.name == OrderSummary.__tablename__:
+            return summary
+        if isinstance(element, Column) and element.table.name == OrderSummary.__tablename__:
+            return summary.c[element.name]
+        return None
+    return replace
+
+def _summary_names(stmt):
+    # Columnas de order_summary que lee la consulta
+    return frozenset(
+        element.name for element in iterate(stmt)
+        if isinstance(element, Column) and isinstance(element.table, Table)
+        and element.table.name == OrderSummary.__tablename__
+    )
+
+def _adapt_statement(conn, clauseelement, multiparams, params, execution_options):
+    reader = conn.info.get("archive_reader")
+    if reader is not None and isinstance(clauseelement, ClauseElement):
+        clauseelement = reader.adapt(clauseelement)
+    return clauseelement, multiparams, params
+
+class ArchiveReader:
+    # Se usa en lugar del engine de lectura (connect() y dialect): sus
+    # conexiones adjuntan los meses del rango y las consultas que se ejecutan
+    # en ellas leen la base viva unida a esos meses
+    def __init__(self, engine, months, start_date, end_date=None, directory=None):
+        if len(months) > MAX_ATTACHED:
+            raise ValueError(f"A lo sumo {MAX_ATTACHED} meses archivados por consulta")
+        self.engine = engine
+        self.dialect = engine.dialect
+        self.months = months
+        self.directory = directory
+        self._schemas = [partition_schema(month) for month in months]
+        self._range = (start_date, end_date)
+        # Cada reemplazo se limita a su tabla
+        self._adapters = [
+            ClauseAdapter(union_table(model, self._schemas), adapt_from_selectables={model.__table__})
+            for model in ARCHIVED_MODELS
+        ]
+        if not event.contains(engine, "before_execute", _adapt_statement):
+            event.listen(engine, "before_execute", _adapt_statement, retval=True)
+
+    def adapt(self, stmt):
+        # El resumen ya lee de cada archivo: se reemplaza después de las tablas
+        names = _summary_names(stmt)
+        for adapter in self._adapters:
+            stmt = adapter.traverse(stmt)
+        if not names:
+            return stmt
+        summary = _summary_table(self._schemas, *self._range, names)
+        return replacement_traverse(stmt, {}, _summary_replacement(summary))
+
+    @contextmanager
+    def connect(self):
+        with self.engine.connect() as conn:
+            attached = []
+            try:
+                for month in self.months:
+                    uri = Path(partition_path(month, self.directory)).absolute().as_uri()
+                    conn.exec_driver_sql(f"ATTACH DATABASE ? AS {partition_schema(month)}", (f"{uri}?mode=ro",))
+                    attached.append(partition_schema(month))
+                conn.info["archive_reader"] = self
+                yield conn
+            finally:
+                conn.info.pop("archive_reader", None)
+                conn.rollback()
+                try:
+                    for schema in attached:
+                        conn.exec_driver_sql(f"DETACH DATABASE {schema}")
+                except Exception:
+                    # Una conexión con archivos adjuntos no vuelve al pool
+                    conn.invalidate()
+                    raise
+
+def attachable_start(start_date, end_date=None, directory=None):
+    # Inicio del rango ajustado para no pasar de MAX_ATTACHED meses archivados
+    months = partitions_for(start_date, end_date, directory)
+    if len(months) <= MAX_ATTACHED:
+        return start_date
+    return months[-MAX_ATTACHED]
+
+def reader(engine, start_date=None, end_date=None, directory=None):
+    # La base viva por defecto; los meses archivados solo si el rango los alcanza
+    if start_date is None or engine.dialect.name != "sqlite":
+        return engine
+    months = partitions_for(start_date, end_date, directory)
+    if not months:
+        return engine
+    return ArchiveReader(engine, months, start_date, end_date, directory)
+
+def _create_partition(conn, schema):
+    tables = [ProductionOrder.__table__, QualityForm.__table__, ProductionForm.__table__]
+    # execution_options cambia la propia conexión: se restaura al terminar
+    conn.execution_options(schema_translate_map={None: schema})
+    try:
+        Base.metadata.create_all(bind=conn, tables=tables, checkfirst=False)
+    finally:
+        conn.execution_options(schema_translate_map=None)
+
+def archive_month(engine, month, directory=None):
+    # Copia los formularios del mes (y sus órdenes) a su archivo y luego los
+    # borra de la base viva. El borrado solo incluye filas idénticas a su
+    # copia: las que cambien entre un paso y otro se archivan en la próxima
+    # ejecución. Devuelve los formularios movidos por tabla.
+    start_date, end_date = month, next_month(month)
+    path = partition_path(month, directory)
+    schema = partition_schema(month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    new = not os.path.exists(path)
+    moved = {}
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"ATTACH DATABASE ? AS {schema}", (path,))
+        conn.commit()
+        try:
+            order_ids = union(*[
+                select(model.production_order_id)
+                .where(model.production_order_id.isnot(None),
+                       *_month_range(model.created_at, start_date, end_date))
+                for model in ARCHIVED_MODELS
+            ])
+            with conn.begin():
+                if new:
+                    _create_partition(conn, schema)
+                for model, source in [(ProductionOrder, ProductionOrder.id.in_(order_ids))] + [
+                    (model, and_(*_month_range(model.created_at, start_date, end_date)))
+                    for model in ARCHIVED_MODELS
+                ]:
+                    table = model.__table__
+                    names = [column.name for column in table.c]
+                    conn.execute(
+                        insert(partition_table(table, schema)).prefix_with("OR REPLACE").from_select(
+                            names, select(*[table.c[name] for name in names]).where(source)
+                        )
+                    )
+            with conn.begin():
+                ids = conn.execute(order_ids).scalars().all()
+                for model in ARCHIVED_MODELS:
+                    archived = partition_table(model.__table__, schema).alias("archived")
+                    copied = exists().where(
+                        archived.c.id == model.id,
+                        archived.c.updated_at.is_not_distinct_from(model.updated_at),
+                    )
+                    moved[model] = conn.execute(
+                        delete(model).where(*_month_range(model.created_at, start_date, end_date), copied)
+                    ).rowcount
+                order_summary.refresh_orders(conn, ids)
+                conn.execute(insert(ArchiveRun).values(
+                    month=f"{month:%Y-%m}",
+                    quality_forms=moved[QualityForm],
+                    production_forms=moved[ProductionForm],
+                ))
+        finally:
+            conn.exec_driver_sql(f"DETACH DATABASE {schema}")
+    return moved
+
+def months_to_archive(conn, before):
+    # Meses con formularios vivos anteriores a `before` (inicio de mes)
+    months = []
+    oldest = [conn.execute(select(func.min(model.created_at))).scalar() for model in ARCHIVED_MODELS]
+    oldest = [moment for moment in oldest if moment is not None]
+    if not oldest:
+        return months
+    month = month_start(min(oldest))
+    while month < before:
+        end_date = next_month(month)
+        if any(
+            conn.execute(select(exists().where(*_month_range(model.created_at, month, end_date)))).scalar()
+            for model in ARCHIVED_MODELS
+        ):
+            months.append(month)
+        month = end_date
+    return months
+
+def archive_forms(engine, after_days=ARCHIVE_AFTER_DAYS, directory=None, now=None):
+    # Solo meses completos: el corte es el inicio del mes de (ahora - after_days)
+    if engine.dialect.name != "sqlite":
+        raise RuntimeError("El archivo por meses solo está disponible con SQLite")
+    before = month_start((now or datetime.utcnow()) - timedelta(days=after_days))
+    with engine.connect() as conn:
+        months = months_to_archive(conn, before)
+    return {month: archive_month(engine, month, directory) for month in months}
+
+def main():
+    parser = argparse.ArgumentParser(description="Mueve los formularios antiguos a archivos por mes")
+    parser.add_argument("--url", help="URL de la base de datos (por defecto la de database.py)")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="Antigüedad mínima en días (se archivan meses completos)")
+    parser.add_argument("--dir", help="Directorio de los archivos (por defecto HERMES_ARCHIVE_DIR)")
+    parser.add_argument("--dry-run", action="store_true", help="Solo listar los meses que se archivarían")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Compactar la base viva al terminar (bloquea las escrituras mientras dura)")
+    args = parser.parse_args()
+
+    from migrations import run_migrations
+    if args.url:
+        from database import create_db_engine
+        target = create_db_engine(args.url)
+    else:
+        target = engine
+    Base.metadata.create_all(bind=target)
+    run_migrations(target, Base.metadata)
+    directory = args.dir or archive_dir(target)
+    if directory is None:
+        print("El archivo por meses solo está disponible con una base SQLite en disco")
+        sys.exit(1)
+
+    if args.dry_run:
+        before = month_start(datetime.utcnow() - timedelta(days=args.days))
+        with target.connect() as conn:
+            months = months_to_archive(conn, before)
+        for month in months:
+            print(f"{month:%Y-%m} -> {partition_path(month, directory)}")
+        print(f"{len(months)} meses por archivar")
+        return
+
+    started = time.perf_counter()
+    moved = archive_forms(target, args.days, directory)
+    for month, counts in moved.items():
+        print(f"{month:%Y-%m}: {counts[QualityForm]} de calidad, {counts[ProductionForm]} de producción")
+    print(f"{len(moved)} meses archivados en {time.perf_counter() - started:.1f} s ({directory})")
+    if args.vacuum and moved:
+        with target.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        print("Base viva compactada")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,83 @@
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from models import User, UserRole
 import streamlit as st
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Costo de los hashes nuevos (pbkdf2 se configura en models.py). Los hashes
+# existentes guardan su propio costo, así que cambiarlo no invalida
+# contraseñas ya creadas.
+BCRYPT_ROUNDS = int(os.environ.get("HERMES_BCRYPT_ROUNDS", "12"))
+
+# La verificación de contraseñas corre en un pool acotado de hilos (pbkdf2 y
+# bcrypt liberan el GIL): en un cambio de turno los inicios de sesión se
+# reparten entre PASSWORD_WORKERS núcleos en lugar de competir todos a la vez
+PASSWORD_WORKERS = int(os.environ.get("HERMES_PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_TIMEOUT = float(os.environ.get("HERMES_PASSWORD_TIMEOUT", "30"))
+
+# Sesiones firmadas: un token con vencimiento permite retomar la sesión
+# al reconectar sin volver a calcular el hash de la contraseña. El secreto
+# es HERMES_SESSION_SECRET o, si no se define, uno generado una sola vez y
+# guardado en HERMES_SESSION_SECRET_FILE: así lo comparten todos los
+# procesos del servidor y las sesiones sobreviven a un reinicio.
+SESSION_SECRET_FILE = os.environ.get(
+    "HERMES_SESSION_SECRET_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".hermes_session_secret"),
+)
+
+def stored_secret(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            secret = f.read().strip()
+        if secret:
+            return secret
+    except FileNotFoundError:
+        pass
+    # Se escribe aparte y se enlaza: si dos procesos arrancan a la vez, el
+    # primer enlace gana y ambos leen el mismo secreto
+    secret = secrets.token_urlsafe(32)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+        f.write(secret)
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
+
+SESSION_SECRET_CONFIGURED = bool(os.environ.get("HERMES_SESSION_SECRET"))
+SESSION_SECRET = os.environ.get("HERMES_SESSION_SECRET") or stored_secret(SESSION_SECRET_FILE)
+# El token va en la URL (credencial al portador: quien la copie entra como
+# el usuario), así que dura poco y se renueva mientras la sesión está activa
+SESSION_TTL = timedelta(minutes=int(os.environ.get("HERMES_SESSION_TTL_MINUTES", "60")))
+SESSION_ALGORITHM = "HS256"
+SESSION_QUERY_PARAM = "session"
+# Destino de cada token (claim "aud"): el de la URL de app.py no sirve en la
+# API de ingesta ni el de la API para retomar una sesión
+SESSION_AUDIENCE = "hermes-session"
+API_AUDIENCE = "hermes-api"
+API_TOKEN_TTL = timedelta(minutes=int(os.environ.get("HERMES_API_TOKEN_TTL_MINUTES", "720")))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password")
+
+def run_password_check(check, *args) -> bool:
+    # Ejecuta la verificación en el pool y espera su resultado
+    return submit_password_check(check, *args).result(timeout=PASSWORD_TIMEOUT)
+
+def submit_password_check(check, *args):
+    # Versión sin espera (devuelve un Future), para código asíncrono
+    return _password_pool.submit(check, *args)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,7 +89,7 @@ def authenticate_user(db: Session, username: str, password: str) -> User:
     user = db.query(User).filter(User.username == username).first()
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    if not run_password_check(verify_password, password, user.password_hash):
         return None
     return user
 
@@ -43,4 +117,80 @@ def login_required(func):
             st.error("Por favor inicie sesión para acceder a esta página")
             return
         return func(*args, **kwargs)
-    return wrapper 
\ No newline at end of file
+    return wrapper 
+
+def create_session_token(user_id: int, version: int = 0, now: Optional[datetime] = None,
+                         audience: str = SESSION_AUDIENCE, ttl: timedelta = SESSION_TTL) -> str:
+    now = now or datetime.now(timezone.utc)
+    claims = {"sub": str(user_id), "ver": version, "aud": audience, "iat": now, "exp": now + ttl}
+    return jwt.encode(claims, SESSION_SECRET, algorithm=SESSION_ALGORITHM)
+
+def session_claims(token: str, audience: str = SESSION_AUDIENCE) -> Optional[Tuple[int, int]]:
+    # (ID del usuario, versión de la sesión) si el token es válido, no ha
+    # vencido y fue emitido para este destino
+    try:
+        claims = jwt.decode(token, SESSION_SECRET, algorithms=[SESSION_ALGORITHM], audience=audience)
+        # python-jose acepta tokens sin "aud" aunque se pida un destino
+        if claims.get("aud") != audience:
+            return None
+        return int(claims["sub"]), int(claims["ver"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+
+def create_api_token(user_id: int, version: int = 0, now: Optional[datetime] = None) -> str:
+    # Token bearer de la API de ingesta; lleva la versión de sesión para que
+    # cerrar sesión también lo invalide
+    return create_session_token(user_id, version, now=now, audience=API_AUDIENCE, ttl=API_TOKEN_TTL)
+
+def api_token_claims(token: str) -> Optional[Tuple[int, int]]:
+    return session_claims(token, API_AUDIENCE)
+
+def session_user(db: Session, token: str, user_model=User):
+    # El usuario del token, si además no cerró sesión después de emitirlo
+    claims = session_claims(token)
+    if claims is None:
+        return None
+    user_id, version = claims
+    user = db.get(user_model, user_id)
+    if user is None or user.session_version != version:
+        return None
+    return user
+
+def remember_session(user) -> None:
+    # El token queda en la URL, que el navegador conserva al reconectar
+    st.query_params[SESSION_QUERY_PARAM] = create_session_token(user.id, user.session_version)
+
+def session_needs_renewal(token: str, now: Optional[datetime] = None) -> bool:
+    # Pasada la mitad de su vigencia el token de la URL se cambia por uno
+    # nuevo: la sesión en uso no vence y uno copiado deja de servir pronto
+    try:
+        claims = jwt.decode(token, SESSION_SECRET, algorithms=[SESSION_ALGORITHM], audience=SESSION_AUDIENCE)
+        issued = datetime.fromtimestamp(int(claims["iat"]), timezone.utc)
+    except (JWTError, KeyError, TypeError, ValueError):
+        return True
+    return (now or datetime.now(timezone.utc)) - issued >= SESSION_TTL / 2
+
+def renew_session(user) -> None:
+    token = st.query_params.get(SESSION_QUERY_PARAM)
+    if not token or session_needs_renewal(token):
+        remember_session(user)
+
+def forget_session() -> None:
+    if SESSION_QUERY_PARAM in st.query_params:
+        del st.query_params[SESSION_QUERY_PARAM]
+
+def revoke_sessions(db: Session, user) -> None:
+    # Cerrar sesión invalida en el servidor todos los tokens ya emitidos
+    # para el usuario (también los copiados de la URL y los de la API)
+    db.execute(update(User).where(User.id == user.id).values(session_version=User.session_version + 1))
+    db.commit()
+
+def resume_session(db: Session, user_model=User):
+    # Retoma una sesión a partir del token de la URL, sin verificar la contraseña
+    token = st.query_params.get(SESSION_QUERY_PARAM)
+    if not token:
+        return None
+    user = session_user(db, token, user_model)
+    if user is None:
+        forget_session()
+    return user
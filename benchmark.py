@@ -0,0 +1,1330 @@
+"""Benchmarks de rendimiento de Hermes.
+
+Cada subcomando crea una base de datos SQLite temporal con datos sintéticos,
+ejecuta el escenario y muestra los tiempos en consola. Ejemplo:
+
+    python benchmark.py loaders --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, User, ProductionOrder, QualityForm, ProductionForm, DailyPlan
+from data_access import load_quality_data, load_production_data, quality_query
+
+ROWS_PER_ORDER = 4
+
+# Generación de datos sintéticos
+@contextmanager
+def temporary_database():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield os.path.join(tmpdir, "bench.db")
+
+def timestamp_pair(start, i, seconds_per_row=15):
+    # created_at y updated_at de la fila i (por defecto un formulario cada 15 segundos)
+    value = (start + timedelta(seconds=seconds_per_row * i)).isoformat(" ", "microseconds")
+    return value, value
+
+def populate_database(path, rows, seed=42, seconds_per_row=15):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    n_orders = max(1, rows // ROWS_PER_ORDER)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (id, username, password_hash, role, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(i, f"user{i}", "x", "OPERATOR", start.isoformat(" ")) for i in range(1, 11)]
+        )
+        conn.executemany(
+            "INSERT INTO production_orders (id, order_number, created_at, updated_at, in_production, in_quality) "
+            "VALUES (?, ?, ?, ?, 1, 1)",
+            ((i, f"OP-{i:07d}", *timestamp_pair(start, i * ROWS_PER_ORDER, seconds_per_row))
+             for i in range(1, n_orders + 1))
+        )
+        conn.executemany(
+            "INSERT INTO quality_forms (production_order_id, user_id, apariencia, color, olor, humedad, proteina, "
+            "grasa, fibra, cenizas, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((i // ROWS_PER_ORDER + 1, rng.randint(1, 10), "A - Excelente", "B - Bueno", "A - Excelente",
+              round(rng.uniform(10, 14), 1), round(rng.uniform(18, 22), 1), round(rng.uniform(2, 4), 1),
+              round(rng.uniform(3, 5), 1), round(rng.uniform(5, 7), 1), *timestamp_pair(start, i, seconds_per_row))
+             for i in range(rows))
+        )
+        conn.executemany(
+            "INSERT INTO production_forms (production_order_id, user_id, dieta, molienda, durabilidad, dureza, "
+            "temperatura, peletizadora, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((i // ROWS_PER_ORDER + 1, rng.randint(1, 10), f"Dieta {rng.randint(1, 3)}",
+              round(rng.uniform(0.1, 5), 1), round(rng.uniform(0, 100), 1), rng.randint(1, 100),
+              rng.randint(20, 100), f"Peletizadora {rng.randint(1, 3)}", *timestamp_pair(start, i, seconds_per_row))
+             for i in range(rows))
+        )
+    conn.close()
+
+    from order_summary import rebuild
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        rebuild(conn)
+    engine.dispose()
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+# Cargadores originales de view_data (una consulta por orden y por usuario en cada fila)
+def legacy_quality_data(db):
+    data = []
+    for form in db.query(QualityForm).all():
+        order = db.query(ProductionOrder).filter(ProductionOrder.id == form.production_order_id).first()
+        user = db.query(User).filter(User.id == form.user_id).first()
+        data.append({
+            'ID': form.id,
+            'Orden de Producción': order.order_number if order else 'N/A',
+            'Usuario': user.username if user else 'N/A',
+            'Apariencia': form.apariencia,
+            'Color': form.color,
+            'Olor': form.olor,
+            'Humedad (%)': form.humedad,
+            'Proteína (%)': form.proteina,
+            'Grasa (%)': form.grasa,
+            'Fibra (%)': form.fibra,
+            'Cenizas (%)': form.cenizas,
+            'Fecha de Creación': form.created_at
+        })
+    return pd.DataFrame(data)
+
+def legacy_production_data(db):
+    data = []
+    for form in db.query(ProductionForm).all():
+        order = db.query(ProductionOrder).filter(ProductionOrder.id == form.production_order_id).first()
+        user = db.query(User).filter(User.id == form.user_id).first()
+        data.append({
+            'ID': form.id,
+            'Orden de Producción': order.order_number if order else 'N/A',
+            'Usuario': user.username if user else 'N/A',
+            'Dieta': form.dieta,
+            'Molienda': form.molienda,
+            'Durabilidad': form.durabilidad,
+            'Dureza': form.dureza,
+            'Temperatura (°C)': form.temperatura,
+            'Pelletizadora': form.peletizadora,
+            'Fecha de Creación': form.created_at
+        })
+    return pd.DataFrame(data)
+
+def bench_loaders(args):
+    print(f"{'filas':>10} {'conjunto':>11} {'original (s)':>13} {'nuevo (s)':>10} {'mejora':>8}")
+    for rows in args.rows:
+        with temporary_database() as path:
+            populate_database(path, rows)
+            engine = create_engine(f"sqlite:///{path}")
+            Session = sessionmaker(bind=engine)
+            cases = [
+                ("calidad", legacy_quality_data, load_quality_data),
+                ("producción", legacy_production_data, load_production_data),
+            ]
+            for name, legacy, loader in cases:
+                with engine.connect() as conn:
+                    new_time, new_df = timed(loader, conn)
+                if rows <= args.legacy_max_rows:
+                    with Session() as db:
+                        old_time, old_df = timed(legacy, db)
+                    pd.testing.assert_frame_equal(old_df, new_df, check_dtype=False)
+                    print(f"{rows:>10} {name:>11} {old_time:>13.3f} {new_time:>10.3f} {old_time / new_time:>7.1f}x")
+                else:
+                    print(f"{rows:>10} {name:>11} {'omitido':>13} {new_time:>10.3f} {'-':>8}")
+            engine.dispose()
+
+def bench_export(args):
+    import tracemalloc
+    import export
+
+    print(f"{'filas':>10} {'método':>22} {'tiempo (s)':>11} {'memoria pico (MB)':>18}")
+    for rows in args.rows:
+        with temporary_database() as path:
+            populate_database(path, rows)
+            engine = create_engine(f"sqlite:///{path}")
+            export.EXPORT_DIR = os.path.join(os.path.dirname(path), "exports")
+
+            def legacy():
+                with engine.connect() as conn:
+                    df = load_quality_data(conn)
+                return df.to_csv(index=False).encode('utf-8')
+
+            cases = [("DataFrame + to_csv", legacy)]
+            for fmt in export.EXPORT_FORMATS:
+                cases.append((f"por bloques ({fmt})", lambda fmt=fmt: export.export_query(engine, quality_query(), fmt)))
+            cases.append(("por bloques (caché)", lambda: export.export_query(engine, quality_query(), "CSV")))
+            for name, func in cases:
+                tracemalloc.start()
+                elapsed, _ = timed(func)
+                peak = tracemalloc.get_traced_memory()[1] / 1e6
+                tracemalloc.stop()
+                print(f"{rows:>10} {name:>22} {elapsed:>11.3f} {peak:>18.1f}")
+            engine.dispose()
+
+# Concurrencia: escritores (app.py) y lectores del dashboard (view_data.py)
+# en procesos distintos sobre el mismo archivo SQLite
+def _concurrency_engine(path, tuned):
+    if tuned:
+        from database import create_db_engine
+        return create_db_engine(f"sqlite:///{path}")
+    # Configuración original: sin WAL, sin busy_timeout explícito
+    return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+def _concurrency_writer(path, tuned, seconds, seed):
+    engine = _concurrency_engine(path, tuned)
+    Session = sessionmaker(bind=engine)
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        db = Session()
+        try:
+            db.add(QualityForm(
+                production_order_id=rng.randint(1, 100), user_id=rng.randint(1, 10),
+                apariencia="A - Excelente", color="B - Bueno", olor="A - Excelente",
+                humedad=12.0, proteina=20.0, grasa=3.0, fibra=4.0, cenizas=6.0
+            ))
+            db.commit()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            db.rollback()
+            errors += 1
+        finally:
+            db.close()
+        time.sleep(0.01)
+    engine.dispose()
+    return "escritor", latencies, errors
+
+def _concurrency_reader(path, tuned, seconds):
+    engine = _concurrency_engine(path, tuned)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                load_quality_data(conn)
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+    engine.dispose()
+    return "lector", latencies, errors
+
+def _percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def bench_concurrency(args):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    print(f"{'configuración':>14} {'rol':>9} {'operaciones':>12} {'errores':>8} "
+          f"{'p50 (ms)':>9} {'p95 (ms)':>9} {'máx (ms)':>9}")
+    failed = False
+    for tuned, name in [(False, "original"), (True, "WAL + pool")]:
+        with temporary_database() as path:
+            populate_database(path, args.rows)
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(args.writers + args.readers, mp_context=context) as pool:
+                futures = [
+                    pool.submit(_concurrency_writer, path, tuned, args.seconds, i) for i in range(args.writers)
+                ] + [
+                    pool.submit(_concurrency_reader, path, tuned, args.seconds) for _ in range(args.readers)
+                ]
+                results = [future.result() for future in futures]
+        for role in ("escritor", "lector"):
+            latencies = [value for r, values, _ in results if r == role for value in values]
+            errors = sum(e for r, _, e in results if r == role)
+            print(f"{name:>14} {role:>9} {len(latencies):>12} {errors:>8} "
+                  f"{_percentile(latencies, 0.5) * 1000:>9.1f} {_percentile(latencies, 0.95) * 1000:>9.1f} "
+                  f"{max(latencies, default=float('nan')) * 1000:>9.1f}")
+            if tuned and errors:
+                failed = True
+    if failed:
+        raise SystemExit("❌ Hubo errores con la configuración WAL + pool")
+
+def bench_logins(args):
+    import threading
+    from werkzeug.security import generate_password_hash, check_password_hash
+    import auth
+    from database import create_db_engine
+
+    method = f"pbkdf2:sha256:{args.iterations}"
+    with temporary_database() as path:
+        engine = create_db_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        password_hash = generate_password_hash("secreto", method=method)
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert(), [
+                {"username": f"operario{i}", "password_hash": password_hash, "role": "OPERATOR"}
+                for i in range(args.sessions)
+            ])
+        tokens = [auth.create_session_token(i + 1) for i in range(args.sessions)]
+
+        def inline_login(i):
+            with Session() as db:
+                user = db.query(User).filter(User.username == f"operario{i}").first()
+                assert check_password_hash(user.password_hash, "secreto")
+
+        def pooled_login(i):
+            with Session() as db:
+                user = db.query(User).filter(User.username == f"operario{i}").first()
+                assert auth.run_password_check(check_password_hash, user.password_hash, "secreto")
+
+        def token_resume(i):
+            with Session() as db:
+                assert auth.session_user(db, tokens[i]) is not None
+
+        print(f"{args.sessions} inicios de sesión simultáneos, pbkdf2 {args.iterations} iteraciones, "
+              f"{auth.PASSWORD_WORKERS} hilos de verificación")
+        print(f"{'método':>26} {'p50 (ms)':>9} {'p95 (ms)':>9} {'total (s)':>10}")
+        for name, login in [
+            ("hash en el hilo del script", inline_login),
+            ("hash en pool acotado", pooled_login),
+            ("retomar con token", token_resume),
+        ]:
+            # Un hilo por sesión de Streamlit, todos arrancan a la vez
+            latencies = [None] * args.sessions
+            barrier = threading.Barrier(args.sessions)
+
+            def session(i):
+                barrier.wait()
+                latencies[i], _ = timed(login, i)
+
+            threads = [threading.Thread(target=session, args=(i,)) for i in range(args.sessions)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            total = time.perf_counter() - start
+            print(f"{name:>26} {_percentile(latencies, 0.5) * 1000:>9.1f} "
+                  f"{_percentile(latencies, 0.95) * 1000:>9.1f} {total:>10.2f}")
+        engine.dispose()
+
+def bench_rerun(args):
+    import gc
+    import statistics
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from streamlit.testing.v1 import AppTest
+
+    # Reruns del formulario de calidad con un usuario ya autenticado, en una
+    # copia de trabajo con su propia base de datos
+    with temporary_database() as path:
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+        app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+        statements = []
+        def record(conn, cursor, statement, *rest):
+            statements.append(statement)
+        event.listen(Engine, "before_cursor_execute", record)
+
+        def schema_statements():
+            # create_all y las migraciones inspeccionan el esquema con PRAGMA
+            # table_info / index_list o ejecutan CREATE / ALTER
+            return [s for s in statements if s.lstrip().upper().startswith(("PRAGMA", "CREATE", "ALTER"))
+                    and "busy_timeout" not in s and "journal_mode" not in s and "synchronous" not in s]
+
+        def engines():
+            return sum(isinstance(o, Engine) for o in gc.get_objects())
+
+        at = AppTest.from_file(app_path, default_timeout=60).run()
+        from models import User, UserRole
+        at.session_state["user"] = User(id=1, username="admin", role=UserRole.ADMIN)
+        at.session_state["authenticated"] = True
+        at.run()
+
+        before_statements, before_engines = len(schema_statements()), engines()
+        times = []
+        for _ in range(args.reruns):
+            elapsed, _ = timed(at.run)
+            times.append(elapsed)
+        if at.exception:
+            raise SystemExit(at.exception[0].message)
+        ddl = len(schema_statements()) - before_statements
+        new_engines = engines() - before_engines
+        event.remove(Engine, "before_cursor_execute", record)
+
+        # Lo que hacía cada rerun antes: engine nuevo, create_all y migraciones
+        def legacy_setup():
+            from migrations import run_migrations
+            from models import Base
+            engine = create_engine(f"sqlite:///{path}")
+            Base.metadata.create_all(bind=engine)
+            run_migrations(engine, Base.metadata)
+            engine.dispose()
+        legacy = [timed(legacy_setup)[0] for _ in range(args.reruns)]
+
+    print(f"{args.reruns} reruns del formulario de calidad")
+    print(f"  rerun completo (AppTest): mediana {statistics.median(times) * 1000:.1f} ms")
+    print(f"  engine + create_all + migraciones evitados por rerun: mediana {statistics.median(legacy) * 1000:.1f} ms")
+    print(f"  sentencias de esquema (PRAGMA/CREATE/ALTER) en los reruns: {ddl}")
+    print(f"  engines nuevos en los reruns: {new_engines}")
+    if ddl or new_engines:
+        raise SystemExit("❌ Los reruns no deberían revisar el esquema ni crear engines")
+
+def bench_import(args):
+    import bulk_import
+    from models import Base
+
+    rng = random.Random(42)
+    grades = ["A - Excelente", "B - Bueno", "C - Regular"]
+    with temporary_database() as path:
+        csv_path = os.path.join(os.path.dirname(path), "calidad.csv")
+        start = datetime(2020, 1, 1)
+        pd.DataFrame({
+            "Orden de Producción": [f"HIST-{i // ROWS_PER_ORDER:07d}" for i in range(args.rows)],
+            "Apariencia": [rng.choice(grades) for _ in range(args.rows)],
+            "Color": [rng.choice(grades) for _ in range(args.rows)],
+            "Olor": [rng.choice(grades) for _ in range(args.rows)],
+            "Humedad (%)": [round(rng.uniform(9.5, 14), 1) for _ in range(args.rows)],
+            "Proteína (%)": [round(rng.uniform(18, 22), 1) for _ in range(args.rows)],
+            "Grasa (%)": [round(rng.uniform(2, 4), 1) for _ in range(args.rows)],
+            "Fibra (%)": [round(rng.uniform(3, 5), 1) for _ in range(args.rows)],
+            "Cenizas (%)": [round(rng.uniform(5, 7), 1) for _ in range(args.rows)],
+            "Fecha de Creación": [(start + timedelta(minutes=i)).isoformat(" ") for i in range(args.rows)],
+        }).to_csv(csv_path, index=False)
+
+        from database import create_db_engine
+        engine = create_db_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+        report = bulk_import.import_forms(engine, csv_path, "calidad", chunk_rows=args.chunk_rows)
+        with engine.connect() as conn:
+            stored = conn.exec_driver_sql("SELECT count(*) FROM quality_forms").scalar()
+        engine.dispose()
+
+    print(f"{report['leidas']} filas leídas, {report['insertadas']} insertadas ({stored} en la base), "
+          f"{report['rechazadas']} rechazadas, {report['ordenes_creadas']} órdenes creadas")
+    print(f"{report['segundos']:.2f} s · {report['filas_por_segundo']:,.0f} formularios/s")
+
+def bench_ingest(args):
+    import asyncio
+    import socket
+    import subprocess
+    import sys
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    with temporary_database() as path:
+        populate_database(path, 1000)
+        from werkzeug.security import generate_password_hash
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE username = 'user1'",
+                         (generate_password_hash("secreto", method="pbkdf2:sha256:1000"),))
+        conn.close()
+
+        # La API corre en su propio proceso, como en producción
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_api.py"),
+             "--port", str(port), "--url", f"sqlite:///{path}"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env={**os.environ, "HERMES_SESSION_SECRET": os.environ.get("HERMES_SESSION_SECRET") or "benchmark"},
+        )
+        try:
+            results = asyncio.run(_ingest_load(base, args))
+        finally:
+            server.terminate()
+            server.wait()
+        conn = sqlite3.connect(path)
+        stored = conn.execute("SELECT count(*) FROM production_forms").fetchone()[0] - 1000
+        conn.close()
+
+    latencies, errors, inserted, elapsed = results
+    forms = len(latencies) * args.batch
+    print(f"{args.concurrency} clientes concurrentes, {args.batch} formulario(s) por solicitud, {args.seconds:.0f} s")
+    print(f"  solicitudes: {len(latencies)} ({len(latencies) / elapsed:,.0f}/s) · errores: {errors}")
+    print(f"  formularios: {forms} ({forms / elapsed:,.0f}/s) · informados por la API: {inserted} · "
+          f"guardados en la base: {stored}")
+    print(f"  latencia p50 {_percentile(latencies, 0.5) * 1000:.1f} ms · "
+          f"p99 {_percentile(latencies, 0.99) * 1000:.1f} ms · máx {max(latencies, default=0) * 1000:.1f} ms")
+    if errors or stored != forms or inserted != forms:
+        raise SystemExit("❌ Hubo solicitudes fallidas o formularios sin guardar")
+
+async def _ingest_load(base, args):
+    import asyncio
+    import json
+    from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+    client = AsyncHTTPClient(max_clients=args.concurrency)
+    for _ in range(100):
+        try:
+            await client.fetch(f"{base}/health")
+            break
+        except (ConnectionError, OSError, HTTPClientError):
+            await asyncio.sleep(0.1)
+    response = await client.fetch(f"{base}/token", method="POST",
+                                  body=json.dumps({"username": "user1", "password": "secreto"}))
+    headers = {"Authorization": f"Bearer {json.loads(response.body)['access_token']}"}
+
+    rng = random.Random(7)
+    def payload():
+        forms = [{
+            "order_number": f"OP-{rng.randint(1, 250):07d}", "dieta": f"Dieta {rng.randint(1, 3)}",
+            "molienda": round(rng.uniform(0.1, 5), 1), "durabilidad": round(rng.uniform(0, 100), 1),
+            "dureza": rng.randint(1, 100), "temperatura": rng.randint(20, 100),
+            "peletizadora": f"Peletizadora {rng.randint(1, 3)}",
+        } for _ in range(args.batch)]
+        return json.dumps(forms[0] if args.batch == 1 else {"forms": forms})
+
+    latencies, errors, inserted = [], 0, 0
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + args.seconds
+
+    async def worker():
+        nonlocal errors, inserted
+        while loop.time() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.fetch(f"{base}/api/produccion", method="POST", headers=headers, body=payload())
+                latencies.append(time.perf_counter() - start)
+                inserted += json.loads(response.body)["insertados"]
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    return latencies, errors, inserted, time.perf_counter() - start
+
+# Envío de formularios desde app.py bajo contención de escritura
+def _legacy_submit(db, order_number, values):
+    # Flujo original de app.quality_form: consulta la orden, la crea con su
+    # propio commit, busca el último formulario y guarda el nuevo con otro commit
+    order = ProductionOrder.get_by_order_number(db, order_number)
+    if not order:
+        order = ProductionOrder(order_number=order_number)
+        db.add(order)
+        db.commit()
+    else:
+        db.query(QualityForm).filter(
+            QualityForm.production_order_id == order.id
+        ).order_by(QualityForm.created_at.desc()).first()
+    try:
+        db.add(QualityForm(production_order_id=order.id, user_id=1, **values))
+        order.in_quality = True
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def _service_submit(db, order_number, values):
+    from form_service import submit_quality_form, APPEND
+    submit_quality_form(db, order_number, 1, values, mode=APPEND)
+
+def _submit_worker(path, flow, seconds, seed, fail_every):
+    from database import create_db_engine
+    engine = create_db_engine(f"sqlite:///{path}")
+    Session = sessionmaker(bind=engine, autoflush=False)
+    submit = {"original": _legacy_submit, "servicio": _service_submit}[flow]
+    rng = random.Random(seed)
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        i += 1
+        values = dict(apariencia="A - Excelente", color="B - Bueno", olor="A - Excelente",
+                      humedad=12.0, proteina=20.0, grasa=3.0, fibra=4.0, cenizas=6.0)
+        if fail_every and i % fail_every == 0:
+            # Formulario que la base rechaza (columna NOT NULL vacía)
+            values["apariencia"] = None
+        # Mitad de los envíos a órdenes nuevas
+        order_number = f"S{seed}-{i}" if rng.random() < 0.5 else f"OP-{rng.randint(1, 250):07d}"
+        start = time.perf_counter()
+        with Session() as db:
+            try:
+                submit(db, order_number, values)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+    engine.dispose()
+    return latencies, failures
+
+def bench_submit(args):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    print(f"{args.workers} procesos enviando formularios durante {args.seconds:.0f} s "
+          f"(1 de cada {args.fail_every} falla al insertar el formulario)")
+    print(f"{'flujo':>9} {'envíos':>7} {'fallidos':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'órdenes huérfanas':>18}")
+    for flow in ("original", "servicio"):
+        with temporary_database() as path:
+            populate_database(path, 1000)
+            from database import create_db_engine
+            from migrations import run_migrations
+            run_migrations(create_db_engine(f"sqlite:///{path}"), Base.metadata)
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(args.workers, mp_context=context) as pool:
+                results = list(pool.map(
+                    _submit_worker, [path] * args.workers, [flow] * args.workers,
+                    [args.seconds] * args.workers, range(args.workers), [args.fail_every] * args.workers
+                ))
+            conn = sqlite3.connect(path)
+            orphans = conn.execute(
+                "SELECT count(*) FROM production_orders o WHERE NOT EXISTS "
+                "(SELECT 1 FROM quality_forms f WHERE f.production_order_id = o.id) "
+                "AND NOT EXISTS (SELECT 1 FROM production_forms f WHERE f.production_order_id = o.id)"
+            ).fetchone()[0]
+            conn.close()
+        latencies = [value for values, _ in results for value in values]
+        failures = sum(f for _, f in results)
+        print(f"{flow:>9} {len(latencies):>7} {failures:>9} {_percentile(latencies, 0.5) * 1000:>9.1f} "
+              f"{_percentile(latencies, 0.95) * 1000:>9.1f} {orphans:>18}")
+
+# Órdenes Completas (último formulario por orden) antes de order_summary:
+# row_number() sobre todos los formularios de ambas tablas
+LEGACY_LATEST_SQL = """
+WITH q AS (
+    SELECT production_order_id AS order_id, id, row_number() OVER (
+        PARTITION BY production_order_id ORDER BY created_at DESC, id DESC) AS rn
+    FROM quality_forms WHERE production_order_id IS NOT NULL
+), p AS (
+    SELECT production_order_id AS order_id, id, row_number() OVER (
+        PARTITION BY production_order_id ORDER BY created_at DESC, id DESC) AS rn
+    FROM production_forms WHERE production_order_id IS NOT NULL
+)
+SELECT o.order_number, q.id, p.id FROM q
+JOIN p ON p.order_id = q.order_id
+JOIN production_orders o ON o.id = q.order_id
+WHERE q.rn = 1 AND p.rn = 1
+ORDER BY o.order_number
+"""
+
+LEGACY_ORDER_OPTIONS_SQL = """
+SELECT order_number FROM production_orders
+WHERE id IN (SELECT production_order_id FROM quality_forms)
+  AND id IN (SELECT production_order_id FROM production_forms)
+ORDER BY order_number
+"""
+
+def _best_of(repeat, func, *args):
+    times, result = [], None
+    for _ in range(repeat):
+        elapsed, result = timed(func, *args)
+        times.append(elapsed)
+    return min(times), result
+
+def bench_summary(args):
+    from data_access import combined_select, order_options
+    from order_summary import rebuild, check
+
+    print(f"{'filas':>9} {'consulta':>30} {'original (s)':>13} {'resumen (s)':>12} {'mejora':>8}")
+    for rows in args.rows:
+        with temporary_database() as path:
+            populate_database(path, rows)
+            engine = create_engine(f"sqlite:///{path}")
+            with engine.connect() as conn:
+                legacy_time, legacy = _best_of(args.repeat, lambda: conn.exec_driver_sql(LEGACY_LATEST_SQL).fetchall())
+                # La consulta nueva trae todas las columnas; la original solo los ids
+                new_time, new = _best_of(args.repeat, lambda: conn.execute(combined_select("latest")).mappings().all())
+                new = [(row['Orden de Producción'], row['Calidad_ID'], row['Producción_ID']) for row in new]
+                assert [tuple(row) for row in legacy] == new, "Los resultados no coinciden"
+                print(f"{rows:>9} {'último formulario por orden':>30} {legacy_time:>13.3f} {new_time:>12.3f} "
+                      f"{legacy_time / new_time:>7.1f}x")
+
+                legacy_time, legacy = _best_of(args.repeat, lambda: conn.exec_driver_sql(LEGACY_ORDER_OPTIONS_SQL).scalars().all())
+                new_time, new = _best_of(args.repeat, order_options, conn, QualityForm, ProductionForm)
+                assert legacy == new, "Los resultados no coinciden"
+                print(f"{rows:>9} {'opciones de orden':>30} {legacy_time:>13.3f} {new_time:>12.3f} "
+                      f"{legacy_time / new_time:>7.1f}x")
+            with engine.begin() as conn:
+                rebuild_time, orders = timed(rebuild, conn)
+            with engine.connect() as conn:
+                assert check(conn) == []
+            print(f"{rows:>9} {'reconstrucción completa':>30} {'':>13} {rebuild_time:>12.3f}   ({orders} órdenes)")
+            engine.dispose()
+
+def bench_rollups(args):
+    import rollups
+    from data_access import load_production_data
+
+    print(f"{'filas':>9} {'construcción (s)':>17} {'refresh +1000 (s)':>18} "
+          f"{'tendencia desde formularios (s)':>32} {'desde rollups (s)':>18}")
+    for rows in args.rows:
+        with temporary_database() as path:
+            populate_database(path, rows)
+            engine = create_engine(f"sqlite:///{path}")
+            build_time, _ = timed(rollups.refresh_all, engine)
+
+            conn = sqlite3.connect(path)
+            with conn:
+                conn.execute(
+                    "INSERT INTO production_forms (production_order_id, user_id, dieta, molienda, durabilidad, "
+                    "dureza, temperatura, peletizadora, created_at, updated_at) SELECT production_order_id, "
+                    "user_id, dieta, molienda, durabilidad, dureza, temperatura, peletizadora, created_at, "
+                    "updated_at FROM production_forms ORDER BY id DESC LIMIT 1000"
+                )
+            conn.close()
+            refresh_time, _ = timed(rollups.refresh, engine, "production")
+
+            # Media y desviación por día, turno y dieta de los parámetros de producción
+            parameters = rollups.ROLLUPS["production"][2]
+            def from_forms():
+                with engine.connect() as conn:
+                    frame = load_production_data(conn)
+                day, shift = rollups.shift_days(frame['Fecha de Creación'])
+                columns = {'Molienda': 'molienda', 'Durabilidad': 'durabilidad',
+                           'Dureza': 'dureza', 'Temperatura (°C)': 'temperatura'}
+                return frame.rename(columns=columns).assign(day=day, shift=shift).groupby(
+                    ['day', 'shift', 'Dieta'])[parameters].agg(['mean', 'std'])
+            def from_rollups():
+                with engine.connect() as conn:
+                    return rollups.load_trends(conn, "production", parameters, by_shift=True, group_by=["dieta"])
+            raw_time, expected = _best_of(args.repeat, from_forms)
+            rollup_time, trends = _best_of(args.repeat, from_rollups)
+            mean = trends.pivot_table(index=["day", "shift", "dieta"], columns="parameter", values="mean")
+            assert np.allclose(mean[parameters].to_numpy(),
+                               expected.xs('mean', axis=1, level=1)[parameters].to_numpy()), "Los resultados no coinciden"
+            print(f"{rows:>9} {build_time:>17.3f} {refresh_time:>18.3f} {raw_time:>32.3f} {rollup_time:>18.3f}")
+            engine.dispose()
+
+def bench_plan(args):
+    import plan_actual
+    from rollups import shift_days
+
+    print(f"{'días':>5} {'filas':>9} {'pandas (s)':>11} {'SQL agrupado (s)':>17} "
+          f"{'vista con caché (s)':>20} {'tras importar (s)':>18}")
+    for days in args.days:
+        with temporary_database() as path:
+            populate_database(path, args.rows, seconds_per_row=days * 86400 / args.rows)
+            engine = create_engine(f"sqlite:///{path}")
+            with engine.connect() as conn:
+                last = conn.execute(select(func.max(ProductionForm.created_at))).scalar()
+            first_day = date(2024, 1, 1)
+            today = plan_actual.production_day(last)
+            rng = random.Random(1)
+            with engine.begin() as conn:
+                conn.execute(insert(DailyPlan), [
+                    {"date": datetime.combine(first_day + timedelta(days=i), datetime.min.time()),
+                     "estimated_orders": rng.randint(250, 400), "die_size": 4.0,
+                     "soy_tons": 10.0, "corn_cake_tons": 5.0}
+                    for i in range(days)
+                ])
+
+            # Referencia: fechas leídas a pandas y agrupadas en memoria
+            def from_pandas():
+                with engine.connect() as conn:
+                    forms = pd.read_sql("SELECT production_order_id, created_at FROM production_forms", conn)
+                day, _ = shift_days(pd.to_datetime(forms["created_at"], format="ISO8601"))
+                return forms.assign(day=day.dt.date).groupby("day")["production_order_id"].nunique()
+            def view(cache):
+                with engine.connect() as conn:
+                    actuals = cache.actuals(conn, first_day, today, today=today)
+                    plans = plan_actual.load_plans(conn, first_day, today)
+                return plan_actual.plan_vs_actual(plans, actuals)
+            raw_time, expected = _best_of(args.repeat, from_pandas)
+            sql_time, frame = _best_of(args.repeat, lambda: view(plan_actual.ActualsCache()))
+            cache = plan_actual.ActualsCache()
+            view(cache)
+            cached_time, cached = _best_of(args.repeat, view, cache)
+            produced = frame["ordenes_producidas"]
+            assert produced[produced > 0].equals(expected.reindex(produced[produced > 0].index)), \
+                "Los resultados no coinciden"
+            assert cached.equals(frame), "La caché no coincide con el cálculo completo"
+
+            # Un formulario importado con fecha de un día cerrado invalida ese día
+            conn = sqlite3.connect(path)
+            with conn:
+                conn.execute(
+                    "INSERT INTO production_forms (production_order_id, user_id, dieta, molienda, durabilidad, "
+                    "dureza, temperatura, peletizadora, created_at, updated_at) SELECT 1, user_id, dieta, "
+                    "molienda, durabilidad, dureza, temperatura, peletizadora, created_at, updated_at "
+                    "FROM production_forms WHERE id = (SELECT MAX(id) FROM production_forms) - ?",
+                    (args.rows // 2,)
+                )
+            conn.close()
+            import_time, imported = timed(view, cache)
+            assert imported.equals(view(plan_actual.ActualsCache())), "La caché no se invalidó"
+            print(f"{days:>5} {args.rows:>9} {raw_time:>11.3f} {sql_time:>17.3f} "
+                  f"{cached_time:>20.3f} {import_time:>18.3f}")
+            engine.dispose()
+
+def bench_backend(args):
+    # Escrituras en la base principal y lecturas en la réplica, con el mismo
+    # código que usan app.py y view_data.py. Sin --url usa un SQLite temporal
+    # (la "réplica" es el mismo archivo abierto en solo lectura); con --url y
+    # --read-url se prueba contra un PostgreSQL local.
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.exc import DBAPIError
+    from sqlalchemy.orm import Session
+    import order_summary
+    import plan_actual
+    import rollups
+    from database import create_db_engine, describe
+    from data_access import load_quality_data, combined_select
+    from form_service import submit_form, upsert_order, APPEND
+    from migrations import run_migrations
+
+    # Las sentencias propias de cada dialecto deben compilar para PostgreSQL
+    # aunque no haya un servidor disponible
+    dialect = postgresql.dialect()
+    now = datetime.utcnow()
+    for stmt in [
+        upsert_order("postgresql", "OP-1", "in_quality", now),
+        order_summary.record_form("postgresql", QualityForm, 1, 1, now, now),
+        rollups._upsert("postgresql", rollups.ROLLUPS["quality"][1]),
+        *[plan_actual.actual_counts_select(model, date(2025, 1, 1), date(2025, 1, 31), -11, "postgresql")
+          for model in plan_actual.ACTUAL_SOURCES],
+        combined_select("latest", order_numbers=["1"]),
+    ]:
+        stmt.compile(dialect=dialect)
+    print("✅ Las sentencias específicas de cada dialecto compilan para PostgreSQL")
+
+    with temporary_database() as path:
+        url = args.url or f"sqlite:///{path}"
+        read_url = args.read_url or url
+        engine = create_db_engine(url)
+        read_engine = create_db_engine(read_url, read_only=True)
+        print(f"principal: {describe(engine)} · lectura: {describe(read_engine)}")
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine, Base.metadata)
+        with engine.begin() as conn:
+            user_id = conn.execute(
+                insert(User).values(username=f"backend-{time.time_ns()}", password_hash="x", role="OPERATOR")
+                .returning(User.id)
+            ).scalar_one()
+
+        values = {"apariencia": "A - Excelente", "color": "B - Bueno", "olor": "A - Excelente",
+                  "humedad": 12.0, "proteina": 20.0, "grasa": 3.0, "fibra": 4.0, "cenizas": 6.0}
+        prefix = f"BK-{time.time_ns()}"
+        start = time.perf_counter()
+        with Session(engine) as db:
+            for i in range(args.forms):
+                submit_form(db, "quality", f"{prefix}-{i % 50}", user_id, values, APPEND)
+        write_time = time.perf_counter() - start
+        rollups.refresh_all(engine)
+
+        # Las lecturas van al engine de solo lectura (en una réplica real
+        # pueden llegar con retraso)
+        deadline = time.monotonic() + args.replica_wait
+        while True:
+            with read_engine.connect() as conn:
+                frame = load_quality_data(conn, order_numbers=[f"{prefix}-{i}" for i in range(50)])
+            if len(frame) == args.forms or time.monotonic() > deadline:
+                break
+            time.sleep(0.1)
+        with read_engine.connect() as conn:
+            stale = order_summary.check(conn)
+            trends = rollups.load_trends(conn, "quality", ["humedad"])
+        assert len(frame) == args.forms, f"La réplica tiene {len(frame)} de {args.forms} formularios"
+        assert not stale, f"{len(stale)} órdenes con resumen desactualizado"
+        assert len(trends), "Sin tendencias"
+
+        try:
+            with read_engine.begin() as conn:
+                conn.execute(insert(DailyPlan).values(date=datetime(2000, 1, 1), estimated_orders=1))
+        except DBAPIError:
+            rejected = True
+        else:
+            rejected = False
+        assert rejected, "El engine de lectura aceptó una escritura"
+        print(f"✅ {args.forms} formularios en {write_time:.2f} s ({args.forms / write_time:,.0f}/s); "
+              "lecturas, resumen y tendencias correctos; el engine de lectura rechaza escrituras")
+        engine.dispose()
+        read_engine.dispose()
+
+def bench_snapshot(args):
+    # Latencia de envío de formularios mientras se exporta la tabla completa,
+    # leyendo de la base principal o de la instantánea (snapshot.py)
+    import multiprocessing
+    import threading
+    from concurrent.futures import ProcessPoolExecutor
+    import export
+    from data_access import quality_query, DATE_COLUMNS
+    from database import create_db_engine
+    from snapshot import Snapshot
+
+    print(f"{args.rows} filas; un escritor envía formularios durante {args.seconds:.0f} s por escenario")
+    print(f"{'lectura':>24} {'envíos':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'máx (ms)':>9} "
+          f"{'exportaciones':>14} {'WAL (MB)':>9}")
+    with temporary_database() as path:
+        populate_database(path, args.rows)
+        engine = create_db_engine(f"sqlite:///{path}")
+        snapshot = Snapshot(engine, f"{path}.snapshot", interval=args.seconds, max_age=args.seconds)
+        copy_time, _ = timed(snapshot.refresh)
+        context = multiprocessing.get_context("spawn")
+        for name, source in [("sin lecturas", None), ("exportación de la base", engine),
+                             ("exportación de la copia", snapshot.engine)]:
+            with engine.connect() as conn:
+                conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            stop = threading.Event()
+            exports = []
+            def export_loop():
+                while not stop.is_set():
+                    target = os.path.join(os.path.dirname(path), "export.csv")
+                    with source.connect() as conn:
+                        export.WRITERS["CSV"](target, export._chunks(
+                            conn, quality_query(), DATE_COLUMNS, export.EXPORT_CHUNK_ROWS))
+                    exports.append(target)
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                future = pool.submit(_submit_worker, path, "servicio", args.seconds, 1, 0)
+                reader = threading.Thread(target=export_loop) if source is not None else None
+                if reader:
+                    reader.start()
+                latencies, failures = future.result()
+                stop.set()
+                if reader:
+                    reader.join()
+            wal = os.path.getsize(f"{path}-wal") / 1e6 if os.path.exists(f"{path}-wal") else 0.0
+            print(f"{name:>24} {len(latencies):>7} {_percentile(latencies, 0.5) * 1000:>9.1f} "
+                  f"{_percentile(latencies, 0.99) * 1000:>9.1f} {max(latencies) * 1000:>9.1f} "
+                  f"{len(exports):>14} {wal:>9.1f}")
+            if failures:
+                raise SystemExit(f"❌ {failures} envíos fallidos")
+        refresh_time, _ = timed(snapshot.refresh)
+        print(f"copia inicial {copy_time:.2f} s · renovación con escrituras recientes {refresh_time:.2f} s")
+        snapshot.engine.dispose()
+        engine.dispose()
+
+def bench_archive(args):
+    # Base viva con los últimos meses contra la base completa: tamaño,
+    # lecturas por defecto (solo la base viva) y consultas cuyo rango alcanza
+    # meses archivados, que deben devolver lo mismo que la base completa
+    import shutil
+    import archive
+    from data_access import combined_select, read_frame, quality_dataset, DATE_COLUMNS, COMBINED_DATE_COLUMNS
+    from database import create_db_engine
+    from pagination import count_rows, keyset_page
+
+    with temporary_database() as path:
+        populate_database(path, args.rows, seconds_per_row=args.seconds_per_row)
+        full_path = os.path.join(os.path.dirname(path), "full.db")
+        shutil.copy(path, full_path)
+        directory = os.path.join(os.path.dirname(path), "archive")
+        full = create_db_engine(f"sqlite:///{full_path}")
+        live = create_db_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=live)
+        now = datetime(2024, 1, 1) + timedelta(seconds=args.rows * args.seconds_per_row)
+
+        elapsed, moved = timed(archive.archive_forms, live, args.days, directory, now)
+        with live.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        forms = sum(sum(counts.values()) for counts in moved.values())
+        archived_size = sum(os.path.getsize(archive.partition_path(month, directory)) for month in moved)
+        print(f"{args.rows} filas por tabla, {len(moved)} meses archivados ({forms} formularios) en {elapsed:.1f} s")
+        print(f"tamaño: completa {os.path.getsize(full_path) / 1e6:.0f} MB · viva "
+              f"{os.path.getsize(path) / 1e6:.0f} MB · archivos {archived_size / 1e6:.0f} MB")
+
+        def dataset_load(engine):
+            with engine.connect() as conn:
+                return quality_dataset().refresh(conn)
+        print(f"{'consulta':>34} {'completa (s)':>13} {'viva (s)':>9} {'filas':>9}")
+        full_time, full_frame = _best_of(3, dataset_load, full)
+        live_time, live_frame = _best_of(3, dataset_load, live)
+        print(f"{'conjunto en memoria (por defecto)':>34} {full_time:>13.3f} {live_time:>9.3f} "
+              f"{len(full_frame):>7}/{len(live_frame)}")
+
+        last = max(moved)
+        start_date, end_date = archive.month_start(last - timedelta(days=1)), last + timedelta(days=45)
+        source = archive.reader(live, start_date, end_date, directory)
+        for name, stmt, keys, date_columns in [
+            ("calidad, rango con archivo", quality_query(start_date=start_date, end_date=end_date),
+             ['Fecha de Creación', 'ID'], DATE_COLUMNS),
+            ("último por orden, rango con archivo",
+             combined_select("latest", start_date=start_date, end_date=end_date),
+             ['Orden de Producción'], COMBINED_DATE_COLUMNS),
+        ]:
+            def page(engine):
+                with engine.connect() as conn:
+                    total = count_rows(conn, stmt)
+                    first, _ = keyset_page(conn, stmt, keys, None, 100, date_columns=date_columns)
+                    return total, first
+            def everything(engine):
+                with engine.connect() as conn:
+                    return read_frame(conn, stmt, date_columns)
+            full_time, (full_total, full_page) = _best_of(3, page, full)
+            live_time, (live_total, live_page) = _best_of(3, page, source)
+            print(f"{name + ' (página)':>34} {full_time:>13.3f} {live_time:>9.3f} {live_total:>9}")
+            expected, actual = everything(full), everything(source)
+            columns = list(expected.columns[:3])
+            if (full_total != live_total or not full_page.equals(live_page)
+                    or not expected.sort_values(columns, ignore_index=True).equals(actual.sort_values(columns, ignore_index=True))):
+                raise SystemExit(f"❌ {name}: los resultados no coinciden con la base completa")
+        print("✅ las consultas con meses archivados coinciden con la base completa")
+        full.dispose()
+        live.dispose()
+
+def bench_columnar(args):
+    # Carga del conjunto de calidad en un proceso nuevo: DataFrame armado
+    # desde la base contra la caché columnar abierta con memory mapping
+    import tracemalloc
+    from columnar import ColumnarDataset
+    from data_access import QUALITY_COLUMNS, quality_dataset
+
+    def peak_memory(dataset, conn):
+        # Aparte del tiempo: tracemalloc hace más lenta la carga
+        tracemalloc.start()
+        try:
+            dataset.refresh(conn)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    print(f"{'filas':>9} {'carga':>26} {'tiempo (s)':>11} {'memoria (MB)':>13}")
+    for rows in args.rows:
+        with temporary_database() as path:
+            populate_database(path, rows)
+            directory = os.path.join(os.path.dirname(path), "columnar")
+            engine = create_engine(f"sqlite:///{path}")
+            with engine.connect() as conn:
+                build_time, _ = timed(ColumnarDataset("quality", QualityForm, QUALITY_COLUMNS, directory).refresh, conn)
+                results = {}
+                for name, factory in [
+                    ("en memoria (por proceso)", quality_dataset),
+                    ("caché columnar (mmap)", lambda: ColumnarDataset("quality", QualityForm, QUALITY_COLUMNS, directory)),
+                ]:
+                    elapsed, frame = _best_of(args.repeat, lambda: factory().refresh(conn))
+                    peak = peak_memory(factory(), conn)
+                    results[name] = frame
+                    print(f"{rows:>9} {name:>26} {elapsed:>11.3f} {peak / 1e6:>13.1f}")
+                expected, actual = results.values()
+                pd.testing.assert_frame_equal(actual, expected, check_categorical=False, check_dtype=False)
+
+            # Formularios nuevos: un segmento más en la caché
+            dataset = ColumnarDataset("quality", QualityForm, QUALITY_COLUMNS, directory)
+            with engine.connect() as conn:
+                dataset.refresh(conn)
+            values, _ = timestamp_pair(datetime(2030, 1, 1), 0)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(
+                    "INSERT INTO quality_forms (production_order_id, user_id, apariencia, color, olor, humedad, "
+                    "proteina, grasa, fibra, cenizas, created_at, updated_at) "
+                    "SELECT production_order_id, user_id, apariencia, color, olor, humedad, proteina, grasa, "
+                    f"fibra, cenizas, '{values}', '{values}' FROM quality_forms LIMIT {args.append}"
+                )
+            with engine.connect() as conn:
+                append_time, frame = timed(dataset.refresh, conn)
+                pd.testing.assert_frame_equal(frame, quality_dataset().refresh(conn),
+                                              check_categorical=False, check_dtype=False)
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            print(f"{rows:>9} construcción {build_time:.2f} s · +{args.append} formularios {append_time:.3f} s "
+                  f"({len(dataset.segments)} segmentos, {size / 1e6:.0f} MB en disco)")
+            engine.dispose()
+    print("✅ la caché columnar coincide con el conjunto en memoria")
+
+def bench_catalog(args):
+    # Lo que consulta db_viewer en cada rerun para mostrar una tabla: antes
+    # la lista de tablas, la reflexión y un COUNT(*) completo; ahora la
+    # versión del esquema y el id máximo (el catálogo se arma una vez)
+    import catalog
+    from sqlalchemy import MetaData, Table, inspect
+    from pagination import count_rows
+
+    def legacy(conn):
+        inspect(conn).get_table_names()
+        table = Table("quality_forms", MetaData(), autoload_with=conn)
+        return count_rows(conn, select(table))
+
+    print(f"{'filas':>9} {'original (s)':>13} {'catálogo (s)':>13} {'construcción (s)':>17} {'mejora':>8}")
+    for rows in args.rows:
+        with temporary_database() as path:
+            populate_database(path, rows)
+            engine = create_engine(f"sqlite:///{path}")
+            shared = catalog.Catalog()
+            def cataloged(conn):
+                table = shared.refresh(conn)["quality_forms"]["table"]
+                return catalog.estimate_rows(conn, table)
+            with engine.connect() as conn:
+                build_time, _ = timed(shared.refresh, conn)
+                legacy_time, exact = _best_of(args.repeat, legacy, conn)
+                new_time, estimate = _best_of(args.repeat, cataloged, conn)
+            assert exact == estimate, "La estimación no coincide con el conteo"
+            print(f"{rows:>9} {legacy_time:>13.4f} {new_time:>13.4f} {build_time:>17.3f} "
+                  f"{legacy_time / new_time:>7.0f}x")
+            engine.dispose()
+
+def bench_sql_trace(args):
+    # Costo de la instrumentación SQL con el cargador original de view_data
+    # (una consulta por orden y por usuario en cada fila) y qué detecta: el
+    # N+1 del cargador original y ninguno en load_quality_data
+    import logging
+    import sql_trace
+
+    # Los N+1 se muestran en la tabla, no en el log
+    logging.getLogger("hermes.sql").setLevel(logging.ERROR)
+
+    def traced(engine, loader):
+        Session = sessionmaker(bind=engine)
+        sql_trace.begin_rerun("benchmark")
+        try:
+            with Session() as db:
+                loader(db)
+        finally:
+            summary = sql_trace.end_rerun()
+        return summary
+
+    print(f"{'filas':>7} {'consultas':>10} {'sin traza (s)':>14} {'con traza (s)':>14} "
+          f"{'µs/consulta':>12} {'N+1':>5} {'consultas (joins)':>18} {'N+1 (joins)':>12}")
+    for rows in args.rows:
+        with temporary_database() as path:
+            populate_database(path, rows)
+            plain = create_engine(f"sqlite:///{path}")
+            # Los resúmenes del benchmark no van a la vista de diagnóstico
+            sql_trace.SQL_TRACE_DIR = os.path.join(os.path.dirname(path), "sql_trace")
+            sql_trace.SQL_TRACE = True
+            instrumented = create_engine(f"sqlite:///{path}")
+            sql_trace.install(instrumented)
+            # Alternados: en una máquina con carga variable ambos ven el mismo ruido
+            off_times, on_times = [], []
+            for _ in range(args.repeat):
+                sql_trace.SQL_TRACE = False
+                off_times.append(timed(traced, plain, legacy_quality_data)[0])
+                sql_trace.SQL_TRACE = True
+                elapsed, summary = timed(traced, instrumented, legacy_quality_data)
+                on_times.append(elapsed)
+            off_time, on_time = min(off_times), min(on_times)
+            joined = traced(instrumented, load_quality_data)
+            sql_trace.SQL_TRACE = False
+            assert summary["n_plus_one"] and not joined["n_plus_one"]
+            overhead = (on_time - off_time) / summary["queries"] * 1e6
+            print(f"{rows:>7} {summary['queries']:>10} {off_time:>14.3f} {on_time:>14.3f} {overhead:>12.1f} "
+                  f"{len(summary['n_plus_one']):>5} {joined['queries']:>18} {len(joined['n_plus_one']):>12}")
+            for suspect in summary["n_plus_one"]:
+                print(f"        {suspect['count']:>6} x {suspect['site']}: {suspect['sql'][:90]}")
+            plain.dispose()
+            instrumented.dispose()
+
+def bench_validate(args):
+    from pydantic import TypeAdapter, ValidationError
+    from typing import List
+    from config import FormSection
+    from validation import form_validator
+
+    print(f"{'filas':>9} {'formulario':>11} {'por fila (s)':>13} {'lote pydantic (s)':>18} "
+          f"{'lote NumPy (s)':>15} {'rechazadas':>11}")
+    for rows in args.rows:
+        for section in FormSection:
+            validator = form_validator(section)
+            rng = np.random.default_rng(7)
+            # Valores alrededor de los límites: ~5 % fuera de especificación
+            frame = pd.DataFrame({
+                name: rng.choice(spec["options"] + ["Otro"], rows, p=[0.99 / len(spec["options"])]
+                                 * len(spec["options"]) + [0.01])
+                if "options" in spec else
+                np.round(rng.uniform(spec["min_value"] - 0.01 * (spec["max_value"] - spec["min_value"]),
+                                     spec["max_value"], rows), 0 if isinstance(spec["step"], int) else 1)
+                for name, spec in validator.fields.items()
+            })
+            records = frame.to_dict("records")
+
+            def per_row():
+                bad = np.zeros(rows, dtype=bool)
+                for i, record in enumerate(records):
+                    try:
+                        validator.validate(record)
+                    except ValidationError:
+                        bad[i] = True
+                return bad
+            adapter = TypeAdapter(List[validator.model])
+            def pydantic_batch():
+                try:
+                    adapter.validate_python(records)
+                    return set()
+                except ValidationError as e:
+                    return {error["loc"][0] for error in e.errors(include_url=False)}
+            def numpy_batch():
+                _, checks = validator.check_batch(frame)
+                return np.logical_or.reduce([mask for mask, _ in checks])
+            row_time, expected = _best_of(1, per_row)
+            batch_time, failed = _best_of(args.repeat, pydantic_batch)
+            numpy_time, bad = _best_of(args.repeat, numpy_batch)
+            assert np.array_equal(bad, expected), "Los resultados no coinciden"
+            assert failed == set(np.flatnonzero(expected).tolist()), "Los resultados no coinciden"
+            print(f"{rows:>9} {section.value:>11} {row_time:>13.3f} {batch_time:>18.3f} "
+                  f"{numpy_time:>15.4f} {int(bad.sum()):>11}")
+
+# Reglas de Western Electric y capacidad recorriendo las muestras una por una
+def loop_spc(values, lsl, usl):
+    ranges = [abs(values[i] - values[i - 1]) for i in range(1, len(values))]
+    center = sum(values) / len(values)
+    sigma = sum(ranges) / len(ranges) / 1.128
+    flagged = 0
+    for i, value in enumerate(values):
+        z = [(v - center) / sigma for v in values[max(0, i - 7):i + 1]]
+        rules = [
+            abs(z[-1]) > 3,
+            (z[-1] > 2 and sum(v > 2 for v in z[-3:]) >= 2) or (z[-1] < -2 and sum(v < -2 for v in z[-3:]) >= 2),
+            (z[-1] > 1 and sum(v > 1 for v in z[-5:]) >= 4) or (z[-1] < -1 and sum(v < -1 for v in z[-5:]) >= 4),
+            len(z) == 8 and (all(v > 0 for v in z) or all(v < 0 for v in z)),
+        ]
+        flagged += any(rules)
+    return flagged, min(usl - center, center - lsl) / (3 * sigma)
+
+def bench_spc(args):
+    import spc
+
+    rng = np.random.default_rng(42)
+    print(f"{'muestras':>10} {'recorrido por fila (s)':>23} {'NumPy (s)':>10} {'carta completa (s)':>19}")
+    for rows in args.rows:
+        lsl, usl = spc.SPEC_LIMITS["humedad"]
+        x = rng.normal(12, 0.5, rows)
+        frame = pd.DataFrame({name: rng.normal((low + high) / 2, (high - low) / 8, rows)
+                              for name, (low, high) in spc.SPEC_LIMITS.items()})
+        frame["dieta"] = pd.Categorical(rng.choice(["Dieta 1", "Dieta 2", "Dieta 3"], rows))
+
+        def vectorized():
+            limits = spc.individuals_limits(x)
+            violations = spc.western_electric(x, limits["center"], limits["sigma"])
+            flagged = int(np.logical_or.reduce(list(violations.values())).sum())
+            return flagged, spc.capability(x, lsl, usl, limits["sigma"])["cpk"]
+        numpy_time, (flagged, cpk) = _best_of(args.repeat, vectorized)
+        loop_time = float("nan")
+        if rows <= args.loop_max:
+            loop_time, (loop_flagged, loop_cpk) = timed(loop_spc, x.tolist(), lsl, usl)
+            assert loop_flagged == flagged and abs(loop_cpk - cpk) < 1e-9, "Los resultados no coinciden"
+        # I-MR, X̄-R y capacidad de los 5 parámetros por dieta (lo que calcula la página SPC)
+        def page():
+            spc.xbar_r(x, 5)
+            return spc.capability_table(frame)
+        page_time, _ = _best_of(args.repeat, page)
+        print(f"{rows:>10,} {loop_time:>23.3f} {numpy_time:>10.3f} {page_time:>19.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de rendimiento de Hermes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    loaders = subparsers.add_parser("loaders", help="Carga de datos de view_data: original (N+1) vs. SELECT con joins")
+    loaders.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    loaders.add_argument(
+        "--legacy-max-rows", type=int, default=100_000,
+        help="No ejecutar el cargador original por encima de este número de filas"
+    )
+    loaders.set_defaults(func=bench_loaders)
+
+    export_parser = subparsers.add_parser("export", help="Descarga de datos: CSV en memoria vs. exportación por bloques")
+    export_parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    export_parser.set_defaults(func=bench_export)
+
+    concurrency = subparsers.add_parser(
+        "concurrency", help="Escritores y lectores del dashboard en procesos distintos: original vs. WAL + pool"
+    )
+    concurrency.add_argument("--rows", type=int, default=200_000)
+    concurrency.add_argument("--writers", type=int, default=4)
+    concurrency.add_argument("--readers", type=int, default=2)
+    concurrency.add_argument("--seconds", type=float, default=10.0)
+    concurrency.set_defaults(func=bench_concurrency)
+
+    logins = subparsers.add_parser("logins", help="Inicios de sesión simultáneos (cambio de turno)")
+    logins.add_argument("--sessions", type=int, default=40)
+    logins.add_argument("--iterations", type=int, default=600_000, help="Iteraciones de pbkdf2")
+    logins.set_defaults(func=bench_logins)
+
+    rerun = subparsers.add_parser("rerun", help="Costo de un rerun de app.py (sin DDL ni engines nuevos)")
+    rerun.add_argument("--reruns", type=int, default=20)
+    rerun.set_defaults(func=bench_rerun)
+
+    import_parser = subparsers.add_parser("import", help="Importación masiva de un CSV de formularios de calidad")
+    import_parser.add_argument("--rows", type=int, default=500_000)
+    import_parser.add_argument("--chunk-rows", type=int, default=50_000)
+    import_parser.set_defaults(func=bench_import)
+
+    ingest = subparsers.add_parser("ingest", help="Prueba de carga de la API de ingesta (ingest_api.py)")
+    ingest.add_argument("--concurrency", type=int, default=50)
+    ingest.add_argument("--batch", type=int, default=1, help="Formularios por solicitud")
+    ingest.add_argument("--seconds", type=float, default=10.0)
+    ingest.set_defaults(func=bench_ingest)
+
+    submit = subparsers.add_parser("submit", help="Envío de formularios bajo contención: flujo original vs. form_service")
+    submit.add_argument("--workers", type=int, default=4)
+    submit.add_argument("--seconds", type=float, default=10.0)
+    submit.add_argument("--fail-every", type=int, default=20)
+    submit.set_defaults(func=bench_submit)
+
+    summary = subparsers.add_parser("summary", help="Órdenes Completas: row_number() sobre los formularios vs. order_summary")
+    summary.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    summary.add_argument("--repeat", type=int, default=3)
+    summary.set_defaults(func=bench_summary)
+
+    rollups_parser = subparsers.add_parser("rollups", help="Tendencias por día y turno: formularios vs. tablas de rollups")
+    rollups_parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 500_000])
+    rollups_parser.add_argument("--repeat", type=int, default=3)
+    rollups_parser.set_defaults(func=bench_rollups)
+
+    spc_parser = subparsers.add_parser("spc", help="Control estadístico: recorrido por fila vs. NumPy")
+    spc_parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    spc_parser.add_argument("--loop-max", type=int, default=1_000_000,
+                            help="Tamaño máximo para el que se mide el recorrido por fila")
+    spc_parser.add_argument("--repeat", type=int, default=3)
+    spc_parser.set_defaults(func=bench_spc)
+
+    plan_parser = subparsers.add_parser("plan", help="Plan vs. real: agregación por día con y sin caché de días cerrados")
+    plan_parser.add_argument("--days", type=int, nargs="+", default=[365])
+    plan_parser.add_argument("--rows", type=int, default=500_000)
+    plan_parser.add_argument("--repeat", type=int, default=3)
+    plan_parser.set_defaults(func=bench_plan)
+
+    backend = subparsers.add_parser(
+        "backend", help="Base principal y réplica de lectura (SQLite temporal o --url/--read-url)"
+    )
+    backend.add_argument("--url", help="URL de la base principal (p. ej. postgresql://localhost/hermes)")
+    backend.add_argument("--read-url", help="URL de la réplica de solo lectura (por defecto la principal)")
+    backend.add_argument("--forms", type=int, default=500)
+    backend.add_argument("--replica-wait", type=float, default=5.0,
+                         help="Segundos que se espera a que la réplica alcance a la principal")
+    backend.set_defaults(func=bench_backend)
+
+    snapshot = subparsers.add_parser(
+        "snapshot", help="Latencia de escritura durante una exportación: base principal vs. instantánea"
+    )
+    snapshot.add_argument("--rows", type=int, default=1_000_000)
+    snapshot.add_argument("--seconds", type=float, default=10.0)
+    snapshot.set_defaults(func=bench_snapshot)
+
+    validate = subparsers.add_parser("validate", help="Validación de formularios: fila por fila vs. lote con NumPy")
+    validate.add_argument("--rows", type=int, nargs="+", default=[100_000])
+    validate.add_argument("--repeat", type=int, default=3)
+    validate.set_defaults(func=bench_validate)
+
+    archive_parser = subparsers.add_parser("archive", help="Archivo por meses: base viva vs. base completa")
+    archive_parser.add_argument("--rows", type=int, default=1_000_000)
+    archive_parser.add_argument("--seconds-per-row", type=int, default=60, help="Separación entre formularios")
+    archive_parser.add_argument("--days", type=int, default=90, help="Antigüedad a partir de la cual se archiva")
+    archive_parser.set_defaults(func=bench_archive)
+
+    catalog_parser = subparsers.add_parser("catalog", help="db_viewer por rerun: reflexión y COUNT(*) vs. catálogo")
+    catalog_parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    catalog_parser.add_argument("--repeat", type=int, default=5)
+    catalog_parser.set_defaults(func=bench_catalog)
+
+    columnar_parser = subparsers.add_parser(
+        "columnar", help="Carga del conjunto de calidad: DataFrame desde la base vs. caché columnar con mmap"
+    )
+    columnar_parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    columnar_parser.add_argument("--append", type=int, default=1_000, help="Formularios nuevos después de la carga")
+    columnar_parser.add_argument("--repeat", type=int, default=3)
+    columnar_parser.set_defaults(func=bench_columnar)
+
+    trace_parser = subparsers.add_parser(
+        "sql-trace", help="Instrumentación SQL: costo por consulta y detección de N+1"
+    )
+    trace_parser.add_argument("--rows", type=int, nargs="+", default=[2_000, 10_000])
+    trace_parser.add_argument("--repeat", type=int, default=3)
+    trace_parser.set_defaults(func=bench_sql_trace)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Importación masiva de formularios históricos de calidad y producción.
+
+Lee archivos CSV o Excel (.xlsx) por bloques, valida cada bloque con los
+mismos validadores que la UI y la API (validation.py), crea en bloque las
+órdenes de producción que falten e inserta los formularios con executemany,
+una transacción por bloque. Ejemplo:
+
+    python bulk_import.py calidad historico_laboratorio.csv --rejects rechazos.csv
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import FormSection
+from data_access import QUALITY_COLUMNS, PRODUCTION_COLUMNS
+from models import User, ProductionOrder, QualityForm, ProductionForm
+from order_summary import refresh_orders
+from validation import form_validator
+
+IMPORT_CHUNK_ROWS = 50_000
+# Tamaño de los IN (...) al buscar órdenes existentes
+ORDER_LOOKUP_BATCH = 500
+
+_DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+# Tipo de formulario: (modelo, sección del registro de campos, columnas del
+# dashboard, bandera que se marca en la orden de producción)
+FORM_TYPES = {
+    "calidad": (QualityForm, FormSection.QUALITY, QUALITY_COLUMNS, "in_quality"),
+    "produccion": (ProductionForm, FormSection.PRODUCTION, PRODUCTION_COLUMNS, "in_production"),
+}
+
+def _normalize(name):
+    return str(name).strip().lower()
+
+def column_aliases(fields, dashboard_columns):
+    # Encabezados aceptados para cada campo: el nombre de la columna en la
+    # base de datos, la etiqueta del formulario y la del dashboard (así un
+    # archivo exportado desde view_data se puede volver a importar)
+    aliases = {
+        "order_number": "order_number", "orden de producción": "order_number",
+        "username": "username", "usuario": "username",
+        "created_at": "created_at", "fecha de creación": "created_at",
+    }
+    for name, spec in fields.items():
+        aliases[_normalize(name)] = name
+        aliases[_normalize(spec["label"])] = name
+    for label, expr in dashboard_columns:
+        if getattr(expr, "key", None) in fields:
+            aliases[_normalize(label)] = expr.key
+    return aliases
+
+def _excel_chunks(path, chunk_rows, sheet=None):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Para importar archivos Excel instale openpyxl (pip install openpyxl)")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        rows = worksheet.iter_rows(values_only=True)
+        header = ["" if cell is None else str(cell) for cell in next(rows, ())]
+        batch = []
+        for row in rows:
+            if any(cell is not None for cell in row):
+                batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+def read_chunks(path, chunk_rows=IMPORT_CHUNK_ROWS, sheet=None):
+    if os.path.splitext(path)[1].lower() in (".xlsx", ".xlsm"):
+        return _excel_chunks(path, chunk_rows, sheet)
+    return pd.read_csv(path, chunksize=chunk_rows, dtype=str, skipinitialspace=True)
+
+def _order_text(value):
+    # Excel entrega los números de orden como float (1234.0)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return None if pd.isna(value) else str(value).strip()
+
+def _order_numbers(column):
+    if column.dtype == object and column.map(type, na_action="ignore").eq(str).all():
+        return column.str.strip()
+    return column.map(_order_text)
+
+def validate_chunk(df, validator, aliases, user_ids, default_user_id=None):
+    # Devuelve (filas válidas con los valores ya convertidos, filas rechazadas
+    # con el motivo). Todas las comprobaciones son vectorizadas.
+    original = df
+    fields = validator.fields
+    df = df.rename(columns=lambda c: aliases.get(_normalize(c), c))
+    missing = [spec["label"] for name, spec in fields.items()
+               if name not in df.columns and spec.get("required", True)]
+    if "order_number" not in df.columns:
+        missing.insert(0, "Orden de Producción")
+    if missing:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(missing)}")
+
+    # (filas con problema, motivo); el texto del motivo solo se arma para las
+    # filas rechazadas
+    checks = []
+    clean = pd.DataFrame(index=df.index)
+
+    clean["order_number"] = _order_numbers(df["order_number"])
+    checks.append((clean["order_number"].isna() | (clean["order_number"] == ""), "orden de producción vacía"))
+
+    values, field_checks = validator.check_batch(df)
+    checks.extend(field_checks)
+    clean = clean.join(values)
+
+    if "username" in df.columns:
+        usernames = df["username"].astype("string").str.strip()
+        user_id = usernames.map(user_ids).astype("Int64")
+        checks.append((usernames.notna() & (usernames != "") & user_id.isna(), "usuario desconocido"))
+        clean["user_id"] = user_id if default_user_id is None else user_id.fillna(default_user_id)
+    else:
+        clean["user_id"] = pd.Series(default_user_id, index=df.index, dtype="Int64")
+
+    now = pd.Timestamp(datetime.utcnow())
+    if "created_at" in df.columns:
+        created = pd.to_datetime(df["created_at"], errors="coerce", format="ISO8601")
+        retry = df["created_at"].notna() & created.isna()
+        if retry.any():
+            # Fechas en otros formatos (p. ej. de Excel o escritas a mano)
+            created[retry] = pd.to_datetime(
+                df.loc[retry, "created_at"], errors="coerce", format="mixed", dayfirst=True
+            )
+        checks.append((df["created_at"].notna() & created.isna(), "fecha de creación inválida"))
+        clean["created_at"] = created.fillna(now)
+    else:
+        clean["created_at"] = now
+
+    masks = [np.asarray(mask, dtype=bool) for mask, _ in checks]
+    rejected = np.logical_or.reduce(masks)
+    reasons = pd.Series("", index=df.index[rejected])
+    for mask, (_, reason) in zip(masks, checks):
+        reasons[mask[rejected]] += f"{reason}; "
+    rejects = original[rejected].assign(motivo=reasons.str.rstrip("; "))
+    return clean[~rejected], rejects
+
+def _batches(values, size):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _order_ids(conn, order_numbers):
+    orders = ProductionOrder.__table__
+    ids = {}
+    for batch in _batches(list(order_numbers), ORDER_LOOKUP_BATCH):
+        ids.update(conn.execute(
+            select(orders.c.order_number, orders.c.id).where(orders.c.order_number.in_(batch))
+        ).all())
+    return ids
+
+def ensure_orders(conn, order_numbers, flag):
+    # Devuelve ({número de orden: id}, órdenes creadas), creando en bloque
+    # las órdenes que no existen y marcando la bandera del formulario en las
+    # existentes
+    orders = ProductionOrder.__table__
+    ids = _order_ids(conn, order_numbers)
+    now = datetime.utcnow()
+    missing = [number for number in order_numbers if number not in ids]
+    created = 0
+    if missing:
+        # ON CONFLICT DO NOTHING, como form_service.upsert_order: una orden
+        # que otro escritor crea entre la búsqueda y el INSERT no hace fallar
+        # el bloque; su id se lee después junto con las demás
+        created = insert_rows(conn, orders, pd.DataFrame({
+            "order_number": missing, "created_at": pd.Timestamp(now), "updated_at": pd.Timestamp(now),
+            "in_production": flag == "in_production", "in_quality": flag == "in_quality",
+        }), stmt=_DIALECT_INSERTS[conn.dialect.name](orders).on_conflict_do_nothing(
+            index_elements=[orders.c.order_number]
+        ))
+        ids.update(_order_ids(conn, missing))
+
+    # Las órdenes recién creadas ya tienen la bandera
+    for batch in _batches(list(ids.values()), ORDER_LOOKUP_BATCH):
+        conn.execute(
+            update(orders).where(orders.c.id.in_(batch), orders.c[flag].isnot(True))
+            .values({flag: True, "updated_at": now})
+        )
+    return ids, created
+
+def _driver_values(series, dialect_name):
+    # Columna como lista de valores de Python que el driver acepta directamente
+    if pd.api.types.is_datetime64_any_dtype(series) and dialect_name == "sqlite":
+        # Mismo formato de texto con el que SQLAlchemy guarda DateTime en SQLite
+        text = np.datetime_as_string(series.to_numpy(dtype="datetime64[us]"), unit="us")
+        return [value.replace("T", " ") for value in text.tolist()]
+    if series.hasnans:
+        return series.astype(object).where(series.notna(), None).tolist()
+    return series.tolist()
+
+def insert_rows(conn, table, records, stmt=None):
+    # executemany directo del driver con tuplas: evita construir un diccionario
+    # y procesar los parámetros fila por fila en SQLAlchemy. stmt reemplaza el
+    # INSERT simple (p. ej. con ON CONFLICT). Devuelve las filas insertadas.
+    values = {column: _driver_values(records[column], conn.dialect.name) for column in records.columns}
+    columns = list(values)
+    compiled = (insert(table) if stmt is None else stmt).compile(dialect=conn.dialect, column_keys=columns)
+    if compiled.positional:
+        rows = list(zip(*[values[name] for name in compiled.positiontup]))
+    else:
+        rows = [dict(zip(columns, row)) for row in zip(*values.values())]
+    if not rows:
+        return 0
+    result = conn.exec_driver_sql(str(compiled), rows)
+    # sqlite3 y psycopg2 suman las filas de todo el executemany
+    return result.rowcount if result.rowcount >= 0 else len(rows)
+
+def import_chunk(conn, model, flag, valid):
+    # Devuelve (formularios insertados, órdenes creadas)
+    order_ids, created = ensure_orders(conn, valid["order_number"].unique(), flag)
+    records = valid.drop(columns="order_number")
+    records.insert(0, "production_order_id", valid["order_number"].map(order_ids))
+    # updated_at es el momento de la escritura aunque created_at sea
+    # histórico: las lecturas incrementales (data_access.py) releen desde ahí
+    records["updated_at"] = pd.Timestamp(datetime.utcnow())
+    inserted = insert_rows(conn, model.__table__, records)
+    refresh_orders(conn, order_ids.values())
+    return inserted, created
+
+def import_forms(engine, path, form_type, chunk_rows=IMPORT_CHUNK_ROWS, sheet=None,
+                 default_username=None, rejects_path=None, progress=None):
+    model, section, dashboard_columns, flag = FORM_TYPES[form_type]
+    validator = form_validator(section)
+    aliases = column_aliases(validator.fields, dashboard_columns)
+    with engine.connect() as conn:
+        user_ids = dict(conn.execute(select(User.username, User.id)).all())
+    default_user_id = None
+    if default_username is not None:
+        if default_username not in user_ids:
+            raise ValueError(f"El usuario {default_username} no existe")
+        default_user_id = user_ids[default_username]
+
+    report = {"leidas": 0, "insertadas": 0, "rechazadas": 0, "ordenes_creadas": 0}
+    start = time.perf_counter()
+    first_reject = True
+    for chunk in read_chunks(path, chunk_rows, sheet):
+        valid, rejects = validate_chunk(chunk, validator, aliases, user_ids, default_user_id)
+        if len(valid):
+            # Una transacción por bloque: un bloque se guarda completo o no se guarda
+            with engine.begin() as conn:
+                inserted, created = import_chunk(conn, model, flag, valid)
+            report["insertadas"] += inserted
+            report["ordenes_creadas"] += created
+        if rejects_path and len(rejects):
+            rejects.to_csv(rejects_path, mode="w" if first_reject else "a", header=first_reject, index=False)
+            first_reject = False
+        report["leidas"] += len(chunk)
+        report["rechazadas"] += len(rejects)
+        if progress:
+            progress(report)
+
+    report["segundos"] = time.perf_counter() - start
+    report["filas_por_segundo"] = report["insertadas"] / report["segundos"] if report["segundos"] else 0.0
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Importación masiva de formularios históricos")
+    parser.add_argument("form_type", choices=list(FORM_TYPES), help="Tipo de formulario")
+    parser.add_argument("path", help="Archivo CSV o Excel (.xlsx)")
+    parser.add_argument("--sheet", help="Hoja del archivo Excel (por defecto la activa)")
+    parser.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS, help="Filas por bloque y transacción")
+    parser.add_argument("--username", help="Usuario asignado a las filas sin columna de usuario")
+    parser.add_argument("--rejects", help="Archivo CSV donde guardar las filas rechazadas y el motivo")
+    parser.add_argument("--url", help="URL de la base de datos (por defecto la de database.py)")
+    args = parser.parse_args()
+
+    from database import create_db_engine, engine, init_db
+    if args.url:
+        engine = create_db_engine(args.url)
+        from models import Base
+        from migrations import run_migrations
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine, Base.metadata)
+    else:
+        init_db()
+
+    def progress(report):
+        print(f"  {report['leidas']:>10} filas leídas · {report['insertadas']} insertadas · "
+              f"{report['rechazadas']} rechazadas", file=sys.stderr)
+
+    try:
+        report = import_forms(
+            engine, args.path, args.form_type, chunk_rows=args.chunk_rows, sheet=args.sheet,
+            default_username=args.username, rejects_path=args.rejects, progress=progress
+        )
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"✅ {report['insertadas']} formularios insertados en {report['segundos']:.2f} s "
+          f"({report['filas_por_segundo']:,.0f} filas/s)")
+    print(f"   Órdenes de producción creadas: {report['ordenes_creadas']}")
+    if report["rechazadas"]:
+        destino = f" (ver {args.rejects})" if args.rejects else ""
+        print(f"⚠️ {report['rechazadas']} filas rechazadas{destino}")
+
+if __name__ == "__main__":
+    main()
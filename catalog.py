@@ -0,0 +1,146 @@
+import random
+import threading
+
+from sqlalchemy import Integer, MetaData, Table, false, func, inspect, select, text
+from sqlalchemy.exc import OperationalError
+
+# Catálogo de la base para db_viewer.py: tablas, columnas, índices, filas
+# estimadas y tamaño en disco de cada tabla e índice, leído con una sola
+# conexión y guardado hasta que cambie el esquema. Cada rerun solo consulta
+# la versión del esquema (PRAGMA schema_version en SQLite, un md5 de
+# pg_attribute en PostgreSQL).
+#   - SQLite: tamaños con dbstat (si SQLite se compiló con él) y filas con
+#     sqlite_stat1 (después de ANALYZE) o el rowid máximo
+#   - PostgreSQL: pg_class (reltuples) y pg_relation_size
+
+_PG_SCHEMA_VERSION = text("""
+    SELECT md5(string_agg(a.attrelid || ':' || a.attname || ':' || a.atttypid, ','
+                          ORDER BY a.attrelid, a.attnum))
+    FROM pg_attribute a JOIN pg_class c ON c.oid = a.attrelid
+    WHERE c.relnamespace = 'public'::regnamespace AND a.attnum > 0 AND NOT a.attisdropped
+""")
+
+_PG_SIZES = text("""
+    SELECT c.relname, c.reltuples, pg_relation_size(c.oid)
+    FROM pg_class c
+    WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'i', 'p')
+""")
+
+# Filas de la muestra aleatoria
+SAMPLE_ROWS = 100
+
+def schema_version(conn):
+    if conn.dialect.name == "sqlite":
+        return conn.exec_driver_sql("PRAGMA schema_version").scalar()
+    if conn.dialect.name == "postgresql":
+        return conn.execute(_PG_SCHEMA_VERSION).scalar()
+    return None
+
+def _sqlite_stats(conn):
+    # Tamaño en bytes y filas estimadas por tabla o índice
+    sizes, rows = {}, {}
+    try:
+        sizes = dict(conn.exec_driver_sql("SELECT name, pgsize FROM dbstat WHERE aggregate = 1").fetchall())
+    except OperationalError:
+        # SQLite sin SQLITE_ENABLE_DBSTAT_VTAB
+        pass
+    has_stat1 = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+    ).scalar()
+    if has_stat1:
+        # El primer número de cada fila es el total de filas de la tabla
+        for name, stat in conn.exec_driver_sql("SELECT tbl, stat FROM sqlite_stat1").fetchall():
+            rows[name] = int(stat.split()[0])
+    return sizes, rows
+
+def _pg_stats(conn):
+    sizes, rows = {}, {}
+    for name, tuples, size in conn.execute(_PG_SIZES).fetchall():
+        sizes[name] = size
+        # reltuples es -1 en tablas que nunca se analizaron
+        if tuples >= 0:
+            rows[name] = int(tuples)
+    return sizes, rows
+
+def integer_key(table):
+    # Llave primaria de una sola columna entera (rowid en SQLite)
+    columns = list(table.primary_key.columns)
+    if len(columns) == 1 and isinstance(columns[0].type, Integer):
+        return columns[0]
+    return None
+
+def estimate_rows(conn, table):
+    # Sin recorrer la tabla: el id máximo (una búsqueda en la llave primaria)
+    key = integer_key(table)
+    if key is None:
+        return None
+    return conn.execute(select(func.max(key))).scalar() or 0
+
+def build(conn):
+    inspector = inspect(conn)
+    stats = {"sqlite": _sqlite_stats, "postgresql": _pg_stats}.get(conn.dialect.name)
+    sizes, rows = stats(conn) if stats else ({}, {})
+    metadata = MetaData()
+    tables = {}
+    for name in inspector.get_table_names():
+        table = Table(name, metadata, autoload_with=conn)
+        indexes = [
+            {
+                "name": index["name"],
+                "columns": ", ".join(column or "(expresión)" for column in index["column_names"]),
+                "unique": bool(index["unique"]),
+                "size": sizes.get(index["name"]),
+            }
+            for index in inspector.get_indexes(name)
+        ]
+        estimate = rows.get(name)
+        if estimate is None:
+            estimate = estimate_rows(conn, table)
+        tables[name] = {
+            "table": table,
+            "rows": estimate,
+            "size": sizes.get(name),
+            "index_size": sum(index["size"] or 0 for index in indexes) if sizes else None,
+            "indexes": indexes,
+        }
+    return tables
+
+class Catalog:
+    # Compartido entre sesiones (st.cache_resource); se reconstruye cuando
+    # cambia la versión del esquema o cuando se pide explícitamente
+    def __init__(self):
+        self.version = None
+        self.tables = None
+        self._lock = threading.Lock()
+
+    def refresh(self, conn, force=False):
+        with self._lock:
+            version = schema_version(conn)
+            if force or self.tables is None or version != self.version:
+                self.tables = build(conn)
+                self.version = version
+            return self.tables
+
+def sample_select(conn, table, size=SAMPLE_ROWS, seed=None):
+    # Muestra aleatoria sin recorrer la tabla: ids al azar entre el mínimo y
+    # el máximo de la llave entera (sobran para cubrir los huecos). Sin llave
+    # entera, TABLESAMPLE en PostgreSQL u ORDER BY random() en SQLite.
+    key = integer_key(table)
+    if key is not None:
+        # Un MIN/MAX por subconsulta, como data_access.date_bounds_select
+        low, high = conn.execute(select(
+            select(func.min(key)).scalar_subquery(), select(func.max(key)).scalar_subquery()
+        )).one()
+        if low is None:
+            return select(table).where(false())
+        if high - low < size * 4:
+            return select(table).order_by(func.random()).limit(size)
+        rng = random.Random(seed)
+        candidates = {rng.randint(low, high) for _ in range(size * 4)}
+        # Se eligen al azar entre los ids que existen: un LIMIT sobre la
+        # lista IN se quedaría con los más bajos
+        existing = sorted(conn.execute(select(key).where(key.in_(sorted(candidates)))).scalars())
+        return select(table).where(key.in_(rng.sample(existing, min(size, len(existing)))))
+    if conn.dialect.name == "postgresql":
+        return select(table.tablesample(func.bernoulli(1))).limit(size)
+    return select(table).order_by(func.random()).limit(size)
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pyarrow as pa
+
+from snapshot import analytics_engine
+from data_access import (
+    IncrementalDataset, QUALITY_COLUMNS, PRODUCTION_COLUMNS, DATE_COLUMNS,
+    frame_from_rows, settled, quality_dataset as memory_quality_dataset,
+    production_dataset as memory_production_dataset,
+)
+from models import QualityForm, ProductionForm
+
+logger = logging.getLogger("hermes.columnar")
+
+# Caché columnar en disco de los conjuntos de calidad y producción (archivos
+# Arrow IPC). Cada lectura con formularios nuevos agrega un segmento con esas
+# filas; view_data.py abre los segmentos con memory mapping, así las
+# columnas numéricas y de fechas no se copian y todas las sesiones y
+# procesos que leen la misma base comparten las páginas del sistema
+# operativo. Los textos se guardan como diccionario y llegan a pandas como
+# columnas categóricas (sin un objeto str por fila).
+#   HERMES_COLUMNAR_CACHE (1): 0 vuelve al conjunto en memoria por proceso
+#   HERMES_COLUMNAR_DIR: directorio de la caché (por defecto uno por fuente
+#     de los dashboards, la instantánea, la réplica o la base, en el
+#     directorio temporal)
+COLUMNAR_CACHE = os.environ.get("HERMES_COLUMNAR_CACHE", "1") == "1"
+# Con más segmentos (o con formularios modificados) la caché se reescribe en
+# uno solo: un único segmento se lee sin concatenar
+MAX_SEGMENTS = 8
+# Un segmento que no está en el manifiesto puede ser de otro proceso que aún
+# no escribe el suyo; solo se borra pasado este tiempo
+ORPHAN_SECONDS = 60
+
+def _default_dir(url):
+    key = hashlib.sha256(url.render_as_string(hide_password=True).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), "hermes_columnar", key)
+
+COLUMNAR_DIR = os.environ.get("HERMES_COLUMNAR_DIR") or _default_dir(analytics_engine.url)
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+def _from_iso(value):
+    return datetime.fromisoformat(value) if value is not None else None
+
+def _ahead(manifest, watermark):
+    # La caché ya tiene formularios que la fuente de este proceso aún no ve
+    # (una réplica o instantánea más atrasada que la del proceso que la escribió)
+    if (manifest["max_id"] or 0) != (watermark["max_id"] or 0):
+        return (manifest["max_id"] or 0) > (watermark["max_id"] or 0)
+    written, seen = _from_iso(manifest["max_updated_at"]), _from_iso(watermark["max_updated_at"])
+    return written is not None and (seen is None or written > seen)
+
+def arrow_table(frame):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    columns = [
+        column.dictionary_encode() if pa.types.is_string(column.type) else column
+        for column in table.columns
+    ]
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+def read_segments(paths):
+    # Memory mapping: los buffers de la tabla apuntan al archivo
+    tables = [pa.ipc.open_file(pa.memory_map(path)).read_all() for path in paths]
+    return pa.concat_tables(tables)
+
+class ColumnarDataset(IncrementalDataset):
+    # Misma marca de agua que IncrementalDataset, guardada en un manifiesto
+    # (<nombre>.json) junto con la lista de segmentos. Los archivos se
+    # escriben aparte y se reemplazan de forma atómica, como la instantánea:
+    # si dos procesos agregan a la vez gana el último manifiesto y ambos son
+    # consistentes.
+    def __init__(self, name, model, columns, directory=None, date_columns=DATE_COLUMNS):
+        super().__init__(model, columns, date_columns)
+        self.name = name
+        self.directory = directory or COLUMNAR_DIR
+        self.column_names = [column for column, _ in columns]
+        self.segments = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read_manifest(self):
+        try:
+            with open(self._path(f"{self.name}.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get("columns") != self.column_names or "recent" not in manifest:
+            return None
+        return manifest
+
+    def _write_manifest(self, manifest):
+        path = self._path(f"{self.name}.json")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, path)
+
+    def _write_segment(self, frame):
+        if frame.empty:
+            return []
+        name = f"{self.name}.{uuid.uuid4().hex}.arrow"
+        tmp = self._path(f"{name}.tmp")
+        table = arrow_table(frame)
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, self._path(name))
+        return [name]
+
+    def _purge(self, segments):
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.startswith(f"{self.name}.") or not name.endswith(".arrow") or name in segments:
+                continue
+            try:
+                if now - os.path.getmtime(self._path(name)) > ORPHAN_SECONDS:
+                    os.remove(self._path(name))
+            except OSError:
+                # Windows no borra un archivo que otro proceso tiene mapeado
+                pass
+
+    def _save(self, watermark, segments, recent, read_at):
+        # recent y read_at: ventana de la marca de agua (ver data_access.py)
+        manifest = dict(
+            watermark, columns=self.column_names, segments=segments, read_at=_iso(read_at),
+            recent={str(form_id): _iso(updated_at) for form_id, updated_at in recent.items()},
+        )
+        self._write_manifest(manifest)
+        self._purge(segments)
+        return manifest
+
+    def _rebuild(self, conn, watermark, read_at):
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.perf_counter()
+        frame, recent = self.read_all(conn, _from_iso(watermark["max_updated_at"]))
+        manifest = self._save(watermark, self._write_segment(frame), recent, read_at)
+        logger.info("Caché columnar %s reconstruida en %.2f s", self.name, time.perf_counter() - started)
+        return manifest
+
+    def _append(self, conn, manifest, watermark, read_at):
+        last_id = manifest["max_id"] or 0
+        recent = {int(form_id): _from_iso(updated_at) for form_id, updated_at in manifest["recent"].items()}
+        changed, recent = self.read_changed(
+            conn, last_id, _from_iso(manifest["max_updated_at"]), recent, _from_iso(watermark["max_updated_at"])
+        )
+        segments = manifest["segments"]
+        if changed.empty:
+            if self._same_watermark(manifest, watermark) and not settled(read_at, _from_iso(watermark["max_updated_at"])):
+                # Relectura dentro de la ventana sin novedades: nada que guardar
+                return manifest
+            return self._save(watermark, segments, recent, read_at)
+        if (changed['ID'] <= last_id).any() or len(segments) >= MAX_SEGMENTS:
+            self.frame = self.load(segments)
+            self._merge(changed)
+            return self._save(watermark, self._write_segment(self.frame), recent, read_at)
+        return self._save(watermark, segments + self._write_segment(changed), recent, read_at)
+
+    def _same_watermark(self, manifest, watermark):
+        return {key: manifest[key] for key in watermark} == watermark
+
+    def load(self, segments):
+        if not segments:
+            return frame_from_rows([], self.column_names, self.date_columns)
+        # split_blocks: una columna por bloque, sin consolidar (ni copiar) las
+        # columnas del mismo tipo
+        return read_segments([self._path(name) for name in segments]).to_pandas(split_blocks=True)
+
+    def refresh(self, conn):
+        with self._lock:
+            read_at = datetime.utcnow()
+            max_id, max_updated_at, archive_run = self.watermark(conn)
+            watermark = {"max_id": max_id, "max_updated_at": _iso(max_updated_at), "archive_run": archive_run}
+            manifest = self.read_manifest()
+            if manifest is None or manifest["archive_run"] != archive_run:
+                manifest = self._rebuild(conn, watermark, read_at)
+            elif _ahead(manifest, watermark):
+                # Se lee como está: reconstruirla con datos más viejos haría
+                # que los procesos se la reescribieran uno a otro
+                pass
+            elif (not self._same_watermark(manifest, watermark)
+                  or not settled(_from_iso(manifest["read_at"]), max_updated_at)):
+                manifest = self._append(conn, manifest, watermark, read_at)
+            if manifest["segments"] != self.segments:
+                try:
+                    self.frame = self.load(manifest["segments"])
+                except FileNotFoundError:
+                    # Otro proceso reescribió la caché entre el manifiesto y los segmentos
+                    manifest = self._rebuild(conn, watermark, read_at)
+                    self.frame = self.load(manifest["segments"])
+                self.segments = manifest["segments"]
+            return self.frame.copy(deep=False)
+
+def quality_dataset():
+    if not COLUMNAR_CACHE:
+        return memory_quality_dataset()
+    return ColumnarDataset("quality", QualityForm, QUALITY_COLUMNS)
+
+def production_dataset():
+    if not COLUMNAR_CACHE:
+        return memory_production_dataset()
+    return ColumnarDataset("production", ProductionForm, PRODUCTION_COLUMNS)
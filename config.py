@@ -86,4 +86,36 @@ QUESTIONS_CONFIG = {
             }
         ]
     }
-} 
\ No newline at end of file
+} 
+# Campos de los formularios y sus límites de especificación: registro único
+# del que validation.py compila los validadores que usan la UI (app.py), la
+# importación masiva (bulk_import.py) y la API de ingesta (ingest_api.py).
+GRADE_OPTIONS = ["A - Excelente", "B - Bueno", "C - Regular"]
+
+QUALITY_FIELDS = {
+    "apariencia": {"label": "Apariencia", "options": GRADE_OPTIONS},
+    "color": {"label": "Color", "options": GRADE_OPTIONS},
+    "olor": {"label": "Olor", "options": GRADE_OPTIONS},
+    "humedad": {"label": "Humedad (%)", "min_value": 10.0, "max_value": 14.0, "step": 0.1},
+    "proteina": {"label": "Proteína (%)", "min_value": 18.0, "max_value": 22.0, "step": 0.1},
+    "grasa": {"label": "Grasa (%)", "min_value": 2.0, "max_value": 4.0, "step": 0.1},
+    "fibra": {"label": "Fibra (%)", "min_value": 3.0, "max_value": 5.0, "step": 0.1},
+    "cenizas": {"label": "Cenizas (%)", "min_value": 5.0, "max_value": 7.0, "step": 0.1},
+}
+
+PRODUCTION_FIELDS = {
+    "dieta": {"label": "Dieta", "options": ["Dieta 1", "Dieta 2", "Dieta 3"]},
+    "molienda": {"label": "Molienda (mm)", "min_value": 0.1, "max_value": 5.0, "step": 0.1},
+    "durabilidad": {"label": "Durabilidad (%)", "min_value": 0.0, "max_value": 100.0, "step": 0.1},
+    "dureza": {"label": "Dureza (kg)", "min_value": 1, "max_value": 100, "step": 1},
+    "temperatura": {"label": "Temperatura (°C)", "min_value": 20, "max_value": 100, "step": 1},
+    "peletizadora": {"label": "Peletizadora", "options": ["Peletizadora 1", "Peletizadora 2", "Peletizadora 3"]},
+}
+
+# Campos del plan diario (app.py) y sus límites
+DAILY_PLAN_FIELDS = {
+    "estimated_orders": {"label": "Órdenes de Producción Estimadas", "min_value": 1, "max_value": 100, "step": 1},
+    "die_size": {"label": "Medida de Dado (mm)", "min_value": 1.0, "max_value": 10.0, "step": 0.1},
+    "soy_tons": {"label": "Toneladas de Soya", "min_value": 0.0, "max_value": 1000.0, "step": 0.5},
+    "corn_cake_tons": {"label": "Toneladas de Torta de Maíz", "min_value": 0.0, "max_value": 1000.0, "step": 0.5},
+}
@@ -0,0 +1,436 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import String, and_, case, distinct, func, select, type_coerce
+from models import User, ProductionOrder, QualityForm, ProductionForm, OrderSummary, ArchiveRun
+
+# Columnas de cada conjunto de datos: (nombre en el dashboard, expresión SQL).
+# Las fechas se leen como texto y se convierten en bloque con pandas, así se
+# evita construir un objeto datetime por fila.
+QUALITY_COLUMNS = [
+    ('ID', QualityForm.id),
+    ('Orden de Producción', func.coalesce(ProductionOrder.order_number, 'N/A')),
+    ('Usuario', func.coalesce(User.username, 'N/A')),
+    ('Apariencia', QualityForm.apariencia),
+    ('Color', QualityForm.color),
+    ('Olor', QualityForm.olor),
+    ('Humedad (%)', QualityForm.humedad),
+    ('Proteína (%)', QualityForm.proteina),
+    ('Grasa (%)', QualityForm.grasa),
+    ('Fibra (%)', QualityForm.fibra),
+    ('Cenizas (%)', QualityForm.cenizas),
+    ('Fecha de Creación', type_coerce(QualityForm.created_at, String)),
+]
+
+PRODUCTION_COLUMNS = [
+    ('ID', ProductionForm.id),
+    ('Orden de Producción', func.coalesce(ProductionOrder.order_number, 'N/A')),
+    ('Usuario', func.coalesce(User.username, 'N/A')),
+    ('Dieta', ProductionForm.dieta),
+    ('Molienda', ProductionForm.molienda),
+    ('Durabilidad', ProductionForm.durabilidad),
+    ('Dureza', ProductionForm.dureza),
+    ('Temperatura (°C)', ProductionForm.temperatura),
+    ('Pelletizadora', ProductionForm.peletizadora),
+    ('Fecha de Creación', type_coerce(ProductionForm.created_at, String)),
+]
+
+DATE_COLUMNS = ['Fecha de Creación']
+
+def _form_select(model, columns):
+    # Un único SELECT con los joins a la orden y al usuario (sin consultas por fila)
+    return (
+        select(*[expr.label(name) for name, expr in columns])
+        .select_from(model)
+        .outerjoin(ProductionOrder, ProductionOrder.id == model.production_order_id)
+        .outerjoin(User, User.id == model.user_id)
+        .order_by(model.id)
+    )
+
+def _changed_since(model, max_id, max_updated_at):
+    # Filas nuevas (id mayor al visto) o modificadas desde la última lectura
+    if max_updated_at is None:
+        return (model.id > max_id) | model.updated_at.isnot(None)
+    return (model.id > max_id) | (model.updated_at >= max_updated_at)
+
+def _changed_select(model, columns, max_id, max_updated_at):
+    # Sin ORDER BY para que SQLite resuelva el OR con ambos índices
+    # (MULTI-INDEX OR); el resultado se ordena en memoria
+    return (
+        _form_select(model, columns)
+        .order_by(None)
+        .where(_changed_since(model, max_id, max_updated_at))
+    )
+
+def quality_select():
+    return _form_select(QualityForm, QUALITY_COLUMNS)
+
+def production_select():
+    return _form_select(ProductionForm, PRODUCTION_COLUMNS)
+
+def frame_from_rows(rows, columns, date_columns=DATE_COLUMNS):
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    for column in date_columns:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], format='ISO8601')
+    return df
+
+def read_frame(conn, stmt, date_columns=DATE_COLUMNS):
+    result = conn.execute(stmt)
+    return frame_from_rows(result.fetchall(), list(result.keys()), date_columns)
+
+def filter_conditions(model, order_numbers=None, usernames=None, dietas=None,
+                      start_date=None, end_date=None):
+    # Filtros del sidebar como condiciones WHERE parametrizadas. Las órdenes y
+    # los usuarios se resuelven a ids con subconsultas para usar los índices
+    # de la tabla de formularios.
+    conditions = []
+    if order_numbers:
+        conditions.append(model.production_order_id.in_(
+            select(ProductionOrder.id).where(ProductionOrder.order_number.in_(order_numbers))
+        ))
+    if usernames:
+        conditions.append(model.user_id.in_(
+            select(User.id).where(User.username.in_(usernames))
+        ))
+    if dietas:
+        conditions.append(model.dieta.in_(dietas))
+    if start_date is not None:
+        conditions.append(model.created_at >= start_date)
+    if end_date is not None:
+        conditions.append(model.created_at < end_date)
+    return conditions
+
+def quality_query(**filters):
+    return quality_select().where(*filter_conditions(QualityForm, **filters))
+
+def production_query(**filters):
+    return production_select().where(*filter_conditions(ProductionForm, **filters))
+
+def load_quality_data(conn, **filters):
+    return read_frame(conn, quality_query(**filters))
+
+def load_production_data(conn, **filters):
+    return read_frame(conn, production_query(**filters))
+
+# Órdenes Completas: unión de calidad y producción por orden en la base de
+# datos. Modos:
+#   "all"       todos los pares calidad × producción de cada orden
+#   "latest"    último formulario de calidad × último de producción por orden
+#   "aggregate" una fila por orden con conteos, promedios y fechas
+COMBINED_MODES = ["all", "latest", "aggregate"]
+
+QUALITY_AVERAGES = [
+    ('Humedad (%)', QualityForm.humedad),
+    ('Proteína (%)', QualityForm.proteina),
+    ('Grasa (%)', QualityForm.grasa),
+    ('Fibra (%)', QualityForm.fibra),
+    ('Cenizas (%)', QualityForm.cenizas),
+]
+
+PRODUCTION_AVERAGES = [
+    ('Molienda', ProductionForm.molienda),
+    ('Durabilidad', ProductionForm.durabilidad),
+    ('Dureza', ProductionForm.dureza),
+    ('Temperatura (°C)', ProductionForm.temperatura),
+]
+
+def _combined_side(model, columns, prefix, conditions):
+    selected = [
+        expr.label(f"{prefix}_{name}") for name, expr in columns
+        if name != 'Orden de Producción'
+    ]
+    selected += [
+        model.production_order_id.label('order_id'),
+        model.created_at.label('created_at'),
+    ]
+    return (
+        select(*selected)
+        .select_from(model)
+        .outerjoin(User, User.id == model.user_id)
+        .where(model.production_order_id.isnot(None), *conditions)
+        .subquery()
+    )
+
+def _latest_side(model, columns, prefix, latest_id):
+    # Último formulario de cada orden según order_summary: una búsqueda por
+    # llave primaria por orden en lugar de ordenar todos los formularios
+    selected = [
+        expr.label(f"{prefix}_{name}") for name, expr in columns
+        if name != 'Orden de Producción'
+    ]
+    selected += [
+        OrderSummary.production_order_id.label('order_id'),
+        model.created_at.label('created_at'),
+    ]
+    return (
+        select(*selected)
+        .select_from(OrderSummary)
+        .join(model, model.id == latest_id)
+        .outerjoin(User, User.id == model.user_id)
+        .subquery()
+    )
+
+def _combined_pairs_select(latest, order_numbers=None, usernames=None, dietas=None,
+                           start_date=None, end_date=None):
+    # En modo "latest" el último formulario de cada orden sale del resumen por
+    # orden y los filtros se aplican después de elegirlo
+    if latest:
+        q = _latest_side(QualityForm, QUALITY_COLUMNS, 'Calidad', OrderSummary.quality_latest_id)
+        p = _latest_side(ProductionForm, PRODUCTION_COLUMNS, 'Producción', OrderSummary.production_latest_id)
+    else:
+        q = _combined_side(
+            QualityForm, QUALITY_COLUMNS, 'Calidad',
+            filter_conditions(QualityForm, order_numbers=order_numbers, usernames=usernames)
+        )
+        p = _combined_side(
+            ProductionForm, PRODUCTION_COLUMNS, 'Producción',
+            filter_conditions(ProductionForm, order_numbers=order_numbers, dietas=dietas)
+        )
+
+    quality_columns = [c for c in q.c if c.name.startswith('Calidad_')]
+    production_columns = [c for c in p.c if c.name.startswith('Producción_')]
+    stmt = (
+        select(
+            quality_columns[0],
+            ProductionOrder.order_number.label('Orden de Producción'),
+            *quality_columns[1:],
+            *production_columns,
+        )
+        .select_from(q)
+        .join(p, p.c.order_id == q.c.order_id)
+        .join(ProductionOrder, ProductionOrder.id == q.c.order_id)
+        .order_by(ProductionOrder.order_number, q.c['Calidad_ID'], p.c['Producción_ID'])
+    )
+    if latest:
+        if order_numbers:
+            stmt = stmt.where(ProductionOrder.order_number.in_(order_numbers))
+        if usernames:
+            stmt = stmt.where(q.c['Calidad_Usuario'].in_(usernames))
+        if dietas:
+            stmt = stmt.where(p.c['Producción_Dieta'].in_(dietas))
+    # Como en la vista original: basta que uno de los dos formularios esté en el rango
+    if start_date is not None or end_date is not None:
+        stmt = stmt.where(
+            and_(*_date_range(q.c.created_at, start_date, end_date))
+            | and_(*_date_range(p.c.created_at, start_date, end_date))
+        )
+    return stmt
+
+def _date_range(column, start_date, end_date):
+    conditions = []
+    if start_date is not None:
+        conditions.append(column >= start_date)
+    if end_date is not None:
+        conditions.append(column < end_date)
+    return conditions
+
+def _combined_aggregate_side(model, averages, prefix, conditions):
+    return (
+        select(
+            model.production_order_id.label('order_id'),
+            func.count().label(f"{prefix}_Muestras"),
+            *[func.avg(expr).label(f"{prefix}_{name} (promedio)") for name, expr in averages],
+            type_coerce(func.min(model.created_at), String).label(f"{prefix}_Primera Fecha"),
+            type_coerce(func.max(model.created_at), String).label(f"{prefix}_Última Fecha"),
+        )
+        .where(model.production_order_id.isnot(None), *conditions)
+        .group_by(model.production_order_id)
+        .subquery()
+    )
+
+def _combined_aggregate_select(order_numbers=None, usernames=None, dietas=None,
+                               start_date=None, end_date=None):
+    # Agregados sobre los formularios que cumplen los filtros de cada lado
+    dates = {'start_date': start_date, 'end_date': end_date}
+    q = _combined_aggregate_side(
+        QualityForm, QUALITY_AVERAGES, 'Calidad',
+        filter_conditions(QualityForm, order_numbers=order_numbers, usernames=usernames, **dates)
+    )
+    p = _combined_aggregate_side(
+        ProductionForm, PRODUCTION_AVERAGES, 'Producción',
+        filter_conditions(ProductionForm, order_numbers=order_numbers, dietas=dietas, **dates)
+    )
+    return (
+        select(
+            ProductionOrder.order_number.label('Orden de Producción'),
+            *[c for c in q.c if c.name != 'order_id'],
+            *[c for c in p.c if c.name != 'order_id'],
+        )
+        .select_from(q)
+        .join(p, p.c.order_id == q.c.order_id)
+        .join(ProductionOrder, ProductionOrder.id == q.c.order_id)
+        .order_by(ProductionOrder.order_number)
+    )
+
+def combined_select(mode="latest", **filters):
+    if mode == "aggregate":
+        return _combined_aggregate_select(**filters)
+    if mode in ("all", "latest"):
+        return _combined_pairs_select(mode == "latest", **filters)
+    raise ValueError(f"Modo de combinación desconocido: {mode}")
+
+COMBINED_DATE_COLUMNS = [
+    'Calidad_Fecha de Creación', 'Producción_Fecha de Creación',
+    'Calidad_Primera Fecha', 'Calidad_Última Fecha',
+    'Producción_Primera Fecha', 'Producción_Última Fecha',
+]
+
+def load_combined_data(conn, mode="latest", **filters):
+    return read_frame(conn, combined_select(mode, **filters), date_columns=COMBINED_DATE_COLUMNS)
+
+# Opciones de los filtros: consultas DISTINCT y MIN/MAX en lugar de recorrer
+# el DataFrame completo
+# Columna de order_summary con el número de formularios de cada tipo
+SUMMARY_COUNTS = {
+    QualityForm: OrderSummary.quality_count,
+    ProductionForm: OrderSummary.production_count,
+}
+
+def order_options(conn, *models):
+    # Órdenes con formularios en todas las tablas indicadas (desde el resumen)
+    stmt = (
+        select(ProductionOrder.order_number)
+        .join(OrderSummary, OrderSummary.production_order_id == ProductionOrder.id)
+        .where(*[SUMMARY_COUNTS[model] > 0 for model in models])
+        .order_by(ProductionOrder.order_number)
+    )
+    return conn.execute(stmt).scalars().all()
+
+def user_options(conn, model):
+    stmt = (
+        select(User.username)
+        .where(User.id.in_(select(model.user_id)))
+        .order_by(User.username)
+    )
+    return conn.execute(stmt).scalars().all()
+
+def dieta_options(conn):
+    stmt = select(distinct(ProductionForm.dieta)).order_by(ProductionForm.dieta)
+    return conn.execute(stmt).scalars().all()
+
+def date_bounds_select(model):
+    # Un MIN/MAX por subconsulta: SQLite solo los resuelve con una búsqueda en
+    # el índice cuando son el único agregado de la consulta
+    return select(
+        select(func.min(model.created_at)).scalar_subquery(),
+        select(func.max(model.created_at)).scalar_subquery(),
+    )
+
+def date_bounds(conn, *models):
+    bounds = [conn.execute(date_bounds_select(model)).one() for model in models]
+    mins = [low for low, _ in bounds if low is not None]
+    maxs = [high for _, high in bounds if high is not None]
+    return (min(mins) if mins else None, max(maxs) if maxs else None)
+
+def watermark_select(model):
+    return select(
+        select(func.max(model.id)).scalar_subquery(),
+        select(func.max(model.updated_at)).scalar_subquery(),
+    )
+
+# Quien escribe fija updated_at (y en PostgreSQL el id) antes de confirmar:
+# una transacción que confirma tarde queda detrás de la marca de agua ya
+# leída. Cada lectura incremental vuelve a traer los formularios con
+# updated_at hasta WATERMARK_OVERLAP antes de la marca y descarta los ya
+# leídos con el mismo updated_at.
+WATERMARK_OVERLAP = timedelta(seconds=int(os.environ.get("HERMES_WATERMARK_OVERLAP_SECONDS", "60")))
+UPDATED_AT = "_updated_at"
+
+def overlap_window(ids, updated_at, max_updated_at):
+    # {id: updated_at} de los formularios leídos dentro de la ventana
+    if max_updated_at is None:
+        return {}
+    inside = (updated_at >= max_updated_at - WATERMARK_OVERLAP).to_numpy()
+    return dict(zip(ids[inside].tolist(), updated_at[inside].tolist()))
+
+def settled(read_at, max_updated_at):
+    # Una lectura hecha pasada la ventana de la marca ya vio todo lo que se
+    # confirmó tarde; antes de eso se relee aunque la marca no cambie
+    return max_updated_at is None or (read_at is not None and read_at >= max_updated_at + WATERMARK_OVERLAP)
+
+class IncrementalDataset:
+    # Conjunto de datos en memoria que solo lee filas nuevas o modificadas.
+    # La marca de agua es el id máximo y el updated_at máximo ya leídos; las
+    # actualizaciones desde app.py cambian updated_at y se vuelven a leer.
+    # Los formularios movidos a archive.py no cambian la marca de agua: cada
+    # mes archivado deja una fila en archive_runs y el conjunto se recarga.
+    def __init__(self, model, columns, date_columns=DATE_COLUMNS):
+        self.model = model
+        self.columns = columns
+        self.date_columns = date_columns
+        self.frame = None
+        self.max_id = None
+        self.max_updated_at = None
+        self.archive_run = None
+        self.recent = {}
+        self.read_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self, conn):
+        with self._lock:
+            read_at = datetime.utcnow()
+            max_id, max_updated_at, archive_run = self.watermark(conn)
+            if self.frame is None or archive_run != self.archive_run:
+                self.frame, self.recent = self.read_all(conn, max_updated_at)
+            elif ((max_id, max_updated_at) != (self.max_id, self.max_updated_at)
+                  or not settled(self.read_at, self.max_updated_at)):
+                changed, self.recent = self.read_changed(
+                    conn, self.max_id, self.max_updated_at, self.recent, max_updated_at
+                )
+                self._merge(changed)
+            self.max_id, self.max_updated_at = max_id, max_updated_at
+            self.archive_run = archive_run
+            self.read_at = read_at
+            # Copia superficial: quien la use puede reemplazar columnas sin
+            # modificar el DataFrame compartido
+            return self.frame.copy(deep=False)
+
+    def watermark(self, conn):
+        max_id, max_updated_at = conn.execute(watermark_select(self.model)).one()
+        return max_id, max_updated_at, conn.execute(select(func.max(ArchiveRun.id))).scalar()
+
+    def _read(self, conn, stmt, low):
+        # Los formularios y aparte su updated_at, solo el de los que están en
+        # la ventana (desde low): los demás llegan como NULL y no se convierten
+        updated_at = type_coerce(self.model.updated_at, String)
+        if low is not None:
+            updated_at = case((self.model.updated_at >= low, updated_at))
+        frame = read_frame(conn, stmt.add_columns(updated_at.label(UPDATED_AT)), [*self.date_columns, UPDATED_AT])
+        return frame, frame.pop(UPDATED_AT)
+
+    def read_all(self, conn, max_updated_at):
+        # Devuelve (formularios, ventana de la marca max_updated_at)
+        low = max_updated_at - WATERMARK_OVERLAP if max_updated_at is not None else None
+        frame, updated_at = self._read(conn, _form_select(self.model, self.columns), low)
+        return frame, overlap_window(frame['ID'], updated_at, max_updated_at)
+
+    def read_changed(self, conn, max_id, max_updated_at, recent, new_max_updated_at):
+        # Devuelve (formularios nuevos o modificados desde la marca anterior,
+        # ventana de la marca nueva); recent es la ventana de la anterior
+        low = max_updated_at - WATERMARK_OVERLAP if max_updated_at is not None else None
+        frame, updated_at = self._read(conn, _changed_select(self.model, self.columns, max_id or 0, low), low)
+        window = overlap_window(frame['ID'], updated_at, new_max_updated_at)
+        unchanged = (frame['ID'].map(recent) == updated_at).to_numpy()
+        return frame[~unchanged].sort_values('ID', ignore_index=True), window
+
+    def _merge(self, changed):
+        if changed.empty:
+            return
+        if self.frame.empty:
+            self.frame = changed
+            return
+        last_id = self.frame['ID'].iloc[-1]
+        if changed['ID'].min() > last_id:
+            self.frame = pd.concat([self.frame, changed], ignore_index=True)
+        else:
+            kept = self.frame[~self.frame['ID'].isin(changed['ID'])]
+            self.frame = pd.concat([kept, changed]).sort_values('ID', ignore_index=True)
+
+def quality_dataset():
+    return IncrementalDataset(QualityForm, QUALITY_COLUMNS)
+
+def production_dataset():
+    return IncrementalDataset(ProductionForm, PRODUCTION_COLUMNS)
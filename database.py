@@ -1,21 +1,151 @@
-from sqlalchemy import create_engine
+import os
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
 from models import Base
+from migrations import run_migrations
+import sql_trace
+
+load_dotenv()
+
+# app.py, view_data.py, db_viewer.py, ingest_api.py y las herramientas de
+# línea de comandos corren en procesos distintos sobre la misma base de
+# datos; todos crean sus engines desde aquí. La base SQLite por defecto es
+# hermes.db junto a este archivo, sin importar el directorio de trabajo.
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hermes.db')}"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL)
+# Réplica de solo lectura opcional para los dashboards (view_data.py y
+# db_viewer.py); sin ella leen de DATABASE_URL
+READ_DATABASE_URL = os.environ.get("HERMES_READ_DATABASE_URL")
+
+# Pool de conexiones (un solo engine por proceso)
+POOL_SIZE = int(os.environ.get("HERMES_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.environ.get("HERMES_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = int(os.environ.get("HERMES_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.environ.get("HERMES_POOL_RECYCLE", "1800"))
+# Verificar cada conexión al sacarla del pool (servidores que cierran
+# conexiones inactivas o reinicios de PostgreSQL)
+POOL_PRE_PING = os.environ.get("HERMES_POOL_PRE_PING", "1") == "1"
+
+# SQLite: con WAL los lectores no bloquean al escritor ni viceversa, y
+# busy_timeout hace que un segundo escritor espere en lugar de fallar con
+# "database is locked". synchronous=NORMAL es seguro con WAL.
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("HERMES_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.environ.get("HERMES_SQLITE_SYNCHRONOUS", "NORMAL")
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def normalize_url(url):
+    # postgres:// (el formato de muchos proveedores) es postgresql:// para SQLAlchemy
+    url = make_url(url)
+    if url.drivername == "postgres":
+        url = url.set(drivername="postgresql")
+    return url
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    cursor.close()
+
+def set_sqlite_busy_timeout(dbapi_connection, connection_record):
+    # Conexiones de solo lectura: no pueden cambiar el modo del journal
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./hermes.db"
+def _read_only_listener(backend):
+    # Las conexiones de un engine de solo lectura rechazan cualquier escritura
+    statement = {
+        "sqlite": "PRAGMA query_only = ON",
+        "postgresql": "SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY",
+    }[backend]
+    def set_read_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(statement)
+        cursor.close()
+        if backend == "postgresql":
+            dbapi_connection.commit()
+    return set_read_only
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def _engine_options(url):
+    if url.get_backend_name() == "sqlite":
+        if _is_memory_sqlite(url):
+            # Cada conexión a una base en memoria es una base distinta
+            return {"connect_args": {"check_same_thread": False}}
+        return {
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            "pool_size": POOL_SIZE,
+            "max_overflow": POOL_MAX_OVERFLOW,
+            "pool_timeout": POOL_TIMEOUT,
+            "pool_pre_ping": POOL_PRE_PING,
+        }
+    return {
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+    }
+
+def create_db_engine(url=SQLALCHEMY_DATABASE_URL, read_only=False, **kwargs):
+    # Único punto donde se crean engines: SQLite o PostgreSQL con el pool
+    # configurado arriba
+    url = normalize_url(url)
+    backend = url.get_backend_name()
+    engine = create_engine(url, **{**_engine_options(url), **kwargs})
+    if backend == "sqlite" and not _is_memory_sqlite(url):
+        event.listen(engine, "connect", set_sqlite_busy_timeout if read_only else set_sqlite_pragmas)
+    if read_only:
+        event.listen(engine, "connect", _read_only_listener(backend))
+    # Tiempos, filas y origen de cada sentencia con HERMES_SQL_TRACE=1
+    sql_trace.install(engine)
+    return engine
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Lecturas de los dashboards: la réplica si está configurada
+read_engine = create_db_engine(READ_DATABASE_URL, read_only=True) if READ_DATABASE_URL else engine
+
+def describe(engine):
+    # URL sin contraseña, para mostrar a qué base está conectado cada proceso
+    return engine.url.render_as_string(hide_password=True)
+
+# create_all y las migraciones consultan el esquema completo; basta con
+# hacerlo una vez por proceso, no en cada rerun de Streamlit
+_schema_ready = False
+_schema_lock = threading.Lock()
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine, Base.metadata)
+        _schema_ready = True
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+@contextmanager
+def session_scope():
+    # Una sesión por rerun: se cierra (y devuelve su conexión al pool) al
+    # salir del bloque, también cuando el script termina con st.rerun() o un
+    # error. close() descarta lo no confirmado sin expirar los objetos ya
+    # cargados (p. ej. el usuario guardado en st.session_state).
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,7 +1,17 @@
+import json
+import os
 import streamlit as st
 import pandas as pd
-import sqlite3
 from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+from database import describe
+from snapshot import analytics_engine as read_engine, data_as_of
+from pagination import count_rows
+from ui import paginated_table, export_buttons, result_table
+import workbench
+import catalog
+import sql_trace
 
 # Configuración de la página
 st.set_page_config(
@@ -44,76 +54,273 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-def get_table_names():
-    conn = sqlite3.connect('hermes.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-    conn.close()
-    return [table[0] for table in tables]
+@st.cache_resource
+def get_catalog():
+    # Tablas, índices, filas estimadas y tamaños; compartido entre sesiones
+    # y reconstruido solo cuando cambia el esquema (ver catalog.py)
+    return catalog.Catalog()
 
-def get_table_data(table_name):
-    conn = sqlite3.connect('hermes.db')
-    df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-    conn.close()
-    return df
+@st.cache_data(ttl=30, show_spinner=False)
+def get_row_count(table_name):
+    # Conteo exacto, solo a pedido: recorre la tabla completa
+    with read_engine.connect() as conn:
+        table = get_catalog().refresh(conn)[table_name]["table"]
+        return count_rows(conn, select(table))
+
+def format_bytes(size):
+    if size is None:
+        return "—"
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def catalog_frame(tables):
+    return pd.DataFrame([
+        {
+            'tabla': name, 'filas (estimadas)': info['rows'],
+            'tamaño': format_bytes(info['size']), 'índices': format_bytes(info['index_size']),
+            'bytes': (info['size'] or 0) + (info['index_size'] or 0),
+        }
+        for name, info in tables.items()
+    ]).astype({'filas (estimadas)': 'Int64'}).sort_values('bytes', ascending=False).drop(columns='bytes')
+
+def page_keys(table, sort_by):
+    # Columnas de la paginación por llave: la llave primaria, precedida de
+    # created_at cuando se ordena por fecha
+    keys = [column.name for column in table.primary_key.columns]
+    if sort_by == "created_at":
+        keys = ["created_at"] + keys
+    return keys
+
+def workbench_page():
+    # Consultas ad hoc de solo lectura, con límite de filas y de tiempo
+    st.subheader("Consultas SQL")
+    sql = st.text_area("Consulta (solo SELECT, WITH o VALUES)", height=160, key="workbench_sql")
+    col1, col2 = st.columns(2)
+    with col1:
+        row_limit = st.number_input(
+            "Máximo de filas", min_value=1, max_value=workbench.WORKBENCH_ROW_LIMIT,
+            value=min(1000, workbench.WORKBENCH_ROW_LIMIT), step=100
+        )
+    with col2:
+        timeout_s = st.number_input(
+            "Tiempo máximo (s)", min_value=0.1, max_value=workbench.WORKBENCH_TIMEOUT_MS / 1000,
+            value=workbench.WORKBENCH_TIMEOUT_MS / 1000, step=0.5
+        )
+    col1, col2 = st.columns(2)
+    with col1:
+        run = st.button("▶️ Ejecutar", disabled=not sql.strip())
+    with col2:
+        plan_only = st.button("🔎 Solo el plan (EXPLAIN)", disabled=not sql.strip())
+
+    if run or plan_only:
+        st.session_state.pop("workbench", None)
+        try:
+            plan = workbench.explain(read_engine, sql, int(timeout_s * 1000))
+            result = None if plan_only else workbench.run_query(read_engine, sql, int(row_limit), int(timeout_s * 1000))
+        except (ValueError, TimeoutError) as exc:
+            st.error(str(exc))
+            return
+        except DBAPIError as exc:
+            st.error(f"Error de la base de datos: {exc.orig}")
+            return
+        st.session_state["workbench"] = {"plan": plan, "result": result}
+
+    state = st.session_state.get("workbench")
+    if not state:
+        return
+    result = state["result"]
+    if result is not None:
+        columns = st.columns(1 + len(result.stats))
+        columns[0].metric("Filas", result.rows)
+        for column, (label, value) in zip(columns[1:], result.stats.items()):
+            column.metric(label, value)
+        if result.truncated:
+            st.warning(f"La consulta devuelve más de {result.rows} filas; solo se muestran las primeras.")
+    st.markdown("**Plan de ejecución**")
+    st.code(state["plan"], language=None)
+    if result is not None and result.rows:
+        result_table("workbench", result.directory, result)
+
+def diagnostics_page():
+    # Sentencias SQL de todos los procesos con HERMES_SQL_TRACE=1 (ver sql_trace.py)
+    st.subheader("Diagnóstico SQL")
+    if not sql_trace.SQL_TRACE:
+        st.info("La instrumentación está desactivada en este proceso: inicie app.py, view_data.py "
+                "y db_viewer.py con HERMES_SQL_TRACE=1 para registrar las consultas.")
+    exports = [data for data in sql_trace.load_exports() if data["pid"] != os.getpid()]
+    if sql_trace.SQL_TRACE:
+        exports.append(sql_trace.snapshot("db_viewer.py"))
+    report = sql_trace.merge(exports)
+    reruns, statements = report["reruns"], report["statements"]
+    if not reruns and not statements:
+        st.caption(f"Sin datos en {sql_trace.SQL_TRACE_DIR}")
+        return
+
+    waits = [rerun["wait_seconds"] for rerun in reruns if rerun["wait_seconds"] is not None]
+    suspects = [rerun for rerun in reruns if rerun["n_plus_one"]]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Reruns", len(reruns))
+    col2.metric("Consultas por rerun", f"{sum(r['queries'] for r in reruns) / len(reruns):.1f}" if reruns else "—")
+    col3.metric("Espera por bloqueos/disco (s)", f"{sum(waits):.3f}" if waits else "—")
+    col4.metric("Reruns con posible N+1", len(suspects))
+
+    for rerun in suspects[-5:][::-1]:
+        for suspect in rerun["n_plus_one"]:
+            st.warning(f"Posible N+1 en {rerun['script']} ({rerun['started']}): {suspect['count']} veces "
+                       f"desde {suspect['site'] or 'origen desconocido'}")
+            st.code(suspect["sql"], language="sql")
+
+    st.markdown("**Sentencias más lentas**")
+    order = st.radio("Ordenar por", ["Tiempo total", "Tiempo máximo", "Ejecuciones"], horizontal=True)
+    key = {"Tiempo total": "seconds", "Tiempo máximo": "max_seconds", "Ejecuciones": "count"}[order]
+    st.dataframe(pd.DataFrame([
+        {
+            'sentencia': stats['sql'], 'ejecuciones': stats['count'],
+            'total (s)': round(stats['seconds'], 3),
+            'promedio (ms)': round(stats['seconds'] / stats['count'] * 1000, 2),
+            'máximo (ms)': round(stats['max_seconds'] * 1000, 2),
+            'filas': stats['rows'],
+            'espera (s)': round(stats['wait_seconds'], 3) if stats['wait_seconds'] is not None else None,
+            'origen': ", ".join(sorted(stats['sites'], key=stats['sites'].get, reverse=True)[:3]),
+        }
+        for stats in sorted(statements, key=lambda stats: -stats[key])[:50]
+    ]), use_container_width=True, hide_index=True)
+
+    st.markdown("**Consultas por rerun**")
+    st.dataframe(pd.DataFrame([
+        {
+            'inicio': rerun['started'], 'script': rerun['script'], 'consultas': rerun['queries'],
+            'tiempo SQL (s)': round(rerun['db_seconds'], 3), 'rerun (s)': round(rerun['seconds'], 3),
+            'espera (s)': round(rerun['wait_seconds'], 3) if rerun['wait_seconds'] is not None else None,
+            'filas': rerun['rows'], 'posible N+1': len(rerun['n_plus_one']),
+        }
+        for rerun in reversed(reruns)
+    ]), use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            "📥 Descargar JSON", json.dumps(report, ensure_ascii=False, indent=1),
+            file_name=f"sql_trace_{datetime.now():%Y%m%d_%H%M%S}.json", mime="application/json"
+        )
+    with col2:
+        if st.button("🗑️ Borrar datos"):
+            sql_trace.clear()
+            st.rerun()
 
 def main():
     st.title("🗄️ Visor de Base de Datos")
+    st.sidebar.caption(f"Base de datos: {describe(read_engine)}")
+    as_of = data_as_of()
+    if as_of is not None:
+        st.sidebar.caption(f"📸 Datos al {as_of:%Y-%m-%d %H:%M:%S}")
+    
+    view = st.sidebar.radio("Vista", ["Tablas", "Consultas SQL", "Diagnóstico SQL"], horizontal=True)
+    if view == "Consultas SQL":
+        workbench_page()
+        return
+    if view == "Diagnóstico SQL":
+        diagnostics_page()
+        return
     
-    # Obtener lista de tablas
-    tables = get_table_names()
+    with read_engine.connect() as conn:
+        tables = get_catalog().refresh(conn, force=st.sidebar.button("🔄 Actualizar catálogo"))
     
     if not tables:
         st.error("No se encontraron tablas en la base de datos.")
         return
     
+    with st.expander("Catálogo: filas estimadas y tamaño en disco"):
+        st.dataframe(catalog_frame(tables), use_container_width=True, hide_index=True)
+    
     # Selector de tabla
     selected_table = st.sidebar.selectbox(
         "Seleccione una tabla",
-        tables
+        list(tables)
     )
     
     if selected_table:
-        # Obtener datos de la tabla seleccionada
-        df = get_table_data(selected_table)
+        info = tables[selected_table]
+        table = info["table"]
+        # Estimación sin recorrer la tabla: el id máximo al momento, o la
+        # del catálogo; el conteo exacto solo a pedido
+        with read_engine.connect() as conn:
+            estimate = catalog.estimate_rows(conn, table)
+        if estimate is None:
+            estimate = info["rows"]
+        exact = st.session_state.get("db_exact_count") == selected_table
+        total = get_row_count(selected_table) if exact or estimate is None else estimate
         
         # Mostrar información de la tabla
         st.subheader(f"Tabla: {selected_table}")
-        st.write(f"Total de registros: {len(df)}")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Registros" if exact or estimate is None else "Registros (estimado)", total)
+        col2.metric("Tamaño de la tabla", format_bytes(info["size"]))
+        col3.metric("Tamaño de los índices", format_bytes(info["index_size"]))
+        if not exact and estimate is not None and st.button("Contar registros exactamente"):
+            st.session_state["db_exact_count"] = selected_table
+            st.rerun()
         
-        # Mostrar datos
-        st.dataframe(
-            df,
-            use_container_width=True,
-            hide_index=True
-        )
+        # Mostrar datos: una página a la vez o una muestra aleatoria
+        mode = st.sidebar.radio("Vista previa", ["Páginas", "Muestra aleatoria"], horizontal=True)
+        if mode == "Muestra aleatoria":
+            if st.button("🎲 Otra muestra"):
+                st.session_state["db_sample_seed"] = st.session_state.get("db_sample_seed", 0) + 1
+            with read_engine.connect() as conn:
+                stmt = catalog.sample_select(conn, table, seed=st.session_state.get("db_sample_seed", 0))
+                sample = pd.DataFrame(conn.execute(stmt).mappings().all(), columns=[c.name for c in table.columns])
+            st.caption(f"{len(sample)} filas al azar")
+            st.dataframe(sample, use_container_width=True, hide_index=True)
+        else:
+            sort_options = ["Llave primaria"]
+            if "created_at" in table.columns:
+                sort_options.append("created_at")
+            sort_by = st.sidebar.selectbox("Ordenar por", sort_options)
+            keys = page_keys(table, sort_by)
+            if not keys:
+                st.error("La tabla no tiene llave primaria; no se puede paginar.")
+            elif total:
+                paginated_table(
+                    f"db_{selected_table}", sort_by, keys, total, read_engine,
+                    query=select(table), date_columns=()
+                )
         
         # Opción para descargar datos
-        csv = df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            "📥 Descargar Datos",
-            csv,
-            f"{selected_table}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            "text/csv",
-            key='download-csv'
-        )
+        export_buttons(f"db_{selected_table}", read_engine, select(table), selected_table, date_columns=())
         
         # Mostrar esquema de la tabla
         st.subheader("Esquema de la Tabla")
-        conn = sqlite3.connect('hermes.db')
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA table_info({selected_table})")
-        columns = cursor.fetchall()
-        conn.close()
-        
         # Crear DataFrame con la información del esquema
-        schema_df = pd.DataFrame(columns, columns=['cid', 'name', 'type', 'notnull', 'dflt_value', 'pk'])
+        primary_key = list(table.primary_key.columns)
+        schema_df = pd.DataFrame([
+            {
+                'cid': position, 'name': column.name, 'type': str(column.type),
+                'notnull': int(not column.nullable),
+                'dflt_value': None if column.server_default is None else str(column.server_default.arg),
+                'pk': primary_key.index(column) + 1 if column.primary_key else 0,
+            }
+            for position, column in enumerate(table.columns)
+        ])
         st.dataframe(
             schema_df,
             use_container_width=True,
             hide_index=True
         )
+        
+        if info["indexes"]:
+            st.subheader("Índices")
+            st.dataframe(
+                pd.DataFrame([
+                    {'name': index['name'], 'columns': index['columns'], 'unique': index['unique'],
+                     'tamaño': format_bytes(index['size'])}
+                    for index in info["indexes"]
+                ]),
+                use_container_width=True,
+                hide_index=True
+            )
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with sql_trace.traced_rerun("db_viewer.py"):
+        main() 
\ No newline at end of file
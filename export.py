@@ -0,0 +1,101 @@
+import hashlib
+import os
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_access import DATE_COLUMNS, frame_from_rows
+
+# Exportación por bloques: las filas se leen de la base de datos en bloques
+# de EXPORT_CHUNK_ROWS y se escriben directamente al archivo, sin armar el
+# DataFrame completo ni el CSV completo en memoria. Los archivos terminados se
+# guardan en disco EXPORT_TTL_SECONDS segundos para reutilizarlos.
+EXPORT_DIR = os.environ.get("HERMES_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "hermes_exports"))
+EXPORT_TTL_SECONDS = int(os.environ.get("HERMES_EXPORT_TTL", "300"))
+EXPORT_CHUNK_ROWS = 50_000
+
+# Formato: (extensión, tipo MIME)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+def export_key(dialect, stmt, fmt):
+    # La llave incluye el SQL y los parámetros, es decir, los filtros activos
+    compiled = stmt.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    content = f"{fmt}\n{compiled}\n{sorted(compiled.params.items())!r}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+def purge_expired_exports(now=None):
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    now = now or time.time()
+    for name in os.listdir(EXPORT_DIR):
+        if name.endswith(".tmp"):
+            # Exportación en curso
+            continue
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > EXPORT_TTL_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+
+def _write_csv(path, chunks):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for i, df in enumerate(chunks):
+            for column in df.select_dtypes(include="datetime").columns:
+                df[column] = df[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+            df.to_csv(f, header=i == 0, index=False)
+
+def _write_parquet(path, chunks):
+    writer = None
+    try:
+        for df in chunks:
+            if writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+WRITERS = {
+    "CSV": _write_csv,
+    "Parquet": _write_parquet,
+}
+
+def _chunks(conn, stmt, date_columns, chunk_rows):
+    result = conn.execution_options(yield_per=chunk_rows).execute(stmt)
+    columns = list(result.keys())
+    empty = True
+    for rows in result.partitions():
+        empty = False
+        yield frame_from_rows(rows, columns, date_columns)
+    if empty:
+        yield frame_from_rows([], columns, date_columns)
+
+def export_query(engine, stmt, fmt="CSV", date_columns=DATE_COLUMNS, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Devuelve la ruta del archivo exportado, reutilizando uno reciente si existe
+    extension, _ = EXPORT_FORMATS[fmt]
+    path = os.path.join(EXPORT_DIR, f"{export_key(engine.dialect, stmt, fmt)}.{extension}")
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) <= EXPORT_TTL_SECONDS:
+        return path
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    purge_expired_exports()
+    fd, tmp_path = tempfile.mkstemp(dir=EXPORT_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        with engine.connect() as conn:
+            WRITERS[fmt](tmp_path, _chunks(conn, stmt, date_columns, chunk_rows))
+        # El archivo aparece completo o no aparece
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
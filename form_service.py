@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import ProductionOrder, QualityForm, ProductionForm, OrderSummary
+from order_summary import record_form, summary_columns, touch_form
+from validation import form_validator
+
+# Envío de formularios desde app.py: la orden se obtiene o se crea con
+# INSERT ... ON CONFLICT y, en la misma transacción, se inserta o actualiza
+# el formulario, se marca la bandera de la orden y se actualiza su resumen
+# (order_summary). Si algo falla no queda una orden sin formulario. Los
+# valores se validan antes con los mismos validadores de la API y la
+# importación masiva (validation.py).
+
+FORM_MODELS = {
+    "quality": (QualityForm, "in_quality"),
+    "production": (ProductionForm, "in_production"),
+}
+
+# Modos de envío
+NEW = "new"          # guardar solo si la orden aún no tiene formularios de este tipo
+APPEND = "append"    # agregar un formulario nuevo aunque ya existan otros
+UPDATE = "update"    # actualizar un formulario existente (form_id)
+
+# Resultados
+CREATED = "created"
+UPDATED = "updated"
+EXISTS = "exists"
+
+_DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+def upsert_order(dialect_name, order_number, flag, now):
+    # Crea la orden o, si ya existe, solo marca la bandera; devuelve el id.
+    # updated_at cambia solo cuando la bandera cambia.
+    orders = ProductionOrder.__table__
+    stmt = _DIALECT_INSERTS[dialect_name](orders).values(
+        order_number=order_number, created_at=now, updated_at=now, **{flag: True}
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[orders.c.order_number],
+        set_={
+            flag: True,
+            "updated_at": case((orders.c[flag].is_(True), orders.c.updated_at), else_=now),
+        },
+    ).returning(orders.c.id)
+
+def latest_form_select(model, order_number):
+    # Último formulario de la orden, desde su resumen (búsqueda por llave)
+    return (
+        select(summary_columns(model)["latest_id"])
+        .join(ProductionOrder, ProductionOrder.id == OrderSummary.production_order_id)
+        .where(ProductionOrder.order_number == order_number)
+    )
+
+def submit_form(db, form_type, order_number, user_id, values, mode=NEW, form_id=None):
+    # Devuelve (resultado, id del formulario). Con mode=NEW y un formulario
+    # previo para la orden no se escribe nada y se devuelve (EXISTS, id previo).
+    model, flag = FORM_MODELS[form_type]
+    values = form_validator(form_type).validate(values)
+    if mode == NEW:
+        # Lectura fuera de la transacción de escritura (SQLite no la abre
+        # hasta el primer INSERT/UPDATE)
+        existing = db.execute(latest_form_select(model, order_number)).scalar()
+        if existing is not None:
+            db.rollback()
+            return EXISTS, existing
+
+    now = datetime.utcnow()
+    dialect_name = db.get_bind().dialect.name
+    try:
+        if mode == UPDATE:
+            db.execute(
+                update(model).where(model.id == form_id).values(updated_at=now, **values)
+            )
+            db.execute(touch_form(model, form_id, now))
+            result = UPDATED
+        else:
+            order_id = db.execute(
+                upsert_order(dialect_name, order_number, flag, now)
+            ).scalar_one()
+            form_id = db.execute(
+                insert(model).values(
+                    production_order_id=order_id, user_id=user_id,
+                    created_at=now, updated_at=now, **values
+                ).returning(model.id)
+            ).scalar_one()
+            db.execute(record_form(dialect_name, model, order_id, form_id, now, now))
+            result = CREATED
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result, form_id
+
+def submit_quality_form(db, order_number, user_id, values, mode=NEW, form_id=None):
+    return submit_form(db, "quality", order_number, user_id, values, mode, form_id)
+
+def submit_production_form(db, order_number, user_id, values, mode=NEW, form_id=None):
+    return submit_form(db, "production", order_number, user_id, values, mode, form_id)
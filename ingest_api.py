@@ -0,0 +1,306 @@
+"""API HTTP de ingesta para equipos y laboratorio (sin interfaz).
+
+Las peletizadoras y el analizador NIR envían sus lecturas como JSON. Corre al
+lado de las aplicaciones de Streamlit:
+
+    HERMES_SESSION_SECRET=... python ingest_api.py --port 8503
+
+    POST /token                {"username": ..., "password": ...}
+    POST /api/calidad          un formulario, una lista o {"forms": [...]}
+    POST /api/produccion       (con el encabezado Authorization: Bearer <token>)
+    GET  /health
+"""
+import argparse
+import asyncio
+import json
+import logging
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import pandas as pd
+from pydantic import BaseModel, TypeAdapter, ValidationError, create_model, constr
+from sqlalchemy import select
+from tornado import web
+
+from auth import (
+    create_api_token, api_token_claims, submit_password_check, PASSWORD_TIMEOUT, SESSION_SECRET_CONFIGURED,
+)
+from bulk_import import FORM_TYPES, import_chunk
+from models import User
+from validation import form_validator
+
+logger = logging.getLogger("hermes.ingest")
+
+INGEST_PORT = 8503
+# Escritura por lotes: las solicitudes que llegan juntas se guardan en una
+# sola transacción (hasta BATCH_MAX_ROWS filas o BATCH_MAX_DELAY segundos)
+BATCH_MAX_ROWS = 1000
+BATCH_MAX_DELAY = 0.005
+MAX_FORMS_PER_REQUEST = 1000
+# Los usuarios válidos (y su versión de sesión) se vuelven a consultar cada
+# USER_CACHE_SECONDS: un cierre de sesión tarda a lo sumo eso en valer aquí
+USER_CACHE_SECONDS = 60
+READER_THREADS = 2
+
+def submission_model(name, section):
+    # El modelo del formulario (validation.py) más la orden y la fecha
+    return create_model(
+        name, __base__=form_validator(section).model,
+        order_number=(constr(strip_whitespace=True, min_length=1, max_length=50), ...),
+        created_at=(Optional[datetime], None),
+    )
+
+# Un lote se valida en una sola llamada (el recorrido lo hace pydantic-core)
+SUBMISSION_ADAPTERS = {
+    form_type: TypeAdapter(List[submission_model(f"{model.__name__}Submission", section)])
+    for form_type, (model, section, _, _) in FORM_TYPES.items()
+}
+
+class Credentials(BaseModel):
+    username: str
+    password: str
+
+class BatchWriter:
+    # Un solo escritor por proceso: junta los formularios validados de varias
+    # solicitudes y los guarda con executemany en una transacción (commit por
+    # lote, no por formulario). Cada solicitud espera a que su lote se confirme.
+    def __init__(self, engine, max_rows=BATCH_MAX_ROWS, max_delay=BATCH_MAX_DELAY):
+        self.engine = engine
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+        self.task = None
+        self.stats = {"lotes": 0, "formularios": 0}
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, form_type, rows):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((form_type, rows, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][1])
+            deadline = loop.time() + self.max_delay
+            while size < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[1])
+            try:
+                inserted = await loop.run_in_executor(self.executor, self._write, batch)
+            except Exception as e:
+                logger.exception("Error al guardar un lote de %s formularios", size)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self.stats["lotes"] += 1
+                self.stats["formularios"] += sum(inserted)
+                for (_, _, future), count in zip(batch, inserted):
+                    if not future.done():
+                        future.set_result(count)
+
+    def _write(self, batch):
+        # Una transacción y un import_chunk por tipo de formulario. Devuelve
+        # las filas insertadas de cada solicitud: si import_chunk no inserta
+        # todas las filas del tipo, el lote se deshace y ninguna se informa
+        # como guardada.
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            for form_type in FORM_TYPES:
+                rows = [row for kind, rows, _ in batch if kind == form_type for row in rows]
+                if not rows:
+                    continue
+                model, section, _, flag = FORM_TYPES[form_type]
+                frame = pd.DataFrame(
+                    rows, columns=["order_number", *form_validator(section).fields, "user_id", "created_at"]
+                )
+                frame["user_id"] = frame["user_id"].astype("Int64")
+                frame["created_at"] = pd.to_datetime(frame["created_at"].fillna(now))
+                inserted, _ = import_chunk(conn, model, flag, frame)
+                if inserted != len(rows):
+                    raise RuntimeError(f"Se insertaron {inserted} de {len(rows)} formularios de {form_type}")
+        return [len(rows) for _, rows, _ in batch]
+
+class UserCache:
+    # Versión de sesión de cada usuario existente, para no consultar la tabla
+    # en cada solicitud. La consulta corre en el pool de lectura, no en el
+    # event loop, y las solicitudes que llegan durante una recarga esperan
+    # la misma.
+    def __init__(self, engine, executor):
+        self.engine = engine
+        self.executor = executor
+        self.versions = {}
+        self.loaded_at = 0.0
+        self.loading = None
+
+    def _load(self):
+        with self.engine.connect() as conn:
+            return dict(conn.execute(select(User.id, User.session_version)).all())
+
+    async def valid(self, user_id, version):
+        # Una versión distinta de la guardada obliga a recargar: el usuario
+        # pudo iniciar sesión de nuevo después de la última consulta
+        if self.versions.get(user_id) == version and time.monotonic() - self.loaded_at < USER_CACHE_SECONDS:
+            return True
+        if self.loading is None:
+            self.loading = asyncio.get_running_loop().run_in_executor(self.executor, self._load)
+        loading = self.loading
+        try:
+            self.versions = await loading
+            self.loaded_at = time.monotonic()
+        finally:
+            if self.loading is loading:
+                self.loading = None
+        return self.versions.get(user_id) == version
+
+class BaseHandler(web.RequestHandler):
+    def write_json(self, status, payload):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(payload, ensure_ascii=False, default=str))
+
+    def read_json(self):
+        try:
+            return json.loads(self.request.body or b"null")
+        except ValueError:
+            raise web.HTTPError(400, reason="JSON inválido")
+
+    def write_error(self, status_code, **kwargs):
+        self.write_json(status_code, {"error": self._reason})
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write_json(200, {"status": "ok", **self.application.writer.stats})
+
+def find_user(engine, username):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(User.id, User.password_hash, User.session_version).where(User.username == username)
+        ).first()
+
+class TokenHandler(BaseHandler):
+    async def post(self):
+        try:
+            credentials = Credentials.model_validate(self.read_json())
+        except ValidationError as e:
+            return self.write_json(422, {"error": "Datos inválidos", "detalle": e.errors(include_url=False)})
+        user = await asyncio.get_running_loop().run_in_executor(
+            self.application.readers, find_user, self.application.engine, credentials.username
+        )
+        # Sin usuario se verifica contra un hash de relleno: la respuesta tarda
+        # lo mismo y no revela qué nombres de usuario existen
+        password_hash = user.password_hash if user is not None else self.application.dummy_hash
+        check = User(password_hash=password_hash).check_password
+        valid = await asyncio.wait_for(
+            asyncio.wrap_future(submit_password_check(check, credentials.password)), PASSWORD_TIMEOUT
+        )
+        if user is None or not valid:
+            return self.write_json(401, {"error": "Usuario o contraseña incorrectos"})
+        self.write_json(200, {"access_token": create_api_token(user.id, user.session_version), "token_type": "bearer"})
+
+class SubmissionHandler(BaseHandler):
+    def initialize(self, form_type):
+        self.form_type = form_type
+
+    async def authenticated_user(self):
+        header = self.request.headers.get("Authorization", "")
+        scheme, _, token = header.partition(" ")
+        # Solo tokens emitidos por /token: el de la URL de app.py se rechaza
+        claims = api_token_claims(token) if scheme.lower() == "bearer" and token else None
+        if claims is None or not await self.application.users.valid(*claims):
+            raise web.HTTPError(401, reason="Token inválido o vencido")
+        return claims[0]
+
+    async def post(self):
+        user_id = await self.authenticated_user()
+        payload = self.read_json()
+        if isinstance(payload, dict) and "forms" in payload:
+            payload = payload["forms"]
+        forms = payload if isinstance(payload, list) else [payload]
+        if not forms or len(forms) > MAX_FORMS_PER_REQUEST:
+            return self.write_json(422, {"error": f"Se aceptan entre 1 y {MAX_FORMS_PER_REQUEST} formularios"})
+
+        try:
+            validated = SUBMISSION_ADAPTERS[self.form_type].validate_python(forms)
+        except ValidationError as e:
+            # Un lote se acepta completo o se rechaza completo
+            errors = {}
+            for error in e.errors(include_url=False):
+                index, *loc = error["loc"]
+                errors.setdefault(index, []).append({**error, "loc": tuple(loc)})
+            return self.write_json(422, {
+                "error": "Formularios fuera de especificación",
+                "formularios": [{"indice": i, "detalle": detail} for i, detail in sorted(errors.items())],
+            })
+        rows = []
+        for form in validated:
+            data = form.model_dump()
+            if data["created_at"] is not None and data["created_at"].tzinfo is not None:
+                # Las fechas se guardan en UTC sin zona horaria, como datetime.utcnow
+                data["created_at"] = data["created_at"].astimezone(timezone.utc).replace(tzinfo=None)
+            data["user_id"] = user_id
+            rows.append(data)
+
+        inserted = await self.application.writer.submit(self.form_type, rows)
+        self.write_json(201, {"insertados": inserted})
+
+def make_app(engine):
+    app = web.Application([
+        (r"/health", HealthHandler),
+        (r"/token", TokenHandler),
+        *[(rf"/api/{form_type}", SubmissionHandler, {"form_type": form_type}) for form_type in FORM_TYPES],
+    ])
+    app.engine = engine
+    # Consultas de lectura (usuarios) fuera del event loop
+    app.readers = ThreadPoolExecutor(max_workers=READER_THREADS, thread_name_prefix="ingest-reader")
+    app.users = UserCache(engine, app.readers)
+    app.dummy_hash = User.create_password_hash(secrets.token_urlsafe())
+    app.writer = BatchWriter(engine)
+    return app
+
+async def serve(engine, port):
+    app = make_app(engine)
+    app.writer.start()
+    app.listen(port)
+    logger.info("API de ingesta escuchando en el puerto %s", port)
+    await asyncio.Event().wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP de ingesta de formularios")
+    parser.add_argument("--port", type=int, default=INGEST_PORT)
+    parser.add_argument("--url", help="URL de la base de datos (por defecto la de database.py)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if not SESSION_SECRET_CONFIGURED:
+        # Los tokens de la API no deben depender de un secreto generado en
+        # este servidor (ver auth.py)
+        parser.error("defina HERMES_SESSION_SECRET antes de iniciar la API de ingesta")
+
+    from database import create_db_engine, engine, init_db
+    if args.url:
+        from models import Base
+        from migrations import run_migrations
+        engine = create_db_engine(args.url)
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine, Base.metadata)
+    else:
+        init_db()
+    asyncio.run(serve(engine, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
-from app import Base, User, UserRole, engine, SessionLocal
+from models import User, UserRole
+from database import SessionLocal, init_db as init_schema
 
 def init_db():
-    # Crear todas las tablas
-    Base.metadata.create_all(bind=engine)
+    # Crear todas las tablas y aplicar migraciones
+    init_schema()
     
     # Crear sesión de base de datos
     db = SessionLocal()
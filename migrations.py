@@ -0,0 +1,175 @@
+import argparse
+import sys
+
+from sqlalchemy import DateTime, Integer, inspect, select, text
+
+# Columnas agregadas a tablas existentes después de su creación inicial.
+# create_all no modifica tablas ya creadas, por eso se agregan aquí de forma
+# idempotente: (tabla, columna, tipo, valor inicial para las filas existentes)
+ADDED_COLUMNS = [
+    ("quality_forms", "updated_at", DateTime(), "created_at"),
+    ("production_forms", "updated_at", DateTime(), "created_at"),
+    ("users", "session_version", Integer(), "0"),
+]
+
+def add_missing_columns(conn):
+    inspector = inspect(conn)
+    for table, column, column_type, backfill in ADDED_COLUMNS:
+        if not inspector.has_table(table):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        if column in existing:
+            continue
+        # El tipo se escribe en el dialecto de la base (DATETIME en SQLite,
+        # TIMESTAMP WITHOUT TIME ZONE en PostgreSQL)
+        column_type = column_type.compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+        if backfill:
+            conn.execute(text(f"UPDATE {table} SET {column} = {backfill} WHERE {column} IS NULL"))
+
+def create_missing_indexes(conn, metadata):
+    # Los índices declarados en los modelos se crean en tablas que ya existían
+    inspector = inspect(conn)
+    created = []
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                created.append(index.name)
+    if created and conn.dialect.name == "sqlite":
+        # Actualiza las estadísticas del planificador para los índices nuevos
+        conn.execute(text("PRAGMA optimize"))
+    return created
+
+def backfill_order_summary(conn):
+    # La tabla order_summary se crea vacía en bases de datos que ya tenían
+    # órdenes: se llena una vez desde los formularios
+    inspector = inspect(conn)
+    if not inspector.has_table("order_summary"):
+        return None
+    if conn.execute(text("SELECT 1 FROM order_summary LIMIT 1")).first() is not None:
+        return None
+    if conn.execute(text("SELECT 1 FROM production_orders LIMIT 1")).first() is None:
+        return None
+    from order_summary import rebuild
+    return rebuild(conn)
+
+def run_migrations(engine, metadata=None):
+    with engine.begin() as conn:
+        add_missing_columns(conn)
+        if metadata is not None:
+            create_missing_indexes(conn, metadata)
+        backfill_order_summary(conn)
+
+# Consultas frecuentes que deben resolverse con índices. Se construyen con
+# los mismos generadores de consultas que usan app.py y view_data.py.
+def hot_queries():
+    from datetime import datetime
+    from models import ProductionOrder, QualityForm, ProductionForm, DailyPlan
+    from data_access import (
+        QUALITY_COLUMNS, PRODUCTION_COLUMNS, quality_select, production_select,
+        filter_conditions, date_bounds_select, watermark_select, _changed_select, combined_select
+    )
+
+    day = datetime(2025, 1, 1)
+    queries = {
+        "orden por número": select(ProductionOrder).where(ProductionOrder.order_number == "1"),
+        "plan diario por fecha": select(DailyPlan).where(DailyPlan.date == day),
+    }
+    for name, model, columns, base in [
+        ("calidad", QualityForm, QUALITY_COLUMNS, quality_select),
+        ("producción", ProductionForm, PRODUCTION_COLUMNS, production_select),
+    ]:
+        queries.update({
+            f"último formulario de {name} por orden": select(model)
+                .where(model.production_order_id == 1)
+                .order_by(model.created_at.desc()).limit(1),
+            f"{name} por orden": base().where(*filter_conditions(model, order_numbers=["1"])),
+            f"{name} por usuario": base().where(*filter_conditions(model, usernames=["admin"])),
+            f"{name} por usuario y fecha": base().where(
+                *filter_conditions(model, usernames=["admin"], start_date=day, end_date=day)
+            ),
+            f"{name} por rango de fechas": base().where(
+                *filter_conditions(model, start_date=day, end_date=day)
+            ),
+            f"{name}: rango de fechas (MIN/MAX)": date_bounds_select(model),
+            f"{name}: marca de agua incremental": watermark_select(model),
+            f"{name}: filas nuevas o modificadas": _changed_select(model, columns, 1, day),
+        })
+    queries["órdenes completas (último formulario) por orden"] = combined_select(
+        "latest", order_numbers=["1"]
+    )
+    queries["producción por dieta"] = production_select().where(
+        *filter_conditions(ProductionForm, dietas=["Dieta 1"])
+    )
+    from plan_actual import ACTUAL_SOURCES, actual_counts_select
+    for model in ACTUAL_SOURCES:
+        queries[f"plan vs. real: {model.__tablename__} por día"] = actual_counts_select(
+            model, day.date(), day.date(), -11, "sqlite"
+        )
+    return queries
+
+def _explain(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(
+        value if isinstance(value, (int, float, str, type(None))) else str(value)
+        for value in (compiled.params[name] for name in compiled.positiontup)
+    )
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+    return [row[-1] for row in rows]
+
+def _full_scans(plan):
+    # Un recorrido completo aparece como "SCAN <tabla>", también cuando recorre
+    # un índice entero ("SCAN <tabla> USING COVERING INDEX ...")
+    return [step for step in plan if step.startswith("SCAN") and step != "SCAN CONSTANT ROW"]
+
+def check_query_plans(engine, verbose=False):
+    failures = {}
+    with engine.connect() as conn:
+        for name, stmt in hot_queries().items():
+            plan = _explain(conn, stmt)
+            scans = _full_scans(plan)
+            if scans:
+                failures[name] = scans
+            if verbose:
+                print(f"{'❌' if scans else '✅'} {name}")
+                for step in plan:
+                    print(f"      {step}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones de la base de datos de Hermes")
+    parser.add_argument("--url", help="URL de la base de datos (por defecto la de database.py)")
+    parser.add_argument(
+        "--check", action="store_true",
+        help="Verificar con EXPLAIN QUERY PLAN que las consultas frecuentes no recorren tablas completas"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostrar el plan de cada consulta")
+    args = parser.parse_args()
+
+    from models import Base
+    if args.url:
+        from database import create_db_engine
+        engine = create_db_engine(args.url)
+        Base.metadata.create_all(bind=engine)
+    else:
+        from database import engine
+    run_migrations(engine, Base.metadata)
+    print("✅ Migraciones aplicadas")
+
+    if args.check:
+        if engine.dialect.name != "sqlite":
+            print("ℹ️ La verificación de planes solo está disponible para SQLite")
+            return
+        failures = check_query_plans(engine, verbose=args.verbose)
+        if failures:
+            for name, scans in failures.items():
+                print(f"❌ {name}: {'; '.join(scans)}")
+            sys.exit(1)
+        print("✅ Ninguna consulta frecuente recorre una tabla completa")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, JSON, Enum, Float, UniqueConstraint, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Date, JSON, Enum, Float, UniqueConstraint, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from werkzeug.security import generate_password_hash, check_password_hash
 import enum
+import os
 
 Base = declarative_base()
 
+# Costo de los hashes pbkdf2 nuevos (los existentes guardan su propio costo)
+PBKDF2_ITERATIONS = int(os.environ.get("HERMES_PBKDF2_ITERATIONS", "600000"))
+PBKDF2_METHOD = f"pbkdf2:sha256:{PBKDF2_ITERATIONS}"
+
 class UserRole(enum.Enum):
     ADMIN = "admin"
     SUPERVISOR = "supervisor"
@@ -19,6 +25,16 @@ class User(Base):
     password_hash = Column(String(128), nullable=False)
     role = Column(Enum(UserRole), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Versión de las sesiones: cerrar sesión la incrementa y los tokens
+    # emitidos con la versión anterior dejan de ser válidos
+    session_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    @staticmethod
+    def create_password_hash(password):
+        return generate_password_hash(password, method=PBKDF2_METHOD)
+
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
 
 class ProductionOrder(Base):
     __tablename__ = "production_orders"
@@ -32,6 +48,10 @@ class ProductionOrder(Base):
     quality_forms = relationship("QualityForm", back_populates="production_order")
     production_forms = relationship("ProductionForm", back_populates="production_order")
 
+    __table_args__ = (
+        Index("ix_production_orders_created", "created_at"),
+    )
+
     @classmethod
     def get_by_order_number(cls, db, order_number):
         return db.query(cls).filter(cls.order_number == order_number).first()
@@ -51,10 +71,20 @@ class QualityForm(Base):
     fibra = Column(Float, nullable=False)  # 3-5%
     cenizas = Column(Float, nullable=False)  # 5-7%
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     production_order = relationship("ProductionOrder", back_populates="quality_forms")
     user = relationship("User")
 
+    # Índices para las consultas frecuentes: último formulario por orden,
+    # filtros del dashboard por usuario y fecha, y lectura incremental
+    __table_args__ = (
+        Index("ix_quality_forms_order_created", "production_order_id", "created_at"),
+        Index("ix_quality_forms_user_created", "user_id", "created_at"),
+        Index("ix_quality_forms_created", "created_at"),
+        Index("ix_quality_forms_updated", "updated_at"),
+    )
+
 class ProductionForm(Base):
     __tablename__ = "production_forms"
     
@@ -68,10 +98,84 @@ class ProductionForm(Base):
     temperatura = Column(Integer, nullable=False)
     peletizadora = Column(String(50), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     production_order = relationship("ProductionOrder", back_populates="production_forms")
     user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_production_forms_order_created", "production_order_id", "created_at"),
+        Index("ix_production_forms_user_created", "user_id", "created_at"),
+        Index("ix_production_forms_dieta_created", "dieta", "created_at"),
+        Index("ix_production_forms_created", "created_at"),
+        Index("ix_production_forms_updated", "updated_at"),
+    )
+
+class OrderSummary(Base):
+    # Una fila por orden, mantenida junto con los formularios (ver order_summary.py)
+    __tablename__ = "order_summary"
+
+    production_order_id = Column(Integer, ForeignKey("production_orders.id"), primary_key=True)
+    quality_count = Column(Integer, nullable=False, default=0)
+    quality_first_at = Column(DateTime)
+    quality_last_at = Column(DateTime)
+    quality_latest_id = Column(Integer, ForeignKey("quality_forms.id"))
+    production_count = Column(Integer, nullable=False, default=0)
+    production_first_at = Column(DateTime)
+    production_last_at = Column(DateTime)
+    production_latest_id = Column(Integer, ForeignKey("production_forms.id"))
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    production_order = relationship("ProductionOrder")
+
+# Agregados por turno de las mediciones (ver rollups.py). Guardan conteo,
+# suma, suma de cuadrados, mínimo y máximo para poder combinar turnos, días
+# y grupos sin volver a leer los formularios.
+class QualityRollup(Base):
+    __tablename__ = "quality_rollups"
+
+    day = Column(Date, primary_key=True)
+    shift = Column(Integer, primary_key=True)
+    parameter = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False)
+    total = Column(Float, nullable=False)
+    total_sq = Column(Float, nullable=False)
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+
+class ProductionRollup(Base):
+    __tablename__ = "production_rollups"
+
+    day = Column(Date, primary_key=True)
+    shift = Column(Integer, primary_key=True)
+    dieta = Column(String(50), primary_key=True)
+    peletizadora = Column(String(50), primary_key=True)
+    parameter = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False)
+    total = Column(Float, nullable=False)
+    total_sq = Column(Float, nullable=False)
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+
+class RollupState(Base):
+    # Marca de agua de los formularios ya agregados en cada tabla de rollups
+    __tablename__ = "rollup_state"
+
+    name = Column(String(50), primary_key=True)
+    max_id = Column(Integer)
+    max_updated_at = Column(DateTime)
+
+class ArchiveRun(Base):
+    # Un mes movido a su archivo de formularios (ver archive.py); los
+    # conjuntos de datos en memoria se recargan cuando aparece una fila nueva
+    __tablename__ = "archive_runs"
+
+    id = Column(Integer, primary_key=True)
+    month = Column(String(7), nullable=False)
+    quality_forms = Column(Integer, nullable=False)
+    production_forms = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class DailyPlan(Base):
     __tablename__ = 'daily_plans'
     
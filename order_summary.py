@@ -0,0 +1,212 @@
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import DateTime, and_, case, delete, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import ProductionOrder, QualityForm, ProductionForm, OrderSummary
+
+# Resumen por orden (tabla order_summary): conteo, primera y última fecha y
+# último formulario de cada tipo. app.py lo actualiza en la misma transacción
+# en que guarda el formulario; las importaciones masivas lo recalculan para
+# las órdenes del bloque, y `python order_summary.py` lo reconstruye completo.
+
+# Prefijo de las columnas del resumen para cada tipo de formulario
+SUMMARY_SIDES = {
+    QualityForm: "quality",
+    ProductionForm: "production",
+}
+
+# Órdenes por sentencia al recalcular un subconjunto
+REFRESH_BATCH = 500
+
+_DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+def summary_columns(model):
+    table = OrderSummary.__table__
+    prefix = SUMMARY_SIDES[model]
+    return {
+        name: table.c[f"{prefix}_{name}"]
+        for name in ("count", "first_at", "last_at", "latest_id")
+    }
+
+def record_form(dialect_name, model, order_id, form_id, created_at, now):
+    # Suma un formulario recién insertado al resumen de su orden. Es el último
+    # de la orden si es el más reciente (a igual fecha, el de mayor id).
+    table = OrderSummary.__table__
+    columns = summary_columns(model)
+    stmt = _DIALECT_INSERTS[dialect_name](table).values({
+        table.c.production_order_id: order_id,
+        columns["count"]: 1,
+        columns["first_at"]: created_at,
+        columns["last_at"]: created_at,
+        columns["latest_id"]: form_id,
+        table.c.updated_at: now,
+    })
+    new = stmt.excluded
+    is_latest = (
+        columns["last_at"].is_(None)
+        | (new[columns["last_at"].name] > columns["last_at"])
+        | and_(new[columns["last_at"].name] == columns["last_at"],
+               new[columns["latest_id"].name] > columns["latest_id"])
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.production_order_id],
+        set_={
+            columns["count"].name: func.coalesce(columns["count"], 0) + 1,
+            columns["first_at"].name: case(
+                (columns["first_at"].is_(None) | (new[columns["first_at"].name] < columns["first_at"]),
+                 new[columns["first_at"].name]),
+                else_=columns["first_at"],
+            ),
+            columns["last_at"].name: case((is_latest, new[columns["last_at"].name]), else_=columns["last_at"]),
+            columns["latest_id"].name: case((is_latest, new[columns["latest_id"].name]), else_=columns["latest_id"]),
+            "updated_at": now,
+        },
+    )
+
+def touch_form(model, form_id, now):
+    # Un formulario existente cambió: el resumen no cambia, pero su
+    # updated_at avisa a quien lea el resumen de forma incremental
+    return (
+        update(OrderSummary)
+        .where(OrderSummary.production_order_id == select(model.production_order_id)
+               .where(model.id == form_id).scalar_subquery())
+        .values(updated_at=now)
+    )
+
+def _side_select(model, order_ids):
+    # Conteo, fechas y posición de cada formulario dentro de su orden en una
+    # sola pasada; la fila con rn = 1 es el último formulario
+    partition = model.production_order_id
+    ranked = (
+        select(
+            partition.label("order_id"),
+            model.id.label("form_id"),
+            model.created_at.label("created_at"),
+            func.count().over(partition_by=partition).label("n"),
+            func.min(model.created_at).over(partition_by=partition).label("first_at"),
+            func.row_number().over(
+                partition_by=partition, order_by=(model.created_at.desc(), model.id.desc())
+            ).label("rn"),
+        )
+        .where(partition.isnot(None))
+    )
+    if order_ids is not None:
+        ranked = ranked.where(partition.in_(order_ids))
+    return ranked.subquery()
+
+def summary_select():
+    # El resumen calculado desde los formularios, para comparar con el guardado
+    selected = [ProductionOrder.id.label("production_order_id")]
+    stmt_from = ProductionOrder.__table__
+    for model, prefix in SUMMARY_SIDES.items():
+        side = _side_select(model, None)
+        selected += [
+            func.coalesce(side.c.n, 0).label(f"{prefix}_count"),
+            side.c.first_at.label(f"{prefix}_first_at"),
+            side.c.created_at.label(f"{prefix}_last_at"),
+            side.c.form_id.label(f"{prefix}_latest_id"),
+        ]
+        stmt_from = stmt_from.outerjoin(side, and_(side.c.order_id == ProductionOrder.id, side.c.rn == 1))
+    return select(*selected).select_from(stmt_from)
+
+def _write_summary(conn, order_ids, now):
+    # Una fila vacía por orden y luego, por tipo de formulario, sus columnas.
+    # Cada lado se escribe por separado: unir las subconsultas con ventana
+    # obliga a SQLite a recorrer una de ellas por cada orden.
+    table = OrderSummary.__table__
+    orders = select(
+        ProductionOrder.id, *[literal(0) for _ in SUMMARY_SIDES], literal(now, DateTime)
+    )
+    if order_ids is not None:
+        orders = orders.where(ProductionOrder.id.in_(order_ids))
+    conn.execute(insert(table).from_select(
+        [table.c.production_order_id,
+         *[summary_columns(model)["count"] for model in SUMMARY_SIDES],
+         table.c.updated_at],
+        orders,
+    ))
+    for model in SUMMARY_SIDES:
+        columns = summary_columns(model)
+        side = _side_select(model, order_ids)
+        stmt = _DIALECT_INSERTS[conn.dialect.name](table).from_select(
+            [table.c.production_order_id, columns["count"], columns["first_at"],
+             columns["last_at"], columns["latest_id"], table.c.updated_at],
+            select(side.c.order_id, side.c.n, side.c.first_at, side.c.created_at,
+                   side.c.form_id, literal(now, DateTime)).where(side.c.rn == 1),
+        )
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.production_order_id],
+            set_={column.name: stmt.excluded[column.name] for column in columns.values()},
+        ))
+
+def refresh_orders(conn, order_ids):
+    # Recalcula el resumen de las órdenes indicadas (importaciones masivas)
+    order_ids = sorted(set(order_ids))
+    now = datetime.utcnow()
+    for start in range(0, len(order_ids), REFRESH_BATCH):
+        batch = order_ids[start:start + REFRESH_BATCH]
+        conn.execute(delete(OrderSummary).where(OrderSummary.production_order_id.in_(batch)))
+        _write_summary(conn, batch, now)
+
+def rebuild(conn):
+    conn.execute(delete(OrderSummary))
+    _write_summary(conn, None, datetime.utcnow())
+    return conn.execute(select(func.count()).select_from(OrderSummary)).scalar()
+
+def check(conn):
+    # Órdenes cuyo resumen guardado no coincide con el recalculado
+    expected = summary_select().subquery()
+    compared = [name for name in expected.c.keys() if name != "production_order_id"]
+    table = OrderSummary.__table__
+    stmt = (
+        select(expected.c.production_order_id)
+        .select_from(expected.outerjoin(table, table.c.production_order_id == expected.c.production_order_id))
+        .where(table.c.production_order_id.is_(None)
+               | ~and_(*[table.c[name].is_not_distinct_from(expected.c[name]) for name in compared]))
+        .order_by(expected.c.production_order_id)
+    )
+    return conn.execute(stmt).scalars().all()
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye el resumen por orden (order_summary)")
+    parser.add_argument("--url", help="URL de la base de datos (por defecto la de database.py)")
+    parser.add_argument(
+        "--check", action="store_true",
+        help="Solo comparar el resumen guardado con el recalculado desde los formularios"
+    )
+    args = parser.parse_args()
+
+    from models import Base
+    from migrations import run_migrations
+    if args.url:
+        from database import create_db_engine
+        engine = create_db_engine(args.url)
+        Base.metadata.create_all(bind=engine)
+    else:
+        from database import engine
+        Base.metadata.create_all(bind=engine)
+    run_migrations(engine, Base.metadata)
+
+    if args.check:
+        with engine.connect() as conn:
+            stale = check(conn)
+        if stale:
+            print(f"❌ {len(stale)} órdenes con resumen desactualizado (primeras: {stale[:10]})")
+            sys.exit(1)
+        print("✅ El resumen por orden coincide con los formularios")
+        return
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        orders = rebuild(conn)
+    print(f"✅ Resumen reconstruido: {orders} órdenes en {time.perf_counter() - start:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from sqlalchemy import func, select, tuple_
+
+from data_access import DATE_COLUMNS, frame_from_rows
+
+# Paginación por llave (keyset / seek): cada página empieza después de la
+# última fila de la anterior, comparando las columnas de orden en el WHERE.
+# A diferencia de OFFSET, el costo de una página no crece con su posición.
+
+def keyset_page(conn, stmt, key_labels, after=None, page_size=100, descending=False,
+                date_columns=DATE_COLUMNS):
+    # key_labels: columnas del SELECT que juntas identifican una fila
+    # (p. ej. fecha de creación e ID). Devuelve la página y el cursor de la
+    # siguiente (None si es la última).
+    sub = stmt.order_by(None).subquery()
+    keys = [sub.c[label] for label in key_labels]
+    page = select(sub)
+    if after is not None:
+        if descending:
+            page = page.where(tuple_(*keys) < tuple_(*after))
+        else:
+            page = page.where(tuple_(*keys) > tuple_(*after))
+    page = page.order_by(*[key.desc() if descending else key for key in keys]).limit(page_size + 1)
+
+    result = conn.execute(page)
+    columns = list(result.keys())
+    rows = result.fetchall()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = tuple(last[columns.index(label)] for label in key_labels)
+
+    return frame_from_rows(rows, columns, date_columns), next_cursor
+
+def count_rows(conn, stmt):
+    # El total se calcula aparte de la página, con un COUNT sobre la misma consulta
+    count = select(func.count()).select_from(stmt.order_by(None).subquery())
+    return conn.execute(count).scalar()
+
+def _after_mask(df, key_labels, after, descending):
+    # Comparación lexicográfica de tuplas, vectorizada
+    mask = None
+    for label, value in reversed(list(zip(key_labels, after))):
+        column = df[label]
+        beyond = column < value if descending else column > value
+        mask = beyond if mask is None else beyond | ((column == value) & mask)
+    return mask
+
+def frame_keyset_page(df, key_labels, after=None, page_size=100, descending=False):
+    # Misma paginación sobre un DataFrame que ya está en memoria
+    if after is not None:
+        df = df[_after_mask(df, key_labels, after, descending)]
+    if descending:
+        page = df.nlargest(page_size + 1, key_labels)
+    else:
+        page = df.nsmallest(page_size + 1, key_labels)
+    next_cursor = None
+    if len(page) > page_size:
+        page = page.iloc[:page_size]
+        next_cursor = tuple(page.iloc[-1][label] for label in key_labels)
+    return page.reset_index(drop=True), next_cursor
@@ -0,0 +1,168 @@
+import threading
+from datetime import datetime, time as day_time, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Date, cast, distinct, func, select
+
+from models import ProductionOrder, QualityForm, ProductionForm, DailyPlan
+from rollups import PLANT_TIMEZONE, SHIFT_START_HOUR, utc_bounds
+
+# Plan vs. real: el plan diario (DailyPlan) contra las órdenes y formularios
+# registrados en cada día de producción (mismos días que rollups.py). Los
+# conteos se agrupan en la base de datos; los días ya cerrados se guardan en
+# memoria y en cada vista solo se vuelve a consultar el día en curso.
+
+# Conteos reales por día, por tabla: columna -> qué se cuenta ("rows" filas,
+# "orders" órdenes distintas)
+ACTUAL_SOURCES = {
+    ProductionOrder: {"ordenes_creadas": "rows"},
+    ProductionForm: {"ordenes_producidas": "orders", "formularios_produccion": "rows"},
+    QualityForm: {"ordenes_con_calidad": "orders", "formularios_calidad": "rows"},
+}
+ACTUAL_COLUMNS = [column for columns in ACTUAL_SOURCES.values() for column in columns]
+PLAN_COLUMNS = ["estimated_orders", "die_size", "soy_tons", "corn_cake_tons"]
+ROLLING_WINDOWS = [7, 30]
+
+def production_day(moment=None):
+    # Día de producción en curso (o el de un datetime UTC sin zona)
+    moment = moment or datetime.utcnow()
+    local = moment.replace(tzinfo=timezone.utc).astimezone(PLANT_TIMEZONE)
+    return (local - timedelta(hours=SHIFT_START_HOUR)).date()
+
+def first_complete_day(start):
+    # Primer día de producción que empieza en start (UTC) o después: con
+    # archive.attachable_start, el primero que incluye sus formularios archivados
+    day = production_day(start)
+    if utc_bounds(day, day)[0] < start:
+        day += timedelta(days=1)
+    return day
+
+def _offset_hours(day):
+    # Horas a sumar a una fecha UTC para obtener su día de producción
+    start = datetime.combine(day, day_time(SHIFT_START_HOUR), tzinfo=PLANT_TIMEZONE)
+    return start.utcoffset().total_seconds() / 3600 - SHIFT_START_HOUR
+
+def _offset_segments(start_day, end_day):
+    # Tramos de días con el mismo desfase UTC (cambian con el horario de verano)
+    segments = []
+    day = start_day
+    while day <= end_day:
+        offset = _offset_hours(day)
+        if segments and segments[-1][2] == offset:
+            segments[-1][1] = day
+        else:
+            segments.append([day, day, offset])
+        day += timedelta(days=1)
+    return segments
+
+def _day_expression(column, offset, dialect_name):
+    if dialect_name == "sqlite":
+        return func.date(column, f"{offset:+g} hours")
+    return cast(column + timedelta(hours=offset), Date)
+
+def actual_counts_select(model, start_day, end_day, offset, dialect_name):
+    day = _day_expression(model.created_at, offset, dialect_name).label("day")
+    counts = [
+        (func.count(distinct(model.production_order_id)) if kind == "orders" else func.count()).label(column)
+        for column, kind in ACTUAL_SOURCES[model].items()
+    ]
+    start, end = utc_bounds(start_day, end_day)
+    return (
+        select(day, *counts)
+        .where(model.created_at >= start, model.created_at < end)
+        .group_by(day)
+    )
+
+def load_actuals(conn, start_day, end_day):
+    # Conteos reales por día en [start_day, end_day], con ceros en los días
+    # sin actividad
+    days = pd.Index(pd.date_range(start_day, end_day, freq="D").date, name="day")
+    parts = []
+    for model, columns in ACTUAL_SOURCES.items():
+        frames = [
+            pd.DataFrame.from_records(
+                conn.execute(actual_counts_select(model, first, last, offset, conn.dialect.name)).all(),
+                columns=["day", *columns]
+            )
+            for first, last, offset in _offset_segments(start_day, end_day)
+        ]
+        counts = pd.concat(frames)
+        # SQLite devuelve el día como texto
+        counts["day"] = pd.to_datetime(counts["day"]).dt.date
+        parts.append(counts.set_index("day").reindex(days, fill_value=0))
+    return pd.concat(parts, axis=1)[ACTUAL_COLUMNS].astype(int)
+
+class ActualsCache:
+    # Conteos de días cerrados, compartidos entre sesiones. Si se insertan
+    # formularios u órdenes con fecha de un día ya guardado (importación
+    # histórica o API de ingesta) ese día y los siguientes se recalculan.
+    # Los días anteriores a complete_from (la conexión no adjunta sus meses
+    # archivados) se cuentan pero no se guardan.
+    def __init__(self):
+        self.closed = pd.DataFrame(columns=ACTUAL_COLUMNS, index=pd.Index([], name="day"))
+        self.max_ids = {}
+        self._lock = threading.Lock()
+
+    def _invalidate(self, conn):
+        earliest = None
+        for model in ACTUAL_SOURCES:
+            max_id = conn.execute(select(func.max(model.id))).scalar()
+            seen = self.max_ids.get(model)
+            if seen is not None and max_id is not None and max_id > seen:
+                oldest = conn.execute(select(func.min(model.created_at)).where(model.id > seen)).scalar()
+                if oldest is not None:
+                    day = production_day(oldest)
+                    earliest = day if earliest is None else min(earliest, day)
+            self.max_ids[model] = max_id
+        if earliest is not None:
+            self.closed = self.closed[self.closed.index < earliest]
+
+    def actuals(self, conn, start_day, end_day, today=None, complete_from=None):
+        today = today or production_day()
+        partial = None
+        with self._lock:
+            self._invalidate(conn)
+            last_closed = min(end_day, today - timedelta(days=1))
+            if start_day <= last_closed:
+                wanted = pd.date_range(start_day, last_closed, freq="D").date
+                missing = [day for day in wanted if day not in self.closed.index]
+                if missing:
+                    # Un solo rango desde el primer día faltante hasta el último
+                    fresh = load_actuals(conn, missing[0], missing[-1])
+                    fresh = fresh[~fresh.index.isin(self.closed.index)]
+                    if complete_from is not None:
+                        partial = fresh[fresh.index < complete_from]
+                        fresh = fresh[fresh.index >= complete_from]
+                    self.closed = pd.concat([self.closed, fresh]).sort_index()
+            parts = [self.closed[(self.closed.index >= start_day) & (self.closed.index <= end_day)], partial]
+        if start_day <= today <= end_day:
+            parts.append(load_actuals(conn, today, today))
+        return pd.concat(parts).sort_index().astype(int)
+
+def load_plans(conn, start_day, end_day):
+    rows = conn.execute(
+        select(DailyPlan.date, *[getattr(DailyPlan, column) for column in PLAN_COLUMNS])
+        .where(DailyPlan.date >= datetime.combine(start_day, day_time()),
+               DailyPlan.date < datetime.combine(end_day + timedelta(days=1), day_time()))
+    ).all()
+    frame = pd.DataFrame.from_records(rows, columns=["day", *PLAN_COLUMNS])
+    frame["day"] = pd.to_datetime(frame["day"]).dt.date
+    return frame.set_index("day")
+
+def plan_vs_actual(plans, actuals, windows=ROLLING_WINDOWS):
+    # Una fila por día: plan, real, diferencia y cumplimiento, más sumas
+    # móviles de plan y real en cada ventana
+    frame = actuals.join(plans, how="left")
+    planned = frame["estimated_orders"].astype(float)
+    actual = frame["ordenes_producidas"].astype(float)
+    frame["diferencia"] = actual - planned
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["cumplimiento"] = actual / planned
+        for window in windows:
+            planned_sum = planned.rolling(window, min_periods=1).sum()
+            actual_sum = actual.where(planned.notna()).rolling(window, min_periods=1).sum()
+            frame[f"plan_{window}d"] = planned_sum
+            frame[f"real_{window}d"] = actual.rolling(window, min_periods=1).sum()
+            frame[f"cumplimiento_{window}d"] = actual_sum / planned_sum
+    return frame
@@ -0,0 +1,392 @@
+import argparse
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, time as day_time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, case, delete, func, select, type_coerce, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError
+
+import archive
+from config import QUALITY_FIELDS, PRODUCTION_FIELDS
+from data_access import frame_from_rows, watermark_select
+from models import QualityForm, ProductionForm, QualityRollup, ProductionRollup, RollupState
+
+logger = logging.getLogger("hermes.rollups")
+
+# Agregados por día de producción y turno de las mediciones numéricas. Cada
+# fila guarda conteo, suma, suma de cuadrados, mínimo y máximo, así que la
+# media y la desviación estándar de cualquier combinación de turnos, días,
+# dietas o peletizadoras se calculan sumando filas, sin leer formularios.
+#
+# Los formularios guardan created_at en UTC; el día y el turno se calculan en
+# la hora local de la planta. El día de producción empieza con el primer
+# turno: una muestra de las 02:00 pertenece al último turno del día anterior.
+PLANT_TIMEZONE = ZoneInfo(os.environ.get("HERMES_TIMEZONE", "America/Bogota"))
+SHIFT_START_HOUR = int(os.environ.get("HERMES_SHIFT_START_HOUR", "6"))
+SHIFT_HOURS = int(os.environ.get("HERMES_SHIFT_HOURS", "8"))
+
+# Filas de formularios por bloque al agregar desde la base de datos
+ROLLUP_CHUNK_ROWS = 100_000
+
+def numeric_fields(fields):
+    return [name for name, spec in fields.items() if "min_value" in spec]
+
+# Tabla de rollups de cada tipo de formulario:
+# (modelo, tabla de rollups, parámetros, dimensiones además de día y turno)
+ROLLUPS = {
+    "quality": (QualityForm, QualityRollup, numeric_fields(QUALITY_FIELDS), []),
+    "production": (ProductionForm, ProductionRollup, numeric_fields(PRODUCTION_FIELDS), ["dieta", "peletizadora"]),
+}
+
+STATS = ["count", "total", "total_sq", "minimum", "maximum"]
+
+_DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+def shift_days(created_at):
+    # Día de producción (datetime64 a medianoche) y turno (1, 2, ...) de
+    # cada fecha UTC
+    local = created_at.dt.tz_localize("UTC").dt.tz_convert(PLANT_TIMEZONE).dt.tz_localize(None)
+    shifted = local - pd.Timedelta(hours=SHIFT_START_HOUR)
+    return shifted.dt.normalize(), shifted.dt.hour // SHIFT_HOURS + 1
+
+def utc_bounds(start_day, end_day):
+    # Rango [inicio de start_day, inicio del día siguiente a end_day) en UTC
+    def to_utc(day):
+        local = datetime.combine(day, day_time(SHIFT_START_HOUR), tzinfo=PLANT_TIMEZONE)
+        return local.astimezone(timezone.utc).replace(tzinfo=None)
+    return to_utc(start_day), to_utc(end_day + timedelta(days=1))
+
+def aggregate(frame, parameters, dims):
+    # Formularios (con created_at como datetime) a filas de rollup
+    keys = ["day", "shift", *dims]
+    day, shift = shift_days(frame["created_at"])
+    long = frame[dims + parameters].assign(day=day, shift=shift).melt(
+        id_vars=keys, value_vars=parameters, var_name="parameter", value_name="value"
+    )
+    long["value"] = long["value"].astype(float)
+    long["value_sq"] = long["value"].to_numpy() ** 2
+    return long.groupby(keys + ["parameter"], sort=False).agg(
+        count=("value", "count"), total=("value", "sum"), total_sq=("value_sq", "sum"),
+        minimum=("value", "min"), maximum=("value", "max"),
+    ).reset_index()
+
+def combine(buckets):
+    # Une rollups parciales de las mismas llaves (los agregados se suman)
+    buckets = [b for b in buckets if b is not None and len(b)]
+    if not buckets:
+        return None
+    if len(buckets) == 1:
+        return buckets[0]
+    keys = [column for column in buckets[0].columns if column not in STATS]
+    return pd.concat(buckets, ignore_index=True).groupby(keys, sort=False).agg(
+        count=("count", "sum"), total=("total", "sum"), total_sq=("total_sq", "sum"),
+        minimum=("minimum", "min"), maximum=("maximum", "max"),
+    ).reset_index()
+
+def _rows_select(model, parameters, dims):
+    return select(
+        model.id,
+        type_coerce(model.created_at, String).label("created_at"),
+        *[getattr(model, name) for name in dims + parameters],
+    )
+
+def _aggregate_rows(conn, stmt, parameters, dims):
+    result = conn.execute(stmt)
+    columns = list(result.keys())
+    return combine([
+        aggregate(frame_from_rows(rows, columns, date_columns=["created_at"]), parameters, dims)
+        for rows in result.partitions(ROLLUP_CHUNK_ROWS)
+    ])
+
+def _upsert(dialect_name, rollup):
+    # Suma los agregados a la fila existente, o la crea
+    table = rollup.__table__
+    stmt = _DIALECT_INSERTS[dialect_name](table)
+    new, old = stmt.excluded, table.c
+    return stmt.on_conflict_do_update(
+        index_elements=list(table.primary_key.columns),
+        set_={
+            "count": old["count"] + new["count"],
+            "total": old["total"] + new["total"],
+            "total_sq": old["total_sq"] + new["total_sq"],
+            "minimum": case((new["minimum"] < old["minimum"], new["minimum"]), else_=old["minimum"]),
+            "maximum": case((new["maximum"] > old["maximum"], new["maximum"]), else_=old["maximum"]),
+        },
+    )
+
+def write_buckets(conn, rollup, buckets):
+    if buckets is None or not len(buckets):
+        return 0
+    buckets = buckets.assign(day=buckets["day"].dt.date)
+    conn.execute(_upsert(conn.dialect.name, rollup), buckets.to_dict("records"))
+    return len(buckets)
+
+@contextmanager
+def _form_source(conn, start, end, directory):
+    # La conexión de escritura si el rango no alcanza meses archivados; si
+    # no, una conexión aparte con esos meses adjuntos (ver archive.py)
+    source = archive.reader(conn.engine, start or datetime.min, end, directory)
+    if source is conn.engine:
+        yield conn
+    else:
+        with source.connect() as archived:
+            yield archived
+
+def _windows(start, end, directory):
+    # Tramos [inicio, fin) de created_at que cubren [start, end) con a lo
+    # sumo archive.MAX_ATTACHED meses archivados cada uno (None: sin límite)
+    months = archive.partitions_for(start or datetime.min, end, directory)
+    bounds = [start, *months[archive.MAX_ATTACHED::archive.MAX_ATTACHED], end]
+    return list(zip(bounds, bounds[1:]))
+
+def _aggregate_forms(conn, name, start=None, end=None, *conditions):
+    # Rollups de los formularios con created_at en [start, end), de la base
+    # viva y de los meses archivados: reconstruir o recalcular días ya
+    # archivados no pierde sus formularios
+    model, rollup, parameters, dims = ROLLUPS[name]
+    directory = archive.archive_dir(conn.engine)
+    parts = []
+    for low, high in _windows(start, end, directory):
+        stmt = _rows_select(model, parameters, dims).where(*conditions)
+        if low is not None:
+            stmt = stmt.where(model.created_at >= low)
+        if high is not None:
+            stmt = stmt.where(model.created_at < high)
+        with _form_source(conn, low, high, directory) as source:
+            parts.append(_aggregate_rows(source, stmt, parameters, dims))
+    return combine(parts)
+
+def _day_ranges(days):
+    # Días consecutivos agrupados en rangos (primero, último)
+    ranges = []
+    for day in sorted(days):
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+def _replace_days(conn, name, days, max_id):
+    # Recalcula desde los formularios los días indicados (solo formularios
+    # hasta max_id; los posteriores los agrega el siguiente refresh)
+    model, rollup, parameters, dims = ROLLUPS[name]
+    conn.execute(delete(rollup).where(rollup.day.in_(sorted(days))))
+    return write_buckets(conn, rollup, combine([
+        _aggregate_forms(conn, name, *utc_bounds(first, last), model.id <= max_id)
+        for first, last in _day_ranges(days)
+    ]))
+
+def _rebuild(conn, name, max_id):
+    model, rollup, parameters, dims = ROLLUPS[name]
+    conn.execute(delete(rollup))
+    if max_id is None:
+        return 0
+    return write_buckets(conn, rollup, _aggregate_forms(conn, name, None, None, model.id <= max_id))
+
+def _claim(conn, name, state, watermark):
+    # Marca la nueva marca de agua antes de escribir. Si otro proceso ya la
+    # movió (o está escribiendo) no se hace nada: sus rollups incluyen los
+    # mismos formularios.
+    max_id, max_updated_at = watermark
+    if state is None:
+        stmt = _DIALECT_INSERTS[conn.dialect.name](RollupState).values(
+            name=name, max_id=max_id, max_updated_at=max_updated_at
+        ).on_conflict_do_nothing()
+    else:
+        stmt = (
+            update(RollupState)
+            .where(RollupState.name == name,
+                   RollupState.max_id.is_not_distinct_from(state.max_id),
+                   RollupState.max_updated_at.is_not_distinct_from(state.max_updated_at))
+            .values(max_id=max_id, max_updated_at=max_updated_at)
+        )
+    try:
+        return conn.execute(stmt).rowcount == 1
+    except OperationalError:
+        logger.info("Rollups de %s: otro proceso los está actualizando", name)
+        return False
+
+def refresh(engine, name):
+    # Agrega los formularios nuevos y recalcula los días que tienen
+    # formularios modificados desde la última vez. Devuelve las filas de
+    # rollup escritas.
+    model, rollup, parameters, dims = ROLLUPS[name]
+    with engine.connect() as conn:
+        state = conn.execute(
+            select(RollupState.max_id, RollupState.max_updated_at).where(RollupState.name == name)
+        ).first()
+        watermark = tuple(conn.execute(watermark_select(model)).one())
+        if state is not None and tuple(state) == watermark:
+            return 0
+        if not _claim(conn, name, state, watermark):
+            conn.rollback()
+            return 0
+
+        max_id = watermark[0]
+        if state is None or state.max_id is None:
+            written = _rebuild(conn, name, max_id)
+            conn.commit()
+            return written
+
+        changed_days = set()
+        if state.max_updated_at is not None:
+            changed = conn.execute(
+                select(type_coerce(model.created_at, String).label("created_at"))
+                .where(model.id <= state.max_id, model.updated_at > state.max_updated_at)
+            ).scalars().all()
+            if changed:
+                days, _ = shift_days(pd.Series(pd.to_datetime(changed, format="ISO8601")))
+                changed_days = set(days.dt.date)
+
+        written = 0
+        if changed_days:
+            written += _replace_days(conn, name, changed_days, max_id)
+        result = conn.execute(
+            _rows_select(model, parameters, dims).where(model.id > state.max_id, model.id <= max_id)
+        )
+        columns = list(result.keys())
+        parts = []
+        for rows in result.partitions(ROLLUP_CHUNK_ROWS):
+            frame = frame_from_rows(rows, columns, date_columns=["created_at"])
+            if changed_days:
+                # Los días recalculados ya incluyen estos formularios
+                day, _ = shift_days(frame["created_at"])
+                frame = frame[~day.dt.date.isin(list(changed_days))]
+            parts.append(aggregate(frame, parameters, dims))
+        written += write_buckets(conn, rollup, combine(parts))
+        conn.commit()
+        return written
+
+def refresh_all(engine):
+    return {name: refresh(engine, name) for name in ROLLUPS}
+
+def recompute(engine, name, start_day, end_day):
+    # Recalcula los rollups de un rango de días de producción
+    model, rollup, parameters, dims = ROLLUPS[name]
+    with engine.begin() as conn:
+        max_id = conn.execute(select(RollupState.max_id).where(RollupState.name == name)).scalar()
+        if max_id is None:
+            return 0
+        conn.execute(delete(rollup).where(rollup.day >= start_day, rollup.day <= end_day))
+        return write_buckets(conn, rollup, _aggregate_forms(
+            conn, name, *utc_bounds(start_day, end_day), model.id <= max_id
+        ))
+
+def rebuild(engine, name):
+    model = ROLLUPS[name][0]
+    with engine.begin() as conn:
+        max_id, max_updated_at = conn.execute(watermark_select(model)).one()
+        conn.execute(delete(RollupState).where(RollupState.name == name))
+        conn.execute(RollupState.__table__.insert().values(
+            name=name, max_id=max_id, max_updated_at=max_updated_at
+        ))
+        return _rebuild(conn, name, max_id)
+
+# Consultas del dashboard de tendencias (solo leen las tablas de rollups)
+def trend_select(name, parameters, start_day=None, end_day=None, by_shift=False,
+                 group_by=(), dietas=None, peletizadoras=None):
+    rollup = ROLLUPS[name][1]
+    keys = [rollup.day]
+    if by_shift:
+        keys.append(rollup.shift)
+    keys += [getattr(rollup, dim) for dim in group_by]
+    keys.append(rollup.parameter)
+    stmt = (
+        select(
+            *keys,
+            func.sum(rollup.count).label("count"),
+            func.sum(rollup.total).label("total"),
+            func.sum(rollup.total_sq).label("total_sq"),
+            func.min(rollup.minimum).label("minimum"),
+            func.max(rollup.maximum).label("maximum"),
+        )
+        .where(rollup.parameter.in_(parameters))
+        .group_by(*keys)
+        .order_by(*keys)
+    )
+    if start_day is not None:
+        stmt = stmt.where(rollup.day >= start_day)
+    if end_day is not None:
+        stmt = stmt.where(rollup.day <= end_day)
+    if dietas:
+        stmt = stmt.where(rollup.dieta.in_(dietas))
+    if peletizadoras:
+        stmt = stmt.where(rollup.peletizadora.in_(peletizadoras))
+    return stmt
+
+def with_moments(frame):
+    # Media y desviación estándar muestral a partir de los agregados
+    count = frame["count"].to_numpy(dtype=float)
+    total = frame["total"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+        variance = (frame["total_sq"].to_numpy(dtype=float) - total * mean) / (count - 1)
+    frame["mean"] = mean
+    frame["std"] = np.where(count > 1, np.sqrt(np.clip(variance, 0, None)), np.nan)
+    return frame
+
+def load_trends(conn, name, parameters, **options):
+    result = conn.execute(trend_select(name, parameters, **options))
+    frame = pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()))
+    return with_moments(frame)
+
+def day_bounds(conn, name):
+    rollup = ROLLUPS[name][1]
+    return conn.execute(select(func.min(rollup.day), func.max(rollup.day))).one()
+
+def main():
+    parser = argparse.ArgumentParser(description="Actualiza los rollups por día y turno de las mediciones")
+    parser.add_argument("--url", help="URL de la base de datos (por defecto la de database.py)")
+    parser.add_argument("--form", choices=list(ROLLUPS), help="Solo un tipo de formulario")
+    parser.add_argument("--rebuild", action="store_true", help="Recalcular todo desde los formularios")
+    parser.add_argument("--start", type=date.fromisoformat, help="Recalcular desde este día (AAAA-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Recalcular hasta este día (AAAA-MM-DD)")
+    parser.add_argument("--every", type=float, metavar="SEGUNDOS",
+                        help="Seguir corriendo y agregar los formularios nuevos cada tantos segundos")
+    args = parser.parse_args()
+
+    from models import Base
+    from migrations import run_migrations
+    if args.url:
+        from database import create_db_engine
+        engine = create_db_engine(args.url)
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine, Base.metadata)
+    else:
+        from database import engine, init_db
+        init_db()
+
+    for name in ([args.form] if args.form else ROLLUPS):
+        start = time.perf_counter()
+        if args.rebuild:
+            written = rebuild(engine, name)
+        elif args.start or args.end:
+            refresh(engine, name)
+            with engine.connect() as conn:
+                first, last = day_bounds(conn, name)
+            written = recompute(engine, name, args.start or first, args.end or last) if first else 0
+        else:
+            written = refresh(engine, name)
+        print(f"✅ Rollups de {name}: {written} filas escritas en {time.perf_counter() - start:.2f} s")
+
+    # La página de Tendencias solo lee los rollups: este proceso los mantiene
+    # al día escribiendo en la base principal
+    while args.every:
+        time.sleep(args.every)
+        for name in ([args.form] if args.form else ROLLUPS):
+            try:
+                refresh(engine, name)
+            except Exception:
+                logger.exception("No se pudieron actualizar los rollups de %s", name)
+
+if __name__ == "__main__":
+    main()
@@ -12,5 +12,11 @@ sleep 2
 # Iniciar la visualización de datos en el puerto 8502
 streamlit run view_data.py --server.port 8502 &
 
+# Iniciar la API de ingesta (equipos y laboratorio) en el puerto 8503
+python ingest_api.py --port 8503 &
+
+# Mantener al día los rollups de la página de Tendencias (cada minuto)
+python rollups.py --every 60 &
+
 # Mantener el script corriendo
 wait 
\ No newline at end of file
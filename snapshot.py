@@ -0,0 +1,130 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError
+
+from database import engine, read_engine, create_db_engine
+
+logger = logging.getLogger("hermes.snapshot")
+
+# Instantánea para análisis (solo SQLite): view_data.py y db_viewer.py leen
+# de una copia de la base que se renueva en segundo plano con la API de
+# respaldo en línea de SQLite. Las consultas largas y las exportaciones no
+# retienen el WAL de la base principal (que así puede hacer checkpoint) ni
+# compiten por sus páginas con los envíos de app.py.
+#   HERMES_SNAPSHOT_INTERVAL: segundos entre copias (0 = desactivado)
+#   HERMES_SNAPSHOT_MAX_AGE: antigüedad máxima; una copia más vieja se
+#     renueva antes de leer
+#   HERMES_SNAPSHOT_PATH: archivo de la copia (por defecto <base>.snapshot)
+SNAPSHOT_INTERVAL = int(os.environ.get("HERMES_SNAPSHOT_INTERVAL", "0"))
+SNAPSHOT_MAX_AGE = int(os.environ.get("HERMES_SNAPSHOT_MAX_AGE", str(max(3 * SNAPSHOT_INTERVAL, 60))))
+SNAPSHOT_PATH = os.environ.get("HERMES_SNAPSHOT_PATH")
+
+class Snapshot:
+    def __init__(self, source, path, interval=SNAPSHOT_INTERVAL, max_age=SNAPSHOT_MAX_AGE):
+        self.source = source
+        self.path = os.path.abspath(path)
+        self.interval = interval
+        self.max_age = max_age
+        self.engine = create_db_engine(f"sqlite:///file:{self.path}?mode=ro&uri=true", read_only=True)
+        # Una conexión abierta sigue leyendo la copia anterior: al sacarla
+        # del pool se descarta si el archivo cambió
+        event.listen(self.engine, "connect", self._remember_version)
+        event.listen(self.engine, "checkout", self._check_version)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _remember_version(self, dbapi_connection, connection_record):
+        connection_record.info["snapshot_version"] = self._version()
+
+    def _check_version(self, dbapi_connection, connection_record, connection_proxy):
+        if connection_record.info.get("snapshot_version") != self._version():
+            raise DisconnectionError("La instantánea cambió")
+
+    def as_of(self):
+        # Momento de la copia (se guarda como fecha de modificación del archivo)
+        try:
+            return os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        # Copia consistente en un solo paso: en modo WAL la lectura del
+        # respaldo no bloquea a los escritores. Se escribe a un archivo
+        # temporal y se reemplaza la copia anterior de forma atómica.
+        started = time.time()
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        source = self.source.raw_connection()
+        try:
+            target = sqlite3.connect(tmp)
+            try:
+                source.driver_connection.backup(target)
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+        finally:
+            source.close()
+        os.utime(tmp, (started, started))
+        os.replace(tmp, self.path)
+        logger.info("Instantánea renovada en %.2f s", time.time() - started)
+        return started
+
+    def _refresh_if_older(self, seconds):
+        with self._lock:
+            as_of = self.as_of()
+            if as_of is None or time.time() - as_of >= seconds:
+                as_of = self.refresh()
+            return as_of
+
+    def _run(self):
+        while True:
+            try:
+                # Otro proceso (view_data o db_viewer) pudo renovarla antes
+                as_of = self._refresh_if_older(self.interval)
+                wait = as_of + self.interval - time.time()
+            except Exception:
+                logger.exception("No se pudo renovar la instantánea")
+                wait = self.interval
+            time.sleep(max(wait, 1))
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="hermes-snapshot", daemon=True)
+                self._thread.start()
+
+    def ensure_fresh(self):
+        # Fecha de los datos que verán los dashboards; si la copia no existe o
+        # supera la antigüedad máxima se renueva antes de leer
+        self.start()
+        return datetime.fromtimestamp(self._refresh_if_older(self.max_age))
+
+def _default_path(url):
+    return f"{url.database}.snapshot"
+
+snapshot = None
+if SNAPSHOT_INTERVAL > 0:
+    if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+        snapshot = Snapshot(engine, SNAPSHOT_PATH or _default_path(engine.url))
+    else:
+        logger.warning("La instantánea para análisis solo está disponible con SQLite; se lee de la base")
+
+# Engine de los dashboards: la instantánea si está activa, si no la réplica
+# o la base principal (database.read_engine)
+analytics_engine = snapshot.engine if snapshot else read_engine
+
+def data_as_of():
+    # None cuando los dashboards leen directamente de la base
+    return snapshot.ensure_fresh() if snapshot else None
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, select, type_coerce
+
+from config import QUALITY_FIELDS
+from data_access import IncrementalDataset
+from models import QualityForm, ProductionForm, OrderSummary
+from rollups import numeric_fields
+
+# Control estadístico de procesos para los parámetros de calidad. Todo se
+# calcula con NumPy sobre arreglos completos (sin recorrer filas): cartas
+# I-MR y X̄-R, reglas de Western Electric y capacidad (Cp/Cpk, Pp/Ppk).
+# Los límites de especificación son los mismos de config.py que usa la UI.
+
+PARAMETERS = numeric_fields(QUALITY_FIELDS)
+SPEC_LIMITS = {
+    name: (QUALITY_FIELDS[name]["min_value"], QUALITY_FIELDS[name]["max_value"])
+    for name in PARAMETERS
+}
+
+# Constantes de cartas X̄-R por tamaño de subgrupo: (A2, D3, D4, d2)
+XBAR_R_CONSTANTS = {
+    2: (1.880, 0.0, 3.267, 1.128),
+    3: (1.023, 0.0, 2.574, 1.693),
+    4: (0.729, 0.0, 2.282, 2.059),
+    5: (0.577, 0.0, 2.114, 2.326),
+    6: (0.483, 0.0, 2.004, 2.534),
+    7: (0.419, 0.076, 1.924, 2.704),
+    8: (0.373, 0.136, 1.864, 2.847),
+    9: (0.337, 0.184, 1.816, 2.970),
+    10: (0.308, 0.223, 1.777, 3.078),
+}
+# Rangos móviles de dos puntos
+D2_MOVING_RANGE = 1.128
+D4_MOVING_RANGE = 3.267
+
+WESTERN_ELECTRIC_RULES = {
+    1: "1 punto fuera de 3σ",
+    2: "2 de 3 puntos más allá de 2σ (mismo lado)",
+    3: "4 de 5 puntos más allá de 1σ (mismo lado)",
+    4: "8 puntos seguidos del mismo lado de la línea central",
+}
+
+# Muestras de calidad como arreglos: se leen una vez y luego solo las
+# filas nuevas o modificadas (IncrementalDataset)
+SPC_COLUMNS = [
+    ('ID', QualityForm.id),
+    ('order_id', QualityForm.production_order_id),
+    ('created_at', type_coerce(QualityForm.created_at, String)),
+    *[(name, getattr(QualityForm, name)) for name in PARAMETERS],
+]
+
+def spc_dataset():
+    return IncrementalDataset(QualityForm, SPC_COLUMNS, date_columns=['created_at'])
+
+def dieta_by_order(conn):
+    # Dieta de cada orden según su último formulario de producción
+    # (categórica: agrupar por dieta usa los códigos y no compara textos)
+    result = conn.execute(
+        select(OrderSummary.production_order_id, ProductionForm.dieta)
+        .join(ProductionForm, ProductionForm.id == OrderSummary.production_latest_id)
+    )
+    frame = pd.DataFrame.from_records(result.fetchall(), columns=["order_id", "dieta"])
+    return frame.set_index("order_id")["dieta"].astype("category")
+
+def samples(frame, dietas=None, order_dieta=None):
+    # Muestras en orden cronológico, opcionalmente solo de las dietas dadas
+    if not frame['created_at'].is_monotonic_increasing:
+        frame = frame.sort_values(['created_at', 'ID'], kind='stable', ignore_index=True)
+    if order_dieta is not None:
+        frame = frame.assign(dieta=frame['order_id'].map(order_dieta))
+        if dietas:
+            frame = frame[frame['dieta'].isin(dietas)]
+    return frame
+
+def moving_ranges(x):
+    return np.abs(np.diff(x))
+
+def individuals_limits(x):
+    # Carta I-MR: sigma estimada con el rango móvil promedio (MR̄ / d2)
+    mr_bar = moving_ranges(x).mean() if len(x) > 1 else np.nan
+    center = x.mean()
+    sigma = mr_bar / D2_MOVING_RANGE
+    return {
+        "center": center, "ucl": center + 3 * sigma, "lcl": center - 3 * sigma,
+        "sigma": sigma, "mr_center": mr_bar, "mr_ucl": D4_MOVING_RANGE * mr_bar, "mr_lcl": 0.0,
+    }
+
+def subgroups(x, size):
+    # Subgrupos consecutivos de `size` muestras (el resto incompleto se descarta)
+    count = len(x) // size
+    return x[:count * size].reshape(count, size)
+
+def xbar_r(x, size=5):
+    # Carta X̄-R sobre subgrupos consecutivos
+    a2, d3, d4, d2 = XBAR_R_CONSTANTS[size]
+    groups = subgroups(x, size)
+    means = groups.mean(axis=1)
+    ranges = np.ptp(groups, axis=1)
+    x_bar, r_bar = means.mean(), ranges.mean()
+    limits = {
+        "center": x_bar, "ucl": x_bar + a2 * r_bar, "lcl": x_bar - a2 * r_bar,
+        "sigma": r_bar / d2 / np.sqrt(size),
+        "r_center": r_bar, "r_ucl": d4 * r_bar, "r_lcl": d3 * r_bar,
+    }
+    return means, ranges, limits
+
+def _window_count(flags, window):
+    # Puntos marcados en la ventana que termina en cada posición (suma de
+    # copias desplazadas; las ventanas son de a lo sumo 8 puntos)
+    flags = flags.view(np.uint8)
+    counts = flags.copy()
+    for lag in range(1, min(window, len(flags))):
+        counts[lag:] += flags[:-lag]
+    return counts
+
+def western_electric(x, center, sigma):
+    # Un arreglo booleano por regla; se marca el punto que completa el patrón
+    if not sigma > 0:
+        # Sin variación (o sin datos para estimarla) no hay zonas que evaluar
+        return {rule: np.zeros(len(x), dtype=bool) for rule in (1, 2, 3, 4)}
+    z = (x - center) / sigma
+    violations = {1: np.abs(z) > 3}
+    for rule, (limit, count, window) in {2: (2, 2, 3), 3: (1, 4, 5)}.items():
+        upper, lower = z > limit, z < -limit
+        violations[rule] = (
+            (upper & (_window_count(upper, window) >= count))
+            | (lower & (_window_count(lower, window) >= count))
+        )
+    above, below = z > 0, z < 0
+    violations[4] = (_window_count(above, 8) >= 8) | (_window_count(below, 8) >= 8)
+    return violations
+
+def capability(x, lsl, usl, sigma_within=None):
+    # Cp/Cpk con la sigma de corto plazo (rango móvil) y Pp/Ppk con la global
+    mean = x.mean()
+    if sigma_within is None:
+        sigma_within = individuals_limits(x)["sigma"]
+    sigma_overall = x.std(ddof=1) if len(x) > 1 else np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "n": len(x), "mean": mean, "sigma_within": sigma_within, "sigma_overall": sigma_overall,
+            "cp": (usl - lsl) / (6 * sigma_within),
+            "cpk": min(usl - mean, mean - lsl) / (3 * sigma_within),
+            "pp": (usl - lsl) / (6 * sigma_overall),
+            "ppk": min(usl - mean, mean - lsl) / (3 * sigma_overall),
+        }
+
+def group_segments(groups):
+    # Orden estable por grupo (se conserva el orden cronológico dentro de
+    # cada uno) e inicio de cada segmento, para reducir con reduceat. Se
+    # calcula una vez y sirve para todos los parámetros.
+    codes, names = pd.factorize(groups, sort=True)
+    codes = np.asarray(codes)
+    order = np.flatnonzero(codes >= 0)
+    order = order[np.argsort(codes[order], kind="stable")]
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+    return {
+        "order": order, "starts": starts, "names": names[codes[starts]],
+        "n": np.diff(np.r_[starts, len(codes)]), "boundaries": codes[1:] != codes[:-1],
+    }
+
+def grouped_capability(values, segments, lsl, usl):
+    # Capacidad por grupo (p. ej. dieta) en una pasada por segmentos
+    values = values[segments["order"]]
+    starts, n = segments["starts"], segments["n"]
+    if not len(starts):
+        return pd.DataFrame()
+    sums = np.add.reduceat(values, starts)
+    squares = np.add.reduceat(values * values, starts)
+    mean = sums / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma_overall = np.sqrt(np.clip((squares - sums * mean) / (n - 1), 0, None))
+        # Rangos móviles sin cruzar de un grupo al siguiente
+        ranges = np.abs(np.diff(values))
+        ranges[segments["boundaries"]] = 0
+        mr_sums = np.add.reduceat(np.r_[ranges, 0.0], starts)
+        sigma_within = mr_sums / (n - 1) / D2_MOVING_RANGE
+        to_spec = np.minimum(usl - mean, mean - lsl)
+        return pd.DataFrame({
+            "n": n, "mean": mean, "sigma_within": sigma_within, "sigma_overall": sigma_overall,
+            "cp": (usl - lsl) / (6 * sigma_within), "cpk": to_spec / (3 * sigma_within),
+            "pp": (usl - lsl) / (6 * sigma_overall), "ppk": to_spec / (3 * sigma_overall),
+        }, index=pd.Index(segments["names"], name="dieta"))
+
+def capability_table(frame, parameters=PARAMETERS):
+    # Capacidad por parámetro (todas las dietas y cada dieta por separado)
+    rows = []
+    segments = group_segments(frame["dieta"]) if "dieta" in frame.columns else None
+    for parameter in parameters:
+        lsl, usl = SPEC_LIMITS[parameter]
+        x = frame[parameter].to_numpy(dtype=float)
+        total = capability(x, lsl, usl)
+        total["violations"] = int(np.logical_or.reduce(list(
+            western_electric(x, x.mean(), total["sigma_within"]).values()
+        )).sum())
+        rows.append({"parameter": parameter, "dieta": "Todas", **total})
+        if segments is not None:
+            by_dieta = grouped_capability(x, segments, lsl, usl)
+            for dieta, values in by_dieta.iterrows():
+                rows.append({"parameter": parameter, "dieta": dieta, **values.to_dict()})
+    table = pd.DataFrame(rows)
+    table["n"] = table["n"].astype(int)
+    table["violations"] = table["violations"].astype("Int64")
+    return table
@@ -0,0 +1,346 @@
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+logger = logging.getLogger("hermes.sql")
+
+# Instrumentación de SQL (HERMES_SQL_TRACE=1): cada engine creado por
+# database.create_db_engine registra por sentencia el tiempo (ejecución más
+# lectura de las filas), las filas leídas o modificadas y el lugar del
+# código que la ejecutó. Las sentencias se agrupan por rerun de Streamlit
+# (begin_rerun/end_rerun); en cada rerun el mismo SQL repetido desde el
+# mismo lugar N_PLUS_ONE_THRESHOLD veces o más se marca como posible N+1.
+# Cada proceso escribe su resumen en HERMES_SQL_TRACE_DIR (JSON, un archivo
+# por proceso y arranque), de donde lo lee la vista "Diagnóstico SQL" de
+# db_viewer.py; los resúmenes de procesos terminados se descartan.
+# Desactivada no se registra ningún evento: el costo es cero.
+SQL_TRACE = os.environ.get("HERMES_SQL_TRACE") == "1"
+SQL_TRACE_DIR = os.environ.get("HERMES_SQL_TRACE_DIR", os.path.join(tempfile.gettempdir(), "hermes_sql_trace"))
+N_PLUS_ONE_THRESHOLD = 10
+# Reruns recientes y sentencias distintas que se guardan por proceso
+MAX_RERUNS = 200
+MAX_STATEMENTS = 500
+# Segundos mínimos entre escrituras del JSON de un proceso
+EXPORT_INTERVAL = 5
+# Horas sin escribir tras las que un resumen se descarta aunque su PID siga
+# en uso (en Windows, o un PID reutilizado por otro proceso)
+EXPORT_TTL = float(os.environ.get("HERMES_SQL_TRACE_TTL_HOURS", "24")) * 3600
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMETER_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_SPACES = re.compile(r"\s+")
+
+_local = threading.local()
+_lock = threading.Lock()
+_reruns = deque(maxlen=MAX_RERUNS)
+_statements = {}
+_background = []
+_last_export = 0.0
+_started = datetime.now()
+# SQLAlchemy reutiliza el texto compilado de cada sentencia: se normaliza una vez
+_normalized = {}
+_hermes_code = {}
+_sites = {}
+
+def normalize(statement):
+    # El mismo SQL con otros valores (o listas IN de otro largo) es la misma sentencia
+    normalized = _normalized.get(statement)
+    if normalized is None:
+        normalized = _LITERALS.sub("?", statement)
+        normalized = _PARAMETER_LISTS.sub("(?…)", normalized)
+        normalized = _SPACES.sub(" ", normalized).strip()
+        if len(_normalized) >= MAX_STATEMENTS * 4:
+            _normalized.clear()
+        _normalized[statement] = normalized
+    return normalized
+
+def _is_hermes(code):
+    filename = code.co_filename
+    return (filename.startswith(_ROOT) and "site-packages" not in filename
+            and not filename.endswith("sql_trace.py"))
+
+def call_site():
+    # Primer marco del código de Hermes (fuera de esta instrumentación); la
+    # decisión por función y el texto por línea se guardan
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        hermes = _hermes_code.get(code)
+        if hermes is None:
+            hermes = _hermes_code[code] = _is_hermes(code)
+        if hermes:
+            key = (code, frame.f_lineno)
+            site = _sites.get(key)
+            if site is None:
+                site = _sites[key] = f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+            return site
+        frame = frame.f_back
+    return None
+
+class _TracedCursor:
+    # Cursor DBAPI que suma a la sentencia las filas leídas y el tiempo de
+    # cada fetch (en SQLite la consulta sigue ejecutándose al leer)
+    def __init__(self, cursor, record):
+        self._cursor = cursor
+        self._record = record
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._record["seconds"] += time.perf_counter() - start
+
+    def fetchone(self):
+        row = self._fetch(self._cursor.fetchone)
+        if row is not None:
+            self._record["rows"] += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._fetch(self._cursor.fetchmany, *args)
+        self._record["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cursor.fetchall)
+        self._record["rows"] += len(rows)
+        return rows
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._sql_trace_start = (time.perf_counter(), time.thread_time())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start, cpu_start = context._sql_trace_start
+    elapsed = time.perf_counter() - start
+    record = {
+        "sql": normalize(statement),
+        "site": call_site(),
+        "seconds": elapsed,
+        "rows": 0 if cursor.description is not None else max(cursor.rowcount, 0),
+        # SQLite corre en este hilo: el tiempo sin CPU es espera por
+        # bloqueos (busy_timeout) o por disco
+        "wait": max(elapsed - (time.thread_time() - cpu_start), 0.0) if conn.dialect.name == "sqlite" else None,
+    }
+    context._sql_trace_record = record
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun["statements"].append(record)
+    else:
+        with _lock:
+            _background.append(record)
+            if len(_background) > 10_000:
+                _fold(_background)
+                _background.clear()
+
+def _after_execute(conn, clauseelement, multiparams, params, execution_options, result):
+    record = getattr(result.context, "_sql_trace_record", None)
+    if record is not None and result.returns_rows and result.cursor is not None:
+        result.cursor = _TracedCursor(result.cursor, record)
+
+def install(engine):
+    # Llamado por database.create_db_engine para cada engine
+    if not SQL_TRACE or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "after_execute", _after_execute)
+
+def _fold(records):
+    # Suma las sentencias al resumen del proceso (llamar con _lock)
+    for record in records:
+        stats = _statements.get(record["sql"])
+        if stats is None:
+            if len(_statements) >= MAX_STATEMENTS:
+                continue
+            stats = _statements[record["sql"]] = {
+                "sql": record["sql"], "count": 0, "seconds": 0.0, "max_seconds": 0.0,
+                "rows": 0, "wait_seconds": None, "sites": {},
+            }
+        stats["count"] += 1
+        stats["seconds"] += record["seconds"]
+        stats["max_seconds"] = max(stats["max_seconds"], record["seconds"])
+        stats["rows"] += record["rows"]
+        if record["wait"] is not None:
+            stats["wait_seconds"] = (stats["wait_seconds"] or 0.0) + record["wait"]
+        if record["site"]:
+            stats["sites"][record["site"]] = stats["sites"].get(record["site"], 0) + 1
+
+def n_plus_one(records, threshold=N_PLUS_ONE_THRESHOLD):
+    counts = defaultdict(int)
+    for record in records:
+        counts[(record["sql"], record["site"])] += 1
+    return [
+        {"sql": sql, "site": site, "count": count}
+        for (sql, site), count in sorted(counts.items(), key=lambda item: -item[1])
+        if count >= threshold
+    ]
+
+def begin_rerun(script):
+    if not SQL_TRACE:
+        return
+    _local.rerun = {"script": script, "started": datetime.now(), "start": time.perf_counter(), "statements": []}
+
+def end_rerun():
+    if not SQL_TRACE:
+        return None
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return None
+    _local.rerun = None
+    records = rerun["statements"]
+    waits = [record["wait"] for record in records if record["wait"] is not None]
+    summary = {
+        "script": rerun["script"],
+        "started": rerun["started"].isoformat(timespec="seconds"),
+        "seconds": time.perf_counter() - rerun["start"],
+        "queries": len(records),
+        "db_seconds": sum(record["seconds"] for record in records),
+        "wait_seconds": sum(waits) if waits else None,
+        "rows": sum(record["rows"] for record in records),
+        "n_plus_one": n_plus_one(records),
+    }
+    for suspect in summary["n_plus_one"]:
+        logger.warning("Posible N+1 en %s (%s): %d consultas iguales en un rerun: %s",
+                       rerun["script"], suspect["site"], suspect["count"], suspect["sql"][:200])
+    with _lock:
+        _fold(records)
+        _fold(_background)
+        _background.clear()
+        _reruns.append(summary)
+    export_json(rerun["script"])
+    return summary
+
+@contextmanager
+def traced_rerun(script):
+    begin_rerun(script)
+    try:
+        yield
+    finally:
+        end_rerun()
+
+def snapshot(script=None):
+    with _lock:
+        _fold(_background)
+        _background.clear()
+        return {
+            "script": script,
+            "pid": os.getpid(),
+            "started": _started.isoformat(timespec="seconds"),
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+            "reruns": list(_reruns),
+            "statements": [dict(stats, sites=dict(stats["sites"])) for stats in _statements.values()],
+        }
+
+def _export_path(script, pid):
+    name = os.path.splitext(os.path.basename(script or "proceso"))[0]
+    return os.path.join(SQL_TRACE_DIR, f"{name}-{pid}-{_started:%Y%m%d%H%M%S}.json")
+
+def export_json(script, force=False):
+    # Resumen del proceso en disco, a lo sumo cada EXPORT_INTERVAL segundos
+    global _last_export
+    now = time.time()
+    if not force and now - _last_export < EXPORT_INTERVAL:
+        return None
+    _last_export = now
+    data = snapshot(script)
+    path = _export_path(script, data["pid"])
+    try:
+        os.makedirs(SQL_TRACE_DIR, exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError:
+        logger.exception("No se pudo escribir %s", path)
+        return None
+    return path
+
+def _alive(pid):
+    # En Windows os.kill(pid, 0) termina el proceso: allí solo cuenta EXPORT_TTL
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def load_exports(directory=None, now=None):
+    # Resúmenes de los procesos en curso (app.py, view_data.py, db_viewer.py...);
+    # los de procesos terminados o sin escribir en EXPORT_TTL se borran
+    directory = directory or SQL_TRACE_DIR
+    if not os.path.isdir(directory):
+        return []
+    now = time.time() if now is None else now
+    exports = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) <= EXPORT_TTL:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if _alive(data["pid"]):
+                    exports.append(data)
+                    continue
+            os.remove(path)
+        except (OSError, ValueError, KeyError):
+            pass
+    return exports
+
+def merge(exports):
+    # Un solo resumen: los reruns de todos los procesos y las sentencias sumadas
+    reruns, statements = [], {}
+    for data in exports:
+        reruns += data["reruns"]
+        for stats in data["statements"]:
+            merged = statements.get(stats["sql"])
+            if merged is None:
+                statements[stats["sql"]] = dict(stats, sites=dict(stats["sites"]))
+                continue
+            merged["count"] += stats["count"]
+            merged["seconds"] += stats["seconds"]
+            merged["max_seconds"] = max(merged["max_seconds"], stats["max_seconds"])
+            merged["rows"] += stats["rows"]
+            if stats["wait_seconds"] is not None:
+                merged["wait_seconds"] = (merged["wait_seconds"] or 0.0) + stats["wait_seconds"]
+            for site, count in stats["sites"].items():
+                merged["sites"][site] = merged["sites"].get(site, 0) + count
+    reruns.sort(key=lambda rerun: rerun["started"])
+    return {
+        "exported_at": datetime.now().isoformat(timespec="seconds"),
+        "reruns": reruns,
+        "statements": sorted(statements.values(), key=lambda stats: -stats["seconds"]),
+    }
+
+def clear(directory=None):
+    with _lock:
+        _reruns.clear()
+        _statements.clear()
+        _background.clear()
+    directory = directory or SQL_TRACE_DIR
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Los módulos leen la configuración al importarse: database.py crea su
+# engine con DATABASE_URL y auth.py guarda un secreto junto al código si
+# HERMES_SESSION_SECRET no está definido. Las pruebas nunca tocan hermes.db.
+_TMP = tempfile.mkdtemp(prefix="hermes_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'default.db')}"
+os.environ["HERMES_SESSION_SECRET"] = "pruebas"
+os.environ["HERMES_SQL_TRACE"] = "0"
+os.environ["HERMES_EXPORT_DIR"] = os.path.join(_TMP, "exports")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+
+from database import create_db_engine  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import Base, User  # noqa: E402
+
+QUALITY_VALUES = {
+    "apariencia": "A - Excelente", "color": "B - Bueno", "olor": "A - Excelente",
+    "humedad": 12.0, "proteina": 20.0, "grasa": 3.0, "fibra": 4.0, "cenizas": 6.0,
+}
+PRODUCTION_VALUES = {
+    "dieta": "Dieta 1", "molienda": 2.5, "durabilidad": 95.0, "dureza": 10,
+    "temperatura": 80, "peletizadora": "Peletizadora 1",
+}
+
+@pytest.fixture
+def engine(tmp_path):
+    # Base SQLite en disco (WAL y busy_timeout como en producción)
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'hermes.db'}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine, Base.metadata)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def user_id(engine):
+    with engine.begin() as conn:
+        return conn.execute(
+            insert(User).values(username="operador", password_hash="x", role="OPERATOR").returning(User.id)
+        ).scalar_one()
@@ -0,0 +1,94 @@
+import asyncio
+import base64
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from jose import jwt
+from sqlalchemy.orm import Session
+
+import auth
+import ingest_api
+from models import User
+
+@pytest.fixture
+def db(engine, user_id):
+    with Session(engine) as db:
+        yield db
+
+def test_session_token_resumes_until_logout(db, user_id):
+    user = db.get(User, user_id)
+    token = auth.create_session_token(user.id, user.session_version)
+    assert auth.session_user(db, token) is user
+
+    auth.revoke_sessions(db, user)
+    db.expire_all()
+    assert auth.session_user(db, token) is None
+    # El token nuevo sí vale
+    user = db.get(User, user_id)
+    assert auth.session_user(db, auth.create_session_token(user.id, user.session_version)) is user
+
+def test_session_and_api_tokens_are_not_interchangeable(db, user_id):
+    session_token = auth.create_session_token(user_id)
+    api_token = auth.create_api_token(user_id)
+    assert auth.api_token_claims(api_token) == (user_id, 0)
+    assert auth.api_token_claims(session_token) is None
+    assert auth.session_user(db, api_token) is None
+
+def test_logout_revokes_api_tokens(engine, db, user_id):
+    user = db.get(User, user_id)
+    claims = auth.api_token_claims(auth.create_api_token(user.id, user.session_version))
+
+    async def valid():
+        return await users.valid(*claims)
+
+    with ThreadPoolExecutor(1) as executor:
+        users = ingest_api.UserCache(engine, executor)
+        assert asyncio.run(valid())
+        auth.revoke_sessions(db, user)
+        # La caché lo acepta hasta su próxima recarga
+        users.loaded_at -= ingest_api.USER_CACHE_SECONDS
+        assert not asyncio.run(valid())
+
+@pytest.mark.parametrize("claims", [
+    {"sub": "1", "ver": 0},                              # sin destino
+    {"sub": "1", "ver": 0, "aud": "otro"},
+    {"sub": "1", "aud": auth.SESSION_AUDIENCE},          # sin versión
+    {"sub": "uno", "ver": 0, "aud": auth.SESSION_AUDIENCE},
+])
+def test_malformed_claims_are_rejected(claims):
+    token = jwt.encode(claims, auth.SESSION_SECRET, algorithm=auth.SESSION_ALGORITHM)
+    assert auth.session_claims(token) is None
+
+def test_expired_tokens_are_rejected(user_id):
+    issued = datetime.now(timezone.utc) - auth.SESSION_TTL - timedelta(minutes=1)
+    assert auth.session_claims(auth.create_session_token(user_id, now=issued)) is None
+    issued = datetime.now(timezone.utc) - auth.API_TOKEN_TTL - timedelta(minutes=1)
+    assert auth.api_token_claims(auth.create_api_token(user_id, now=issued)) is None
+
+def test_forged_tokens_are_rejected(user_id):
+    claims = {"sub": str(user_id), "ver": 0, "aud": auth.SESSION_AUDIENCE}
+    assert auth.session_claims(jwt.encode(claims, "otro secreto", algorithm=auth.SESSION_ALGORITHM)) is None
+    token = auth.create_session_token(user_id)
+    header, payload, signature = token.split(".")
+    assert auth.session_claims(f"{header}.{payload}.{signature[::-1]}") is None
+    unsigned = ".".join(
+        base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+        for part in ({"alg": "none", "typ": "JWT"}, claims)
+    )
+    assert auth.session_claims(f"{unsigned}.") is None
+    assert auth.session_user(None, "no es un token") is None
+
+def test_stored_secret_is_created_once(tmp_path):
+    path = tmp_path / "secreto"
+    secret = auth.stored_secret(str(path))
+    assert auth.stored_secret(str(path)) == secret
+    assert path.stat().st_mode & 0o077 == 0
+
+def test_url_token_is_renewed_after_half_its_life(user_id):
+    now = datetime.now(timezone.utc)
+    assert not auth.session_needs_renewal(auth.create_session_token(user_id, now=now))
+    issued = now - auth.SESSION_TTL * 0.6
+    assert auth.session_needs_renewal(auth.create_session_token(user_id, now=issued))
+    assert auth.session_needs_renewal("no es un token")
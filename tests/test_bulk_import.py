@@ -0,0 +1,52 @@
+import pandas as pd
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+import bulk_import
+import order_summary
+from conftest import QUALITY_VALUES
+from form_service import APPEND, submit_form
+from models import ProductionOrder, QualityForm
+
+def orders(engine):
+    with engine.connect() as conn:
+        return {row.order_number: row for row in conn.execute(select(ProductionOrder))}
+
+def test_ensure_orders_tolerates_orders_created_meanwhile(engine, monkeypatch):
+    # Otro escritor crea OP-1 entre la búsqueda y el INSERT: el bloque no
+    # falla, usa la orden existente y solo cuenta la que sí creó
+    with engine.begin() as conn:
+        existing = conn.execute(
+            insert(ProductionOrder).values(order_number="OP-1").returning(ProductionOrder.id)
+        ).scalar_one()
+    lookup = bulk_import._order_ids
+    calls = []
+    def stale_lookup(conn, order_numbers):
+        calls.append(list(order_numbers))
+        return {} if len(calls) == 1 else lookup(conn, order_numbers)
+    monkeypatch.setattr(bulk_import, "_order_ids", stale_lookup)
+
+    with engine.begin() as conn:
+        ids, created = bulk_import.ensure_orders(conn, ["OP-1", "OP-2"], "in_quality")
+    assert created == 1
+    assert ids["OP-1"] == existing
+    stored = orders(engine)
+    assert set(stored) == {"OP-1", "OP-2"}
+    assert stored["OP-1"].in_quality and stored["OP-2"].in_quality
+
+def test_import_counts_and_summary(engine, user_id, tmp_path):
+    # Parte de las órdenes ya tiene formularios de la aplicación
+    with Session(engine) as db:
+        submit_form(db, "quality", "OP-1", user_id, QUALITY_VALUES, APPEND)
+    path = tmp_path / "calidad.csv"
+    pd.DataFrame([
+        dict(QUALITY_VALUES, order_number=f"OP-{i % 4}", username="operador") for i in range(10)
+    ] + [dict(QUALITY_VALUES, order_number="OP-9", username="operador", humedad=99.0)]).to_csv(path, index=False)
+
+    report = bulk_import.import_forms(engine, str(path), "calidad", chunk_rows=3)
+    assert (report["leidas"], report["insertadas"], report["rechazadas"]) == (11, 10, 1)
+    assert report["ordenes_creadas"] == 3
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(QualityForm)).scalar() == 11
+        assert order_summary.check(conn) == []
+    assert set(orders(engine)) == {"OP-0", "OP-1", "OP-2", "OP-3"}
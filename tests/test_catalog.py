@@ -0,0 +1,37 @@
+from sqlalchemy import delete, insert
+
+import catalog
+from models import ProductionOrder
+
+TABLE = ProductionOrder.__table__
+
+def fill(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(insert(ProductionOrder), [{"order_number": f"OP-{i}"} for i in range(rows)])
+
+def sample_ids(engine, seed, size=catalog.SAMPLE_ROWS):
+    with engine.connect() as conn:
+        return [row.id for row in conn.execute(catalog.sample_select(conn, TABLE, size, seed))]
+
+def test_sample_spans_the_key_range(engine):
+    fill(engine, 5000)
+    for seed in range(5):
+        ids = sample_ids(engine, seed)
+        assert len(ids) == len(set(ids)) == catalog.SAMPLE_ROWS
+        # Muestra uniforme: filas de cada cuarto de la tabla, también el último
+        quarters = {(i - 1) * 4 // 5000 for i in ids}
+        assert quarters == {0, 1, 2, 3}
+    assert sample_ids(engine, 1) != sample_ids(engine, 2)
+
+def test_sample_skips_missing_keys(engine):
+    fill(engine, 5000)
+    with engine.begin() as conn:
+        conn.execute(delete(ProductionOrder).where(ProductionOrder.id % 2 == 0))
+    ids = sample_ids(engine, 0)
+    assert len(ids) == catalog.SAMPLE_ROWS
+    assert all(i % 2 for i in ids)
+
+def test_sample_of_small_and_empty_tables(engine):
+    assert sample_ids(engine, 0) == []
+    fill(engine, 30)
+    assert sorted(sample_ids(engine, 0)) == list(range(1, 31))
@@ -0,0 +1,51 @@
+import shutil
+
+import pytest
+from sqlalchemy import insert
+
+import columnar
+from conftest import QUALITY_VALUES
+from database import create_db_engine
+from data_access import QUALITY_COLUMNS
+from models import ProductionOrder, QualityForm
+
+def add_forms(engine, user_id, count):
+    with engine.begin() as conn:
+        order_id = conn.execute(
+            insert(ProductionOrder).values(order_number=f"OP-{count}").returning(ProductionOrder.id)
+        ).scalar_one()
+        conn.execute(insert(QualityForm), [
+            dict(QUALITY_VALUES, production_order_id=order_id, user_id=user_id) for _ in range(count)
+        ])
+
+@pytest.fixture
+def lagging(engine, user_id, tmp_path):
+    # Copia de la base que no ve los últimos formularios (réplica atrasada)
+    add_forms(engine, user_id, 10)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    shutil.copy(tmp_path / "hermes.db", tmp_path / "replica.db")
+    replica = create_db_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    add_forms(engine, user_id, 5)
+    yield replica
+    replica.dispose()
+
+def dataset(directory):
+    return columnar.ColumnarDataset("quality", QualityForm, QUALITY_COLUMNS, directory=str(directory))
+
+def test_lagging_source_reads_the_cache_as_is(engine, user_id, lagging, tmp_path):
+    directory = tmp_path / "columnar"
+    with engine.connect() as conn:
+        assert len(dataset(directory).refresh(conn)) == 15
+    manifest = dataset(directory).read_manifest()
+
+    with lagging.connect() as conn:
+        frame = dataset(directory).refresh(conn)
+    # Ni se reconstruye ni retrocede la marca de agua
+    assert len(frame) == 15
+    assert dataset(directory).read_manifest() == manifest
+
+    add_forms(engine, user_id, 2)
+    with engine.connect() as conn:
+        assert len(dataset(directory).refresh(conn)) == 17
+    assert dataset(directory).read_manifest()["segments"][:len(manifest["segments"])] == manifest["segments"]
@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, insert, select, text
+
+import database
+from models import ProductionOrder
+
+def orders(conn):
+    return conn.execute(select(func.count()).select_from(ProductionOrder)).scalar()
+
+def test_connections_use_wal_and_busy_timeout(engine):
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+
+def test_readers_do_not_wait_for_an_open_write(engine):
+    # Con WAL un lector ve la última versión confirmada mientras otra
+    # conexión tiene una escritura sin confirmar
+    with engine.connect() as writer:
+        writer.execute(insert(ProductionOrder).values(order_number="OP-1"))
+        start = time.perf_counter()
+        with engine.connect() as reader:
+            assert orders(reader) == 0
+        assert time.perf_counter() - start < 1
+        writer.commit()
+    with engine.connect() as reader:
+        assert orders(reader) == 1
+
+def test_second_writer_waits_instead_of_failing(engine):
+    # busy_timeout: el segundo escritor espera a que el primero confirme en
+    # lugar de fallar con "database is locked"
+    locked, release = threading.Event(), threading.Event()
+
+    def slow_writer():
+        with engine.begin() as conn:
+            conn.execute(insert(ProductionOrder).values(order_number="OP-lento"))
+            locked.set()
+            release.wait(5)
+
+    with ThreadPoolExecutor(1) as pool:
+        slow = pool.submit(slow_writer)
+        assert locked.wait(5)
+        threading.Timer(0.3, release.set).start()
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(insert(ProductionOrder).values(order_number="OP-rápido"))
+        assert time.perf_counter() - start >= 0.2
+        slow.result()
+    with engine.connect() as conn:
+        assert orders(conn) == 2
+
+def test_concurrent_writers_and_readers(engine):
+    writers, per_writer = 6, 50
+    errors, done = [], threading.Event()
+
+    def write(worker):
+        try:
+            for i in range(per_writer):
+                with engine.begin() as conn:
+                    conn.execute(insert(ProductionOrder).values(order_number=f"OP-{worker}-{i}"))
+        except Exception as exc:
+            errors.append(exc)
+
+    def read():
+        seen = 0
+        try:
+            while seen < writers * per_writer and not done.is_set():
+                with engine.connect() as conn:
+                    count = orders(conn)
+                # Cada lectura ve un estado confirmado, nunca uno anterior al ya visto
+                assert count >= seen
+                seen = count
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    threads += [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads[:writers]:
+        thread.join(60)
+    done.set()
+    for thread in threads[writers:]:
+        thread.join(60)
+    assert errors == []
+    with engine.connect() as conn:
+        assert orders(conn) == writers * per_writer
+
+def test_session_scope_returns_the_connection(engine):
+    # Una sesión por rerun: al salir del bloque la conexión vuelve al pool
+    database.Base.metadata.create_all(bind=database.engine)
+    with database.session_scope() as db:
+        db.execute(text("SELECT 1"))
+        assert database.engine.pool.checkedout() == 1
+    assert database.engine.pool.checkedout() == 0
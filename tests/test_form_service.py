@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import order_summary
+from conftest import PRODUCTION_VALUES, QUALITY_VALUES
+from form_service import APPEND, CREATED, EXISTS, NEW, UPDATE, UPDATED, submit_form
+from models import OrderSummary, ProductionOrder, QualityForm
+
+def count(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model)).scalar()
+
+def test_concurrent_submits_share_each_order(engine, user_id):
+    # Varios escritores envían a la vez a las mismas órdenes nuevas: cada
+    # orden se crea una sola vez y su resumen cuenta todos los formularios
+    orders, per_worker, workers = [f"OP-{i}" for i in range(5)], 20, 8
+
+    def worker(seed):
+        with Session(engine) as db:
+            for i in range(per_worker):
+                result, _ = submit_form(db, "quality", orders[(seed + i) % len(orders)],
+                                        user_id, QUALITY_VALUES, APPEND)
+                assert result == CREATED
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(worker, range(workers)))
+
+    assert count(engine, ProductionOrder) == len(orders)
+    assert count(engine, QualityForm) == workers * per_worker
+    with engine.connect() as conn:
+        assert order_summary.check(conn) == []
+        assert conn.execute(select(func.sum(OrderSummary.quality_count))).scalar() == workers * per_worker
+
+def test_new_mode_keeps_the_first_form(engine, user_id):
+    with Session(engine) as db:
+        result, form_id = submit_form(db, "quality", "OP-1", user_id, QUALITY_VALUES, NEW)
+        assert result == CREATED
+        assert submit_form(db, "quality", "OP-1", user_id, QUALITY_VALUES, NEW) == (EXISTS, form_id)
+        # El otro tipo de formulario de la misma orden sí se guarda
+        assert submit_form(db, "production", "OP-1", user_id, PRODUCTION_VALUES, NEW)[0] == CREATED
+    assert count(engine, ProductionOrder) == 1
+    assert count(engine, QualityForm) == 1
+    with engine.connect() as conn:
+        order = conn.execute(select(ProductionOrder)).one()
+        assert order.in_quality and order.in_production
+        assert order_summary.check(conn) == []
+
+def test_update_keeps_the_summary_consistent(engine, user_id):
+    with Session(engine) as db:
+        _, form_id = submit_form(db, "quality", "OP-1", user_id, QUALITY_VALUES, NEW)
+        created = db.execute(select(OrderSummary.updated_at)).scalar()
+        values = dict(QUALITY_VALUES, humedad=13.5)
+        assert submit_form(db, "quality", "OP-1", user_id, values, UPDATE, form_id) == (UPDATED, form_id)
+    with engine.connect() as conn:
+        assert conn.execute(select(QualityForm.humedad)).scalar() == 13.5
+        assert order_summary.check(conn) == []
+        # Las lecturas incrementales del resumen ven el cambio
+        assert conn.execute(select(OrderSummary.updated_at)).scalar() > created
+
+def test_invalid_form_leaves_no_order(engine, user_id):
+    with Session(engine) as db:
+        with pytest.raises(ValidationError):
+            submit_form(db, "quality", "OP-1", user_id, dict(QUALITY_VALUES, humedad="mucha"), APPEND)
+    assert count(engine, ProductionOrder) == 0
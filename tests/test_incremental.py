@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import insert, select, update
+
+import bulk_import
+import columnar
+import data_access
+from conftest import QUALITY_VALUES
+from data_access import QUALITY_COLUMNS
+from models import ProductionOrder, QualityForm
+
+@pytest.fixture
+def order_id(engine):
+    with engine.begin() as conn:
+        return conn.execute(
+            insert(ProductionOrder).values(order_number="OP-1").returning(ProductionOrder.id)
+        ).scalar_one()
+
+def add_form(engine, order_id, user_id, updated_at, humedad=12.0):
+    with engine.begin() as conn:
+        conn.execute(insert(QualityForm).values(
+            dict(QUALITY_VALUES, humedad=humedad, production_order_id=order_id, user_id=user_id,
+                 created_at=updated_at, updated_at=updated_at)
+        ))
+
+def late_update(engine, form_id, updated_at, humedad):
+    # Una transacción que fijó updated_at antes que otra pero confirmó después
+    with engine.begin() as conn:
+        conn.execute(update(QualityForm).where(QualityForm.id == form_id).values(humedad=humedad, updated_at=updated_at))
+
+def humedad(dataset, engine):
+    with engine.connect() as conn:
+        frame = dataset.refresh(conn)
+    return dict(zip(frame["ID"], frame["Humedad (%)"].astype(float)))
+
+@pytest.fixture(params=["memoria", "columnar"])
+def dataset(request, tmp_path):
+    if request.param == "memoria":
+        return lambda: data_access.IncrementalDataset(QualityForm, QUALITY_COLUMNS)
+    directory = str(tmp_path / "columnar")
+    return lambda: columnar.ColumnarDataset("quality", QualityForm, QUALITY_COLUMNS, directory=directory)
+
+def test_late_commits_behind_the_watermark_are_read(engine, user_id, order_id, dataset):
+    now = datetime.utcnow()
+    add_form(engine, order_id, user_id, now - timedelta(seconds=10))
+    forms = dataset()
+    assert humedad(forms, engine) == {1: 12.0}
+
+    add_form(engine, order_id, user_id, now)
+    assert humedad(forms, engine) == {1: 12.0, 2: 12.0}
+    # Confirma después de la lectura con un updated_at anterior a la marca
+    # (que no cambia): se relee dentro de la ventana
+    late_update(engine, 1, now - timedelta(seconds=1), 13.0)
+    assert humedad(forms, engine) == {1: 13.0, 2: 12.0}
+    # También en un proceso nuevo que parte de la caché en disco
+    assert humedad(dataset(), engine) == {1: 13.0, 2: 12.0}
+
+def test_rereads_in_the_window_skip_rows_already_read(engine, user_id, order_id):
+    now = datetime.utcnow()
+    add_form(engine, order_id, user_id, now - timedelta(seconds=5))
+    add_form(engine, order_id, user_id, now)
+    forms = data_access.IncrementalDataset(QualityForm, QUALITY_COLUMNS)
+    humedad(forms, engine)
+    assert sorted(forms.recent) == [1, 2]
+    with engine.connect() as conn:
+        changed, recent = forms.read_changed(conn, forms.max_id, forms.max_updated_at, forms.recent, forms.max_updated_at)
+    assert changed.empty
+    assert recent == forms.recent
+
+def test_settled_watermark_is_not_reread(engine, user_id, order_id, monkeypatch):
+    old = datetime.utcnow() - data_access.WATERMARK_OVERLAP * 2
+    add_form(engine, order_id, user_id, old)
+    forms = data_access.IncrementalDataset(QualityForm, QUALITY_COLUMNS)
+    humedad(forms, engine)
+    assert forms.recent == {1: old}
+
+    def read_changed(*args):
+        raise AssertionError("la marca no cambió y su ventana ya pasó")
+
+    monkeypatch.setattr(forms, "read_changed", read_changed)
+    assert humedad(forms, engine) == {1: 12.0}
+
+def test_imported_forms_carry_the_write_time(engine, user_id, tmp_path):
+    # Un formulario histórico importado entra en la ventana por su updated_at
+    path = tmp_path / "calidad.csv"
+    pd.DataFrame([dict(QUALITY_VALUES, order_number="OP-1", username="operador",
+                       created_at="2020-01-01 08:00")]).to_csv(path, index=False)
+    before = datetime.utcnow()
+    bulk_import.import_forms(engine, str(path), "calidad")
+    with engine.connect() as conn:
+        created_at, updated_at = conn.execute(select(QualityForm.created_at, QualityForm.updated_at)).one()
+    assert created_at == datetime(2020, 1, 1, 8)
+    assert updated_at >= before
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from data_access import quality_select, read_frame
+from models import ProductionOrder, QualityForm
+from conftest import QUALITY_VALUES
+from pagination import count_rows, frame_keyset_page, keyset_page
+
+KEYS = ["Fecha de Creación", "ID"]
+
+@pytest.fixture
+def forms(engine, user_id):
+    # 23 formularios con fechas repetidas: el ID desempata
+    start = datetime(2025, 1, 1, 6)
+    with engine.begin() as conn:
+        order_id = conn.execute(
+            insert(ProductionOrder).values(order_number="OP-1").returning(ProductionOrder.id)
+        ).scalar_one()
+        conn.execute(insert(QualityForm), [
+            dict(QUALITY_VALUES, production_order_id=order_id, user_id=user_id,
+                 created_at=start + timedelta(minutes=i // 3), updated_at=start)
+            for i in range(23)
+        ])
+    with engine.connect() as conn:
+        return read_frame(conn, quality_select())
+
+def pages(fetch):
+    ids, after = [], None
+    while True:
+        page, after = fetch(after)
+        assert len(page) <= 5
+        ids += page["ID"].tolist()
+        if after is None:
+            return ids
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_pages_cover_every_row_once(engine, forms, descending):
+    expected = forms.sort_values(KEYS, ascending=not descending)["ID"].tolist()
+    with engine.connect() as conn:
+        assert count_rows(conn, quality_select()) == 23
+        ids = pages(lambda after: keyset_page(conn, quality_select(), KEYS, after, 5, descending, ()))
+    assert ids == expected
+    assert pages(lambda after: frame_keyset_page(forms, KEYS, after, 5, descending)) == expected
+
+def test_keyset_page_skips_rows_inserted_before_the_cursor(engine, forms, user_id):
+    # Una fila nueva que ordena antes del cursor no repite filas en la página siguiente
+    with engine.connect() as conn:
+        first, after = keyset_page(conn, quality_select(), KEYS, None, 5, True, ())
+    with engine.begin() as conn:
+        conn.execute(insert(QualityForm).values(
+            dict(QUALITY_VALUES, production_order_id=1, user_id=user_id,
+                 created_at=datetime(2030, 1, 1), updated_at=datetime(2030, 1, 1))
+        ))
+    with engine.connect() as conn:
+        second, _ = keyset_page(conn, quality_select(), KEYS, after, 5, True, ())
+    assert not set(first["ID"]) & set(second["ID"])
+    assert tuple(second.iloc[0][KEYS]) < after
@@ -0,0 +1,45 @@
+from datetime import date, datetime
+
+from sqlalchemy import delete, insert
+
+import plan_actual
+from models import ProductionOrder
+
+def orders_on(engine, *moments):
+    with engine.begin() as conn:
+        conn.execute(insert(ProductionOrder), [
+            {"order_number": f"OP-{moment:%Y%m%d%H}-{i}", "created_at": moment} for i, moment in enumerate(moments)
+        ])
+
+def test_first_complete_day():
+    # El día de producción del 1 de febrero empieza a las 06:00 en Bogotá
+    # (11:00 UTC): es el primero que cae entero en el mes adjunto
+    assert plan_actual.first_complete_day(datetime(2025, 2, 1)) == date(2025, 2, 1)
+    assert plan_actual.first_complete_day(datetime(2025, 2, 1, 12)) == date(2025, 2, 2)
+
+def test_days_before_complete_from_are_not_cached(engine):
+    orders_on(engine, datetime(2025, 1, 1, 12), datetime(2025, 1, 5, 12))
+    cache, today = plan_actual.ActualsCache(), date(2025, 1, 10)
+    with engine.connect() as conn:
+        partial = cache.actuals(conn, date(2025, 1, 1), date(2025, 1, 6), today, complete_from=date(2025, 1, 3))
+    assert partial["ordenes_creadas"].tolist() == [1, 0, 0, 0, 1, 0]
+    assert cache.closed.index.min() == date(2025, 1, 3)
+
+    # Una consulta que sí ve esos días completos los cuenta y los guarda
+    with engine.connect() as conn:
+        full = cache.actuals(conn, date(2025, 1, 1), date(2025, 1, 6), today)
+    assert full["ordenes_creadas"].tolist() == [1, 0, 0, 0, 1, 0]
+    assert cache.closed.index.min() == date(2025, 1, 1)
+
+def test_cached_days_are_served_even_outside_the_window(engine):
+    orders_on(engine, datetime(2025, 1, 1, 12))
+    cache, today = plan_actual.ActualsCache(), date(2025, 1, 10)
+    with engine.connect() as conn:
+        cache.actuals(conn, date(2025, 1, 1), date(2025, 1, 2), today)
+    # Los formularios salen de la base viva (archivados): el día ya
+    # guardado completo sigue valiendo
+    with engine.begin() as conn:
+        conn.execute(delete(ProductionOrder))
+    with engine.connect() as conn:
+        actuals = cache.actuals(conn, date(2025, 1, 1), date(2025, 1, 2), today, complete_from=date(2025, 1, 2))
+    assert actuals["ordenes_creadas"].tolist() == [1, 0]
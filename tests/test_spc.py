@@ -0,0 +1,20 @@
+import warnings
+
+import numpy as np
+
+import spc
+
+def test_western_electric_flags_points_beyond_the_limits():
+    x = np.array([0.0, 0.5, -0.5, 4.0])
+    violations = spc.western_electric(x, 0.0, 1.0)
+    assert violations[1].tolist() == [False, False, False, True]
+
+def test_western_electric_without_variation():
+    # Todas las muestras iguales: sigma 0, ninguna violación ni advertencia
+    for x, center in [(np.full(10, 5.0), 5.0), (np.array([5.0, 6.0]), 5.0)]:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            violations = spc.western_electric(x, center, 0.0)
+        assert sorted(violations) == [1, 2, 3, 4]
+        assert not any(flags.any() for flags in violations.values())
+    assert not spc.western_electric(np.array([5.0]), 5.0, np.nan)[1].any()
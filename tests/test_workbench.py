@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+
+import workbench
+from models import User, UserRole
+
+@pytest.fixture(autouse=True)
+def results_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(workbench, "WORKBENCH_DIR", str(tmp_path / "workbench"))
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM users",
+    "UPDATE users SET role = 'ADMIN'",
+    "DROP TABLE users",
+    "PRAGMA query_only = OFF",
+    "SELECT 1; DELETE FROM users",
+    "/* SELECT */ DELETE FROM users",
+])
+def test_only_single_read_statements(sql):
+    with pytest.raises(ValueError):
+        workbench.clean_statement(sql)
+
+@pytest.mark.parametrize("sql", [
+    # Pasan la revisión del texto: las detiene el autorizador de SQLite
+    "WITH x AS (SELECT 1) DELETE FROM users",
+    "WITH x AS (SELECT 1) UPDATE users SET role = 'ADMIN'",
+    "WITH x AS (SELECT 1) INSERT INTO users (username, password_hash, role) SELECT 'x', 'x', 'ADMIN' FROM x",
+])
+def test_authorizer_denies_writes(engine, user_id, sql):
+    workbench.clean_statement(sql)
+    with pytest.raises(DBAPIError, match="not authorized"):
+        workbench.run_query(engine, sql)
+    with engine.connect() as conn:
+        assert conn.execute(select(User.username, User.role)).one() == ("operador", UserRole.OPERATOR)
+
+def test_authorizer_denies_attach_and_pragmas(engine, tmp_path):
+    with engine.connect() as conn, workbench.guarded(conn):
+        for sql in [f"ATTACH DATABASE '{tmp_path / 'otra.db'}' AS otra", "PRAGMA query_only = OFF"]:
+            with pytest.raises(DBAPIError, match="not authorized"):
+                conn.exec_driver_sql(sql)
+
+def test_timeout_cancels_the_query(engine):
+    endless = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n"
+    with pytest.raises(TimeoutError):
+        workbench.run_query(engine, endless, timeout_ms=100)
+
+def test_connection_is_writable_again_after_the_query(engine, user_id):
+    # El autorizador se quita antes de devolver la conexión al pool
+    result = workbench.run_query(engine, "SELECT id, username FROM users")
+    assert result.rows == 1
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET username = 'otro'"))
+    with engine.connect() as conn:
+        assert conn.execute(select(User.username)).scalar() == "otro"
+
+def test_duplicate_columns_keep_their_labels(engine, user_id):
+    result = workbench.run_query(engine, "SELECT u.id, u.username, v.id FROM users u JOIN users v ON v.id = u.id")
+    assert result.columns == ["id", "username", "id_1"]
+    assert result.labels == ["id", "username", "id"]
+    assert result.page(0, 10).to_dict("records") == [{"id": user_id, "username": "operador", "id_1": user_id}]
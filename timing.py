@@ -0,0 +1,34 @@
+import logging
+import os
+import time
+
+# Reporte de tiempos por rerun: con HERMES_RERUN_TIMINGS=1 cada ejecución del
+# script registra cuánto tomó cada fase (en el log "hermes.rerun" y en el sidebar)
+RERUN_TIMINGS = os.environ.get("HERMES_RERUN_TIMINGS") == "1"
+
+logger = logging.getLogger("hermes.rerun")
+
+class RerunTimer:
+    def __init__(self, name):
+        self.name = name
+        self.start = self.last = time.perf_counter()
+        self.phases = []
+
+    def mark(self, phase):
+        # Cierra la fase actual: el tiempo desde la marca anterior
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    @property
+    def total(self):
+        return self.last - self.start
+
+    def summary(self):
+        parts = [f"{phase} {elapsed * 1000:.1f} ms" for phase, elapsed in self.phases]
+        return f"{self.name}: " + ", ".join(parts) + f" · total {self.total * 1000:.1f} ms"
+
+    def report(self, container=None):
+        logger.info(self.summary())
+        if RERUN_TIMINGS and container is not None:
+            container.caption(f"⏱️ {self.summary()}")
@@ -0,0 +1,125 @@
+import math
+from datetime import datetime
+
+import streamlit as st
+
+from data_access import DATE_COLUMNS
+from export import EXPORT_FORMATS, export_query
+from pagination import keyset_page, frame_keyset_page
+
+# Componentes de interfaz compartidos por los dashboards
+
+PAGE_SIZES = [50, 100, 250, 500, 1000]
+SORT_ORDERS = {"Descendente": True, "Ascendente": False}
+
+def format_dates(df):
+    for column in df.select_dtypes(include='datetime').columns:
+        df[column] = df[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+def _pager_state(view_key, signature):
+    # Cursores de las páginas visitadas; se reinician al cambiar filtros u orden
+    state_key = f"pager_{view_key}"
+    pager = st.session_state.get(state_key)
+    if pager is None or pager['signature'] != signature:
+        pager = {'signature': signature, 'cursors': [None], 'page': 0}
+        st.session_state[state_key] = pager
+    return pager
+
+def _next_page(pager, cursor):
+    del pager['cursors'][pager['page'] + 1:]
+    pager['cursors'].append(cursor)
+    pager['page'] += 1
+
+def _previous_page(pager):
+    pager['page'] -= 1
+
+def paginated_table(view_key, signature, keys, total, engine, frame=None, query=None, date_columns=DATE_COLUMNS):
+    # Muestra una página a la vez: desde el DataFrame en caché (sin filtros)
+    # o desde la base de datos con paginación por llave
+    col1, col2 = st.columns(2)
+    with col1:
+        page_size = st.selectbox("Filas por página", PAGE_SIZES, index=1, key=f"{view_key}_page_size")
+    with col2:
+        sort_order = st.selectbox("Orden", list(SORT_ORDERS), key=f"{view_key}_sort_order")
+    descending = SORT_ORDERS[sort_order]
+    
+    pager = _pager_state(view_key, (signature, page_size, descending))
+    after = pager['cursors'][pager['page']]
+    if frame is not None:
+        page_df, next_cursor = frame_keyset_page(frame, keys, after, page_size, descending)
+    else:
+        with engine.connect() as conn:
+            page_df, next_cursor = keyset_page(conn, query, keys, after, page_size, descending, date_columns)
+    
+    st.dataframe(
+        format_dates(page_df),
+        use_container_width=True,
+        hide_index=True
+    )
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("⬅️ Anterior", key=f"{view_key}_previous", disabled=pager['page'] == 0,
+                  on_click=_previous_page, args=(pager,))
+    with col2:
+        st.caption(
+            f"Página {pager['page'] + 1} de {max(1, math.ceil(total / page_size))} · "
+            f"Ordenado por: {', '.join(keys)}"
+        )
+    with col3:
+        st.button("Siguiente ➡️", key=f"{view_key}_next", disabled=next_cursor is None,
+                  on_click=_next_page, args=(pager, next_cursor))
+    return page_df
+
+def result_table(view_key, signature, result):
+    # Resultado de una consulta ad hoc (workbench.QueryResult): la página se
+    # lee del disco por posición, en el orden que devolvió la consulta
+    page_size = st.selectbox("Filas por página", PAGE_SIZES, index=1, key=f"{view_key}_page_size")
+    pager = _pager_state(view_key, (signature, page_size))
+    start = pager['cursors'][pager['page']] or 0
+    page_df = result.page(start, page_size)
+    next_cursor = start + page_size if start + page_size < result.rows else None
+
+    # Columnas repetidas (id, id_1...) con el encabezado original de la consulta
+    labels = {
+        name: st.column_config.Column(label)
+        for name, label in zip(result.columns, result.labels) if name != label
+    }
+    st.dataframe(format_dates(page_df), use_container_width=True, hide_index=True, column_config=labels)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("⬅️ Anterior", key=f"{view_key}_previous", disabled=pager['page'] == 0,
+                  on_click=_previous_page, args=(pager,))
+    with col2:
+        st.caption(f"Página {pager['page'] + 1} de {max(1, math.ceil(result.rows / page_size))}")
+    with col3:
+        st.button("Siguiente ➡️", key=f"{view_key}_next", disabled=next_cursor is None,
+                  on_click=_next_page, args=(pager, next_cursor))
+    return page_df
+
+def export_buttons(view_key, engine, query, filename_prefix, date_columns=DATE_COLUMNS):
+    # El archivo solo se genera cuando el usuario lo pide, leyendo la consulta
+    # por bloques (respeta los filtros activos). El botón de descarga existe
+    # solo en el rerun del clic: el archivo se lee una vez y no en cada rerun
+    # posterior de la página
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        fmt = st.selectbox("Formato", list(EXPORT_FORMATS), key=f"{view_key}_export_format",
+                           label_visibility="collapsed")
+    with col2:
+        if not st.button("📦 Preparar descarga", key=f"{view_key}_export"):
+            return
+        with st.spinner("Generando archivo..."):
+            path = export_query(engine, query, fmt, date_columns)
+            with open(path, 'rb') as f:
+                data = f.read()
+        extension, mime = EXPORT_FORMATS[fmt]
+        st.download_button(
+            "📥 Descargar Datos",
+            data,
+            f"{filename_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+            mime,
+            key=f"{view_key}_download"
+        )
@@ -0,0 +1,105 @@
+from functools import lru_cache
+from typing import Literal, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import Field, create_model
+
+from config import FormSection, QUALITY_FIELDS, PRODUCTION_FIELDS
+
+# Validadores de formularios generados desde un único registro de campos
+# (config.py) y compilados una vez por proceso para cada formulario.
+# Cada uno tiene un modelo pydantic para envíos individuales (app.py a través
+# de form_service.py y la API de ingesta) y una verificación con NumPy para
+# lotes (importación masiva), con las mismas reglas.
+
+FORM_FIELDS = {
+    FormSection.QUALITY: QUALITY_FIELDS,
+    FormSection.PRODUCTION: PRODUCTION_FIELDS,
+}
+
+def form_model(name, fields):
+    # Modelo pydantic con los límites de especificación de los campos
+    definitions = {}
+    for field, spec in fields.items():
+        if "options" in spec:
+            annotation = Literal[tuple(spec["options"])]
+            constraint = Field()
+        else:
+            annotation = int if isinstance(spec["step"], int) else float
+            constraint = Field(ge=spec["min_value"], le=spec["max_value"])
+        if spec.get("required", True):
+            definitions[field] = (annotation, constraint)
+        else:
+            constraint.default = None
+            definitions[field] = (Optional[annotation], constraint)
+    return create_model(name, **definitions)
+
+class FormValidator:
+    def __init__(self, name, fields):
+        self.fields = fields
+        self.model = form_model(name, fields)
+        self.categorical = {
+            field: pd.Index(spec["options"]) for field, spec in fields.items() if "options" in spec
+        }
+        self.numeric = [field for field, spec in fields.items() if "options" not in spec]
+        # Límites como vectores: un lote se compara contra todos a la vez
+        self.low = np.array([fields[field]["min_value"] for field in self.numeric], dtype=float)
+        self.high = np.array([fields[field]["max_value"] for field in self.numeric], dtype=float)
+        self.integer = np.array([isinstance(fields[field]["step"], int) for field in self.numeric])
+        self.required = np.array([fields[field].get("required", True) for field in self.numeric])
+
+    def validate(self, values):
+        # Un envío: devuelve los valores convertidos o lanza ValidationError
+        return self.model.model_validate(values).model_dump()
+
+    def _column(self, frame, field):
+        if field in frame.columns:
+            return frame[field]
+        return pd.Series(np.nan, index=frame.index, dtype=object)
+
+    def _check_options(self, values, options):
+        codes = options.get_indexer(values)
+        if (codes < 0).any():
+            # Solo se limpian los espacios de los valores que no coinciden
+            unmatched = np.flatnonzero(codes < 0)
+            stripped = values.iloc[unmatched].map(lambda v: v.strip() if isinstance(v, str) else v)
+            codes[unmatched] = options.get_indexer(stripped)
+        return codes
+
+    def check_batch(self, frame):
+        # Un lote: devuelve (valores convertidos, [(filas con problema, motivo)])
+        clean = pd.DataFrame(index=frame.index)
+        checks = []
+        for field, options in self.categorical.items():
+            values = self._column(frame, field)
+            codes = self._check_options(values, options)
+            bad = codes < 0
+            if not self.fields[field].get("required", True):
+                bad &= values.notna().to_numpy()
+            checks.append((bad, field))
+            clean[field] = np.where(bad | (codes < 0), None, options.to_numpy(dtype=object)[codes])
+
+        if self.numeric:
+            for field in self.numeric:
+                clean[field] = pd.to_numeric(self._column(frame, field), errors="coerce")
+            values = clean[self.numeric].to_numpy(dtype=float)
+            missing = np.isnan(values)
+            with np.errstate(invalid="ignore"):
+                bad = (values < self.low) | (values > self.high)
+                bad |= self.integer & ~missing & (np.mod(values, 1) != 0)
+            bad |= missing & self.required
+            checks.extend(zip(bad.T, self.numeric))
+
+        return clean, [
+            (mask, f"{self.fields[field]['label']} fuera de especificación") for mask, field in checks
+        ]
+
+@lru_cache(maxsize=None)
+def _compiled(section):
+    return FormValidator(f"{section.value.title()}Form", FORM_FIELDS[section])
+
+def form_validator(section):
+    # section: FormSection o su valor ("quality", "production"). Se compila
+    # una vez por proceso.
+    return _compiled(FormSection(section))
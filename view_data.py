@@ -1,7 +1,23 @@
 import streamlit as st
 import pandas as pd
-from database import get_db
-from models import User, ProductionOrder, QualityForm, ProductionForm
+import numpy as np
+from database import init_db
+from snapshot import analytics_engine as read_engine, data_as_of
+from models import QualityForm, ProductionForm
+from data_access import (
+    quality_query, production_query, combined_select,
+    order_options, user_options, dieta_options, date_bounds,
+    DATE_COLUMNS, COMBINED_DATE_COLUMNS
+)
+from pagination import count_rows
+from config import QUALITY_FIELDS, PRODUCTION_FIELDS, DAILY_PLAN_FIELDS
+import rollups
+import spc
+import plan_actual
+import archive
+import columnar
+import sql_trace
+from ui import paginated_table, export_buttons
 from datetime import datetime, timedelta
 
 # Configuración de la página
@@ -45,278 +61,453 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# Modos de la vista "Órdenes Completas"
+COMBINED_MODE_LABELS = {
+    "Último formulario por orden": "latest",
+    "Todos los pares": "all",
+    "Resumen por orden": "aggregate",
+}
+
+# Columnas que ordenan e identifican cada fila (paginación por llave)
+FORM_PAGE_KEYS = ['Fecha de Creación', 'ID']
+COMBINED_PAGE_KEYS = {
+    "latest": ['Orden de Producción'],
+    "aggregate": ['Orden de Producción'],
+    "all": ['Orden de Producción', 'Calidad_ID', 'Producción_ID'],
+}
+
+# Tendencias: tipo de formulario -> (nombre en rollups.py, campos de config.py)
+TREND_FORMS = {
+    "Calidad": ("quality", QUALITY_FIELDS),
+    "Producción": ("production", PRODUCTION_FIELDS),
+}
+TREND_GROUPS = {
+    "Sin agrupar": [],
+    "Dieta": ["dieta"],
+    "Peletizadora": ["peletizadora"],
+}
+
+@st.cache_resource
+def get_datasets():
+    # Un solo conjunto de datos por tipo de formulario, compartido entre
+    # sesiones; cada rerun solo lee las filas nuevas o modificadas. Calidad y
+    # producción se leen de la caché columnar, compartida entre procesos.
+    init_db()
+    return {
+        "quality": columnar.quality_dataset(),
+        "production": columnar.production_dataset(),
+        "spc": spc.spc_dataset(),
+    }
+
 def get_quality_data():
-    db = next(get_db())
-    quality_forms = db.query(QualityForm).all()
-    
-    data = []
-    for form in quality_forms:
-        order = db.query(ProductionOrder).filter(ProductionOrder.id == form.production_order_id).first()
-        user = db.query(User).filter(User.id == form.user_id).first()
+    with read_engine.connect() as conn:
+        return get_datasets()["quality"].refresh(conn)
+
+def get_production_data():
+    with read_engine.connect() as conn:
+        return get_datasets()["production"].refresh(conn)
+
+def build_query(data_type, filters, mode=None):
+    if data_type == "Formularios de Calidad":
+        return quality_query(**filters)
+    if data_type == "Formularios de Producción":
+        return production_query(**filters)
+    # La unión por orden se calcula en la base de datos; con los modos
+    # "latest" y "aggregate" el resultado tiene a lo sumo una fila por orden
+    return combined_select(mode, **filters)
+
+def data_source(filters):
+    # La base viva, o unida a los meses archivados que alcanza el rango de fechas
+    return archive.reader(read_engine, filters.get('start_date'), filters.get('end_date'))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_total_rows(data_type, filters, mode=None):
+    # El total se consulta aparte de la página y se guarda unos segundos
+    with data_source(filters).connect() as conn:
+        return count_rows(conn, build_query(data_type, filters, mode))
+
+def sidebar_filters(*models, with_dieta=False):
+    # Construye los filtros del sidebar con consultas baratas (DISTINCT y
+    # MIN/MAX). Devuelve None si no hay datos, o un diccionario vacío si no
+    # hay filtros activos (se usa el conjunto completo en caché).
+    with read_engine.connect() as conn:
+        min_date, max_date = date_bounds(conn, *models)
+        if min_date is None:
+            return None
         
-        data.append({
-            'ID': form.id,
-            'Orden de Producción': order.order_number if order else 'N/A',
-            'Usuario': user.username if user else 'N/A',
-            'Apariencia': form.apariencia,
-            'Color': form.color,
-            'Olor': form.olor,
-            'Humedad (%)': form.humedad,
-            'Proteína (%)': form.proteina,
-            'Grasa (%)': form.grasa,
-            'Fibra (%)': form.fibra,
-            'Cenizas (%)': form.cenizas,
-            'Fecha de Creación': form.created_at
-        })
+        order_filter = st.sidebar.multiselect(
+            "Filtrar por Orden de Producción",
+            options=order_options(conn, *models)
+        )
+        
+        user_filter = st.sidebar.multiselect(
+            "Filtrar por Usuario",
+            options=user_options(conn, models[0])
+        )
+        
+        dieta_filter = []
+        if with_dieta:
+            dieta_filter = st.sidebar.multiselect(
+                "Filtrar por Dieta",
+                options=dieta_options(conn)
+            )
+    
+    # Por defecto el rango cubre la base viva; los meses archivados se pueden
+    # elegir y solo entonces se consultan
+    archived_from, _ = archive.archive_bounds()
+    min_date = min_date.date()
+    max_date = max_date.date()
+    date_range = st.sidebar.date_input(
+        "Rango de Fechas",
+        value=(min_date, max_date),
+        min_value=min(min_date, archived_from.date()) if archived_from else min_date,
+        max_value=max_date
+    )
     
-    return pd.DataFrame(data)
+    filters = {}
+    if order_filter:
+        filters['order_numbers'] = order_filter
+    if user_filter:
+        filters['usernames'] = user_filter
+    if dieta_filter:
+        filters['dietas'] = dieta_filter
+    if date_range and tuple(date_range) != (min_date, max_date):
+        filters['start_date'] = datetime.combine(date_range[0], datetime.min.time())
+        filters['end_date'] = datetime.combine(date_range[-1], datetime.min.time()) + timedelta(days=1)
+        start_date = archive.attachable_start(filters['start_date'], filters['end_date'])
+        if start_date != filters['start_date']:
+            filters['start_date'] = start_date
+            st.sidebar.warning(
+                f"Se consultan a lo sumo {archive.MAX_ATTACHED} meses archivados: "
+                f"el rango empieza el {start_date:%Y-%m-%d}"
+            )
+    return filters
 
-def get_production_data():
-    db = next(get_db())
-    production_forms = db.query(ProductionForm).all()
+def trends_page():
+    # Tendencias por día o turno desde las tablas de rollups. La página solo
+    # lee: los mantiene al día `python rollups.py --every` (run_services.sh)
+    form = st.sidebar.selectbox("Formulario", list(TREND_FORMS))
+    name, fields = TREND_FORMS[form]
+    init_db()
     
-    data = []
-    for form in production_forms:
-        order = db.query(ProductionOrder).filter(ProductionOrder.id == form.production_order_id).first()
-        user = db.query(User).filter(User.id == form.user_id).first()
-        
-        data.append({
-            'ID': form.id,
-            'Orden de Producción': order.order_number if order else 'N/A',
-            'Usuario': user.username if user else 'N/A',
-            'Dieta': form.dieta,
-            'Molienda': form.molienda,
-            'Durabilidad': form.durabilidad,
-            'Dureza': form.dureza,
-            'Temperatura (°C)': form.temperatura,
-            'Pelletizadora': form.peletizadora,
-            'Fecha de Creación': form.created_at
+    with read_engine.connect() as conn:
+        first_day, last_day = rollups.day_bounds(conn, name)
+    if first_day is None:
+        st.info("No hay datos disponibles para mostrar. Los rollups se actualizan con `python rollups.py`.")
+        return
+    
+    parameters = rollups.ROLLUPS[name][2]
+    labels = {parameter: fields[parameter]["label"] for parameter in parameters}
+    by_label = {label: parameter for parameter, label in labels.items()}
+    selected = [by_label[label] for label in st.sidebar.multiselect(
+        "Parámetros", list(by_label), default=list(by_label)
+    )]
+    by_shift = st.sidebar.radio("Agregación", ["Día", "Turno"], horizontal=True) == "Turno"
+    group_by = []
+    if name == "production":
+        group_by = TREND_GROUPS[st.sidebar.selectbox("Agrupar por", list(TREND_GROUPS))]
+    date_range = st.sidebar.date_input(
+        "Rango de Fechas",
+        value=(max(first_day, last_day - timedelta(days=90)), last_day),
+        min_value=first_day,
+        max_value=last_day
+    )
+    if not selected or len(date_range) != 2:
+        return
+    
+    with read_engine.connect() as conn:
+        trends = rollups.load_trends(
+            conn, name, selected, start_day=date_range[0], end_day=date_range[1],
+            by_shift=by_shift, group_by=group_by
+        )
+    if trends.empty:
+        st.info("No hay datos en el rango seleccionado.")
+        return
+    
+    # Eje de tiempo: el día, o la hora de inicio de cada turno
+    period = pd.to_datetime(trends["day"])
+    if by_shift:
+        period += pd.to_timedelta(
+            rollups.SHIFT_START_HOUR + (trends["shift"] - 1) * rollups.SHIFT_HOURS, unit="h"
+        )
+    trends["Periodo"] = period
+    
+    for parameter in selected:
+        data = trends[trends["parameter"] == parameter]
+        total = data["count"].sum()
+        if total == 0:
+            # Sin muestras del parámetro en el rango: no hay media que mostrar
+            continue
+        st.subheader(labels[parameter])
+        col1, col2, col3 = st.columns(3)
+        mean = data["total"].sum() / total
+        variance = (data["total_sq"].sum() - data["total"].sum() * mean) / (total - 1) if total > 1 else float("nan")
+        col1.metric("Muestras", f"{total:,}")
+        col2.metric("Media", f"{mean:.2f}")
+        col3.metric("Desviación estándar", f"{max(variance, 0) ** 0.5:.2f}")
+        if group_by:
+            chart = data.pivot_table(index="Periodo", columns=group_by[0], values="mean")
+        else:
+            chart = data.set_index("Periodo")[["mean", "minimum", "maximum"]].rename(
+                columns={"mean": "Media", "minimum": "Mínimo", "maximum": "Máximo"}
+            )
+        st.line_chart(chart)
+    
+    with st.expander("Ver tabla"):
+        table = trends.drop(columns=["Periodo", "total", "total_sq"]).rename(columns={
+            "day": "Día", "shift": "Turno", "dieta": "Dieta", "peletizadora": "Peletizadora",
+            "parameter": "Parámetro", "count": "Muestras", "minimum": "Mínimo",
+            "maximum": "Máximo", "mean": "Media", "std": "Desviación estándar",
         })
+        table["Parámetro"] = table["Parámetro"].map(labels)
+        st.dataframe(table, hide_index=True, use_container_width=True)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_order_dietas():
+    with read_engine.connect() as conn:
+        return spc.dieta_by_order(conn)
+
+def control_chart(values, index, limits, center_key, ucl_key, lcl_key, spec=None):
+    chart = pd.DataFrame({
+        "Valor": values,
+        "LC": limits[center_key],
+        "LCS": limits[ucl_key],
+        "LCI": limits[lcl_key],
+    }, index=index)
+    if spec is not None:
+        chart["LIE"], chart["LSE"] = spec
+    st.line_chart(chart)
+
+def spc_page():
+    # Cartas de control y capacidad de los parámetros de calidad. Las muestras
+    # se mantienen en memoria y cada rerun solo lee los formularios nuevos.
+    with read_engine.connect() as conn:
+        frame = get_datasets()["spc"].refresh(conn)
+        dietas = dieta_options(conn)
+    if frame.empty:
+        st.info("No hay datos disponibles para mostrar.")
+        return
+    
+    labels = {parameter: QUALITY_FIELDS[parameter]["label"] for parameter in spc.PARAMETERS}
+    by_label = {label: parameter for parameter, label in labels.items()}
+    parameter = by_label[st.sidebar.selectbox("Parámetro", list(by_label))]
+    dieta_filter = st.sidebar.multiselect("Filtrar por Dieta", options=dietas)
+    chart_type = st.sidebar.radio("Carta", ["I-MR", "X̄-R"], horizontal=True)
+    size = 5
+    if chart_type == "X̄-R":
+        size = st.sidebar.slider("Tamaño de subgrupo", 2, 10, 5)
+    points = st.sidebar.number_input("Puntos a graficar", 50, 5000, 500, step=50)
+    
+    data = spc.samples(frame, dieta_filter, get_order_dietas())
+    x = data[parameter].to_numpy(dtype=float)
+    if len(x) < 2 * size:
+        st.info("No hay suficientes muestras para la carta de control.")
+        return
+    times = data["created_at"].to_numpy()
+    lsl, usl = spc.SPEC_LIMITS[parameter]
+    
+    # Límites y reglas con todas las muestras; solo se grafican las últimas
+    limits = spc.individuals_limits(x)
+    violations = spc.western_electric(x, limits["center"], limits["sigma"])
+    capability = spc.capability(x, lsl, usl, limits["sigma"])
+    flagged = np.logical_or.reduce(list(violations.values()))
+    
+    st.subheader(f"{labels[parameter]} · {chart_type}")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Muestras", f"{len(x):,}")
+    col2.metric("Cp", f"{capability['cp']:.2f}")
+    col3.metric("Cpk", f"{capability['cpk']:.2f}")
+    col4.metric("Puntos con alertas", f"{int(flagged.sum()):,}")
+    
+    if chart_type == "I-MR":
+        control_chart(x[-points:], times[-points:], limits, "center", "ucl", "lcl", (lsl, usl))
+        st.caption("Rango móvil")
+        control_chart(spc.moving_ranges(x)[-points:], times[1:][-points:], limits, "mr_center", "mr_ucl", "mr_lcl")
+    else:
+        means, ranges, xbar_limits = spc.xbar_r(x, size)
+        index = times[size - 1::size][:len(means)]
+        control_chart(means[-points:], index[-points:], xbar_limits, "center", "ucl", "lcl", (lsl, usl))
+        st.caption("Rango del subgrupo")
+        control_chart(ranges[-points:], index[-points:], xbar_limits, "r_center", "r_ucl", "r_lcl")
     
-    return pd.DataFrame(data)
+    with st.expander("Alertas de Western Electric"):
+        st.dataframe(pd.DataFrame({
+            "Regla": list(spc.WESTERN_ELECTRIC_RULES.values()),
+            "Puntos": [int(violations[rule].sum()) for rule in spc.WESTERN_ELECTRIC_RULES],
+        }), hide_index=True, use_container_width=True)
+        recent = np.flatnonzero(flagged)[-100:][::-1]
+        st.dataframe(pd.DataFrame({
+            "Fecha": times[recent],
+            "ID": data["ID"].to_numpy()[recent],
+            "Valor": x[recent],
+            "Reglas": [
+                ", ".join(str(rule) for rule in spc.WESTERN_ELECTRIC_RULES if violations[rule][i])
+                for i in recent
+            ],
+        }), hide_index=True, use_container_width=True)
+    
+    st.subheader("Capacidad por parámetro y dieta")
+    table = spc.capability_table(data if dieta_filter else spc.samples(frame, order_dieta=get_order_dietas()))
+    table["parameter"] = table["parameter"].map(labels)
+    st.dataframe(table.rename(columns={
+        "parameter": "Parámetro", "dieta": "Dieta", "n": "Muestras", "mean": "Media",
+        "sigma_within": "σ corto plazo", "sigma_overall": "σ global",
+        "cp": "Cp", "cpk": "Cpk", "pp": "Pp", "ppk": "Ppk", "violations": "Alertas",
+    }), hide_index=True, use_container_width=True)
+
+@st.cache_resource
+def get_actuals_cache():
+    # Conteos de días cerrados compartidos por todas las sesiones
+    return plan_actual.ActualsCache()
 
-def get_combined_data():
-    quality_df = get_quality_data()
-    production_df = get_production_data()
-    
-    if quality_df.empty or production_df.empty:
-        return pd.DataFrame()
-    
-    # Obtener órdenes que están en ambos conjuntos
-    common_orders = set(quality_df['Orden de Producción']).intersection(set(production_df['Orden de Producción']))
-    
-    # Filtrar los DataFrames para incluir solo las órdenes comunes
-    quality_filtered = quality_df[quality_df['Orden de Producción'].isin(common_orders)]
-    production_filtered = production_df[production_df['Orden de Producción'].isin(common_orders)]
-    
-    # Renombrar columnas para evitar duplicados
-    quality_filtered = quality_filtered.add_prefix('Calidad_')
-    production_filtered = production_filtered.add_prefix('Producción_')
-    
-    # Unir los DataFrames usando la orden de producción
-    combined_df = pd.merge(
-        quality_filtered,
-        production_filtered,
-        left_on='Calidad_Orden de Producción',
-        right_on='Producción_Orden de Producción',
-        how='inner'
+def plan_page():
+    # Plan diario contra órdenes y formularios reales; solo el día en curso
+    # se consulta en cada vista
+    today = plan_actual.production_day()
+    date_range = st.sidebar.date_input(
+        "Rango de Fechas",
+        value=(today - timedelta(days=90), today),
+        max_value=today
     )
+    if len(date_range) != 2:
+        return
+    start_day, end_day = date_range
+    
+    init_db()
+    start, end = rollups.utc_bounds(start_day, end_day)
+    start_date = archive.attachable_start(start, end)
+    if start_date != start:
+        st.sidebar.warning(
+            f"Se consultan a lo sumo {archive.MAX_ATTACHED} meses archivados: "
+            f"los días anteriores al {start_date:%Y-%m-%d} no incluyen formularios archivados"
+        )
+    with archive.reader(read_engine, start_date, end).connect() as conn:
+        actuals = get_actuals_cache().actuals(
+            conn, start_day, end_day, today=today,
+            complete_from=plan_actual.first_complete_day(start_date) if start_date != start else None
+        )
+        plans = plan_actual.load_plans(conn, start_day, end_day)
+    frame = plan_actual.plan_vs_actual(plans, actuals)
+    if frame["estimated_orders"].isna().all() and not actuals.to_numpy().any():
+        st.info("No hay datos en el rango seleccionado.")
+        return
     
-    # Renombrar la columna de orden de producción
-    combined_df = combined_df.rename(columns={'Calidad_Orden de Producción': 'Orden de Producción'})
+    last = frame.iloc[-1]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric(
+        "Órdenes planeadas" if end_day != today else "Órdenes planeadas hoy",
+        "—" if pd.isna(last["estimated_orders"]) else f"{int(last['estimated_orders'])}"
+    )
+    col2.metric(
+        "Órdenes producidas", f"{int(last['ordenes_producidas'])}",
+        delta=None if pd.isna(last["diferencia"]) else f"{int(last['diferencia']):+d}"
+    )
+    for column, window in zip((col3, col4), plan_actual.ROLLING_WINDOWS):
+        value = last[f"cumplimiento_{window}d"]
+        column.metric(f"Cumplimiento {window} días", "—" if pd.isna(value) else f"{value:.0%}")
     
-    # Eliminar la columna duplicada
-    combined_df = combined_df.drop('Producción_Orden de Producción', axis=1)
+    chart = frame[["estimated_orders", "ordenes_producidas", "ordenes_creadas"]].rename(columns={
+        "estimated_orders": "Plan", "ordenes_producidas": "Producidas", "ordenes_creadas": "Creadas",
+    })
+    chart.index = pd.to_datetime(chart.index)
+    st.line_chart(chart)
+    rolling = frame[[f"cumplimiento_{window}d" for window in plan_actual.ROLLING_WINDOWS]]
+    rolling.columns = [f"{window} días" for window in plan_actual.ROLLING_WINDOWS]
+    rolling.index = pd.to_datetime(rolling.index)
+    st.subheader("Cumplimiento móvil")
+    st.line_chart(rolling)
     
-    return combined_df
+    with st.expander("Ver tabla"):
+        table = frame.reset_index().rename(columns={
+            "day": "Día", **{name: spec["label"] for name, spec in DAILY_PLAN_FIELDS.items()},
+            "ordenes_creadas": "Órdenes creadas", "ordenes_producidas": "Órdenes producidas",
+            "formularios_produccion": "Formularios de producción",
+            "ordenes_con_calidad": "Órdenes con calidad", "formularios_calidad": "Formularios de calidad",
+            "diferencia": "Diferencia", "cumplimiento": "Cumplimiento",
+        })
+        st.dataframe(table.iloc[::-1], hide_index=True, use_container_width=True)
 
 def main():
     st.title("📊 Visualización de Datos")
+    as_of = data_as_of()
+    if as_of is not None:
+        st.sidebar.caption(f"📸 Datos al {as_of:%Y-%m-%d %H:%M:%S}")
     
     # Selector de tipo de datos
     data_type = st.sidebar.selectbox(
         "Seleccione el tipo de datos a visualizar",
-        ["Formularios de Calidad", "Formularios de Producción", "Órdenes Completas"]
+        ["Formularios de Calidad", "Formularios de Producción", "Órdenes Completas", "Tendencias",
+         "Control Estadístico (SPC)", "Plan vs. Real"]
     )
     
+    if data_type == "Tendencias":
+        trends_page()
+        return
+    if data_type == "Control Estadístico (SPC)":
+        spc_page()
+        return
+    if data_type == "Plan vs. Real":
+        plan_page()
+        return
+    
     # Filtros
     st.sidebar.subheader("Filtros")
     
+    mode = None
+    frame = None
+    keys = FORM_PAGE_KEYS
+    date_columns = DATE_COLUMNS
     if data_type == "Formularios de Calidad":
-        df = get_quality_data()
-        
-        # Filtros específicos para calidad
-        if not df.empty:
-            order_filter = st.sidebar.multiselect(
-                "Filtrar por Orden de Producción",
-                options=sorted(df['Orden de Producción'].unique())
-            )
-            
-            user_filter = st.sidebar.multiselect(
-                "Filtrar por Usuario",
-                options=sorted(df['Usuario'].unique())
-            )
-            
-            # Convertir fechas a datetime si son strings
-            if isinstance(df['Fecha de Creación'].iloc[0], str):
-                df['Fecha de Creación'] = pd.to_datetime(df['Fecha de Creación'])
-            
-            min_date = df['Fecha de Creación'].min().date()
-            max_date = df['Fecha de Creación'].max().date()
-            
-            date_range = st.sidebar.date_input(
-                "Rango de Fechas",
-                value=(min_date, max_date),
-                min_value=min_date,
-                max_value=max_date
-            )
-            
-            # Aplicar filtros
-            if order_filter:
-                df = df[df['Orden de Producción'].isin(order_filter)]
-            if user_filter:
-                df = df[df['Usuario'].isin(user_filter)]
-            if date_range:
-                start_date = pd.to_datetime(date_range[0])
-                end_date = pd.to_datetime(date_range[1]) + timedelta(days=1)
-                df = df[(df['Fecha de Creación'] >= start_date) & 
-                       (df['Fecha de Creación'] < end_date)]
+        filters = sidebar_filters(QualityForm)
+        if filters == {}:
+            frame = get_quality_data()
     
     elif data_type == "Formularios de Producción":
-        df = get_production_data()
-        
-        # Filtros específicos para producción
-        if not df.empty:
-            order_filter = st.sidebar.multiselect(
-                "Filtrar por Orden de Producción",
-                options=sorted(df['Orden de Producción'].unique())
-            )
-            
-            user_filter = st.sidebar.multiselect(
-                "Filtrar por Usuario",
-                options=sorted(df['Usuario'].unique())
-            )
-            
-            dieta_filter = st.sidebar.multiselect(
-                "Filtrar por Dieta",
-                options=sorted(df['Dieta'].unique())
-            )
-            
-            # Convertir fechas a datetime si son strings
-            if isinstance(df['Fecha de Creación'].iloc[0], str):
-                df['Fecha de Creación'] = pd.to_datetime(df['Fecha de Creación'])
-            
-            min_date = df['Fecha de Creación'].min().date()
-            max_date = df['Fecha de Creación'].max().date()
-            
-            date_range = st.sidebar.date_input(
-                "Rango de Fechas",
-                value=(min_date, max_date),
-                min_value=min_date,
-                max_value=max_date
-            )
-            
-            # Aplicar filtros
-            if order_filter:
-                df = df[df['Orden de Producción'].isin(order_filter)]
-            if user_filter:
-                df = df[df['Usuario'].isin(user_filter)]
-            if dieta_filter:
-                df = df[df['Dieta'].isin(dieta_filter)]
-            if date_range:
-                start_date = pd.to_datetime(date_range[0])
-                end_date = pd.to_datetime(date_range[1]) + timedelta(days=1)
-                df = df[(df['Fecha de Creación'] >= start_date) & 
-                       (df['Fecha de Creación'] < end_date)]
+        filters = sidebar_filters(ProductionForm, with_dieta=True)
+        if filters == {}:
+            frame = get_production_data()
     
     else:  # Órdenes Completas
-        df = get_combined_data()
-        
-        # Filtros para órdenes completas
-        if not df.empty:
-            order_filter = st.sidebar.multiselect(
-                "Filtrar por Orden de Producción",
-                options=sorted(df['Orden de Producción'].unique())
-            )
-            
-            user_filter = st.sidebar.multiselect(
-                "Filtrar por Usuario",
-                options=sorted(df['Calidad_Usuario'].unique())
-            )
-            
-            dieta_filter = st.sidebar.multiselect(
-                "Filtrar por Dieta",
-                options=sorted(df['Producción_Dieta'].unique())
-            )
-            
-            # Convertir fechas a datetime si son strings
-            if isinstance(df['Calidad_Fecha de Creación'].iloc[0], str):
-                df['Calidad_Fecha de Creación'] = pd.to_datetime(df['Calidad_Fecha de Creación'])
-                df['Producción_Fecha de Creación'] = pd.to_datetime(df['Producción_Fecha de Creación'])
-            
-            min_date = min(df['Calidad_Fecha de Creación'].min(), df['Producción_Fecha de Creación'].min()).date()
-            max_date = max(df['Calidad_Fecha de Creación'].max(), df['Producción_Fecha de Creación'].max()).date()
-            
-            date_range = st.sidebar.date_input(
-                "Rango de Fechas",
-                value=(min_date, max_date),
-                min_value=min_date,
-                max_value=max_date
-            )
-            
-            # Aplicar filtros
-            if order_filter:
-                df = df[df['Orden de Producción'].isin(order_filter)]
-            if user_filter:
-                df = df[df['Calidad_Usuario'].isin(user_filter)]
-            if dieta_filter:
-                df = df[df['Producción_Dieta'].isin(dieta_filter)]
-            if date_range:
-                start_date = pd.to_datetime(date_range[0])
-                end_date = pd.to_datetime(date_range[1]) + timedelta(days=1)
-                df = df[
-                    ((df['Calidad_Fecha de Creación'] >= start_date) & 
-                     (df['Calidad_Fecha de Creación'] < end_date)) |
-                    ((df['Producción_Fecha de Creación'] >= start_date) & 
-                     (df['Producción_Fecha de Creación'] < end_date))
-                ]
+        mode = COMBINED_MODE_LABELS[st.sidebar.selectbox(
+            "Modo de combinación",
+            list(COMBINED_MODE_LABELS)
+        )]
+        filters = sidebar_filters(QualityForm, ProductionForm, with_dieta=True)
+        keys = COMBINED_PAGE_KEYS[mode]
+        date_columns = COMBINED_DATE_COLUMNS
     
-    # Mostrar datos
-    if not df.empty:
-        # Convertir fechas a string para mostrar
-        if data_type == "Órdenes Completas":
-            df['Calidad_Fecha de Creación'] = df['Calidad_Fecha de Creación'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            df['Producción_Fecha de Creación'] = df['Producción_Fecha de Creación'].dt.strftime('%Y-%m-%d %H:%M:%S')
-        else:
-            df['Fecha de Creación'] = df['Fecha de Creación'].dt.strftime('%Y-%m-%d %H:%M:%S')
-        
-        st.dataframe(
-            df,
-            use_container_width=True,
-            hide_index=True
-        )
-        
-        # Estadísticas básicas
-        st.subheader("📈 Estadísticas")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.metric("Total de Registros", len(df))
-        
-        with col2:
-            st.metric("Última Actualización", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        
-        # Opción para descargar datos
-        csv = df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            "📥 Descargar Datos",
-            csv,
-            f"{data_type.lower().replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            "text/csv",
-            key='download-csv'
-        )
-    else:
+    if filters is None:
+        st.info("No hay datos disponibles para mostrar.")
+        return
+    
+    query = build_query(data_type, filters, mode)
+    total = len(frame) if frame is not None else get_total_rows(data_type, filters, mode)
+    if total == 0:
         st.info("No hay datos disponibles para mostrar.")
+        return
+    
+    # Mostrar datos
+    paginated_table(
+        data_type, (repr(filters), mode), keys, total, data_source(filters),
+        frame=frame, query=query, date_columns=date_columns
+    )
+    
+    # Estadísticas básicas
+    st.subheader("📈 Estadísticas")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.metric("Total de Registros", total)
+    
+    with col2:
+        st.metric("Última Actualización", (as_of or datetime.now()).strftime('%Y-%m-%d %H:%M:%S'))
+    
+    # Opción para descargar datos
+    export_buttons(
+        data_type, data_source(filters), query,
+        data_type.lower().replace(' ', '_'), date_columns
+    )
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with sql_trace.traced_rerun("view_data.py"):
+        main()
@@ -0,0 +1,219 @@
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy.exc import DBAPIError
+
+from columnar import read_segments
+from data_access import frame_from_rows
+
+# Consultas SQL ad hoc desde db_viewer.py, siempre de solo lectura y con
+# límite de filas y de tiempo:
+#   - SQLite: un autorizador que solo permite leer y un progress handler
+#     que interrumpe la consulta al vencer el plazo (y cuenta los pasos de
+#     la máquina virtual, la medida de trabajo disponible desde Python)
+#   - PostgreSQL: transacción READ ONLY con statement_timeout; las filas
+#     leídas salen de pg_stat_xact_user_tables
+# El resultado se escribe por bloques en segmentos Arrow en disco y la
+# tabla paginada lee solo la página visible (ver QueryResult).
+#   HERMES_WORKBENCH_ROW_LIMIT (10000) y HERMES_WORKBENCH_TIMEOUT_MS (5000)
+WORKBENCH_ROW_LIMIT = int(os.environ.get("HERMES_WORKBENCH_ROW_LIMIT", "10000"))
+WORKBENCH_TIMEOUT_MS = int(os.environ.get("HERMES_WORKBENCH_TIMEOUT_MS", "5000"))
+WORKBENCH_DIR = os.path.join(tempfile.gettempdir(), "hermes_workbench")
+# Resultados más viejos que esto se borran al ejecutar otra consulta
+WORKBENCH_TTL_SECONDS = 3600
+CHUNK_ROWS = 1000
+# Instrucciones de la máquina virtual de SQLite entre llamadas al progress handler
+PROGRESS_STEPS = 1000
+
+_READ_STATEMENT = re.compile(r"^\s*(select|with|values)\b", re.IGNORECASE)
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_SQLITE_READ_ACTIONS = {
+    sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE,
+}
+_PG_QUERY_CANCELED = "57014"
+
+def clean_statement(sql):
+    # Una sola sentencia SELECT/WITH/VALUES, sin el punto y coma final
+    statement = _COMMENTS.sub(" ", sql).strip().rstrip(";").strip()
+    if not _READ_STATEMENT.match(statement):
+        raise ValueError("Solo se permiten consultas de lectura (SELECT, WITH o VALUES)")
+    if ";" in re.sub(r"'(?:[^']|'')*'", "", statement):
+        raise ValueError("Escriba una sola consulta")
+    return statement
+
+def _sqlite_authorizer(action, arg1, arg2, database, trigger):
+    return sqlite3.SQLITE_OK if action in _SQLITE_READ_ACTIONS else sqlite3.SQLITE_DENY
+
+@contextmanager
+def guarded(conn, timeout_ms=WORKBENCH_TIMEOUT_MS):
+    # Solo lectura y plazo para las sentencias ejecutadas dentro del bloque.
+    # Entrega un diccionario que al salir tiene el trabajo medido.
+    stats = {}
+    started = time.perf_counter()
+    if conn.dialect.name == "sqlite":
+        raw = conn.connection.driver_connection
+        deadline = started + timeout_ms / 1000
+        stats["Pasos de la VM"] = 0
+        def progress():
+            stats["Pasos de la VM"] += PROGRESS_STEPS
+            if time.perf_counter() > deadline:
+                stats["timed_out"] = True
+                return 1
+            return 0
+        raw.set_authorizer(_sqlite_authorizer)
+        raw.set_progress_handler(progress, PROGRESS_STEPS)
+        try:
+            yield stats
+        except DBAPIError as exc:
+            if stats.get("timed_out"):
+                raise _timeout(timeout_ms) from exc
+            raise
+        finally:
+            raw.set_progress_handler(None, PROGRESS_STEPS)
+            raw.set_authorizer(None)
+            conn.rollback()
+    elif conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+        rows_read = (
+            "SELECT coalesce(sum(seq_tup_read + coalesce(idx_tup_fetch, 0)), 0) "
+            "FROM pg_stat_xact_user_tables"
+        )
+        before = conn.exec_driver_sql(rows_read).scalar()
+        try:
+            yield stats
+            stats["Filas leídas"] = int(conn.exec_driver_sql(rows_read).scalar() - before)
+        except DBAPIError as exc:
+            if getattr(exc.orig, "pgcode", None) == _PG_QUERY_CANCELED:
+                raise _timeout(timeout_ms) from exc
+            raise
+        finally:
+            conn.rollback()
+    else:
+        raise RuntimeError(f"Consultas ad hoc no disponibles con {conn.dialect.name}")
+    stats.pop("timed_out", None)
+    stats["Tiempo (s)"] = round(time.perf_counter() - started, 3)
+
+def _timeout(timeout_ms):
+    return TimeoutError(f"La consulta superó el límite de {timeout_ms / 1000:g} s y se canceló")
+
+def unique_columns(labels):
+    # Arrow y pandas necesitan nombres únicos: una consulta con joins suele
+    # repetir columnas (id, created_at). La segunda "id" pasa a "id_1", sin
+    # chocar con otra columna que ya se llame así.
+    labels = [str(label) for label in labels]
+    taken = set(labels)
+    names, used = [], set()
+    for label in labels:
+        name, suffix = label, 0
+        while name in used or (name != label and name in taken):
+            suffix += 1
+            name = f"{label}_{suffix}"
+        used.add(name)
+        names.append(name)
+    return names
+
+def _arrow_table(frame):
+    # SQLite permite tipos mezclados en una columna: esas columnas se guardan
+    # como texto
+    try:
+        return pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mixed = {
+            column: frame[column].map(lambda value: value if value is None else str(value))
+            for column in frame.columns if frame[column].dtype == object
+        }
+        return pa.Table.from_pandas(frame.assign(**mixed), preserve_index=False)
+
+def purge_results(now=None):
+    if not os.path.isdir(WORKBENCH_DIR):
+        return
+    now = now or time.time()
+    for name in os.listdir(WORKBENCH_DIR):
+        path = os.path.join(WORKBENCH_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > WORKBENCH_TTL_SECONDS:
+                shutil.rmtree(path)
+        except OSError:
+            pass
+
+class QueryResult:
+    # Resultado guardado en segmentos Arrow de CHUNK_ROWS filas (cada bloque
+    # con su propio esquema); una página lee solo los segmentos que cubre
+    def __init__(self, directory, columns, rows, truncated, stats, labels=None):
+        self.directory = directory
+        # columns: nombres únicos con que se guardan los segmentos; labels:
+        # los encabezados originales de la consulta, para mostrar
+        self.columns = columns
+        self.labels = labels or columns
+        self.rows = rows
+        self.truncated = truncated
+        self.stats = stats
+
+    def _segment(self, index):
+        return os.path.join(self.directory, f"{index:06d}.arrow")
+
+    def page(self, start, size):
+        end = min(start + size, self.rows)
+        frames = []
+        for index in range(start // CHUNK_ROWS, (end - 1) // CHUNK_ROWS + 1 if end > start else 0):
+            offset = index * CHUNK_ROWS
+            table = read_segments([self._segment(index)])
+            low, high = max(start - offset, 0), min(end - offset, table.num_rows)
+            frames.append(table.slice(low, high - low).to_pandas())
+        if not frames:
+            return frame_from_rows([], self.columns, ())
+        return pd.concat(frames, ignore_index=True)
+
+def run_query(engine, sql, row_limit=WORKBENCH_ROW_LIMIT, timeout_ms=WORKBENCH_TIMEOUT_MS):
+    # Ejecuta la consulta una vez y guarda hasta row_limit filas a medida que
+    # llegan; truncated indica que había más
+    statement = clean_statement(sql)
+    purge_results()
+    directory = os.path.join(WORKBENCH_DIR, uuid.uuid4().hex)
+    os.makedirs(directory)
+    rows, truncated = 0, False
+    try:
+        with engine.connect() as conn:
+            with guarded(conn, timeout_ms) as stats:
+                result = conn.execution_options(stream_results=True).exec_driver_sql(statement)
+                labels = list(result.keys())
+                columns = unique_columns(labels)
+                while rows < row_limit:
+                    chunk = result.fetchmany(min(CHUNK_ROWS, row_limit - rows))
+                    if not chunk:
+                        break
+                    table = _arrow_table(frame_from_rows(chunk, columns, ()))
+                    with pa.OSFile(os.path.join(directory, f"{rows // CHUNK_ROWS:06d}.arrow"), "wb") as sink:
+                        with pa.ipc.new_file(sink, table.schema) as writer:
+                            writer.write_table(table)
+                    rows += len(chunk)
+                truncated = rows == row_limit and result.fetchone() is not None
+                result.close()
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return QueryResult(directory, columns, rows, truncated, stats, labels)
+
+def explain(engine, sql, timeout_ms=WORKBENCH_TIMEOUT_MS):
+    # Plan de ejecución como texto, un nodo por línea
+    statement = clean_statement(sql)
+    with engine.connect() as conn:
+        with guarded(conn, timeout_ms):
+            if conn.dialect.name == "sqlite":
+                rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+                depth = {0: -1}
+                lines = []
+                for node, parent, _, detail in rows:
+                    depth[node] = depth.get(parent, -1) + 1
+                    lines.append(f"{'  ' * depth[node]}{detail}")
+                return "\n".join(lines)
+            return "\n".join(conn.exec_driver_sql(f"EXPLAIN {statement}").scalars())